@@ -8,9 +8,12 @@ from aws_cdk import (
     aws_ec2 as ec2,
     aws_ecs as ecs,
     aws_ecr as ecr,
+    aws_efs as efs,
     aws_s3 as s3,
     aws_ecr_assets as ecr_assets,
     aws_logs as logs,
+    aws_cloudwatch as cloudwatch,
+    aws_applicationautoscaling as appscaling,
     aws_iam as iam,
     aws_codepipeline as codepipeline,
     aws_codepipeline_actions as codepipeline_actions,
@@ -19,6 +22,27 @@ from aws_cdk import (
 from constructs import Construct
 from cdk_ecr_deployment import DockerImageName, ECRDeployment
 
+from genai_demo.applications.sizing import ServiceSizing
+
+
+# Must match SCALING_METRICS_NAMESPACE in the backend, which publishes these metrics from every task
+METRICS_NAMESPACE = 'GenAIDemo'
+
+# Jobs are kept in SQLite on EFS, so that every task can answer for any job and jobs outlive tasks
+JOBS_MOUNT_PATH = '/data/jobs'
+# The app user of the backend image
+APP_UID = '10001'
+
+# Overridden per key by the "backend" context in cdk.json
+DEFAULT_SETTINGS = {
+    # Average HTTP requests in flight per task
+    'inFlightRequestsTarget': 24,
+    # Average Bedrock calls waiting for a concurrency slot per task
+    'queueDepthTarget': 2,
+    # Tasks added when this percentage of Bedrock calls is shed, as [percent, tasks] pairs
+    'throttleRateSteps': [[1, 1], [5, 2], [20, 4]]
+}
+
 
 class Backend(Construct):
 
@@ -27,6 +51,9 @@ class Backend(Construct):
         super().__init__(scope, id_)
 
         name = 'backend-app'
+        sizing = ServiceSizing.from_context(self, 'backend')
+        service_name = 'BackendAppService'
+        settings = {**DEFAULT_SETTINGS, **(self.node.try_get_context('backend') or {})}
 
         # Backend Repo
         self.ecr_repo = ecr.Repository(
@@ -41,7 +68,7 @@ class Backend(Construct):
             self,
             'BackendAppDockerImage',
             directory='src/apps/backend/',
-            platform=ecr_assets.Platform.LINUX_AMD64
+            platform=sizing.platform
         )
         image_asset.node.add_dependency(self.ecr_repo)
 
@@ -59,8 +86,9 @@ class Backend(Construct):
         task_def = ecs.FargateTaskDefinition(
             self,
             'BackendAppTaskDef',
-            cpu=512,
-            memory_limit_mib=1024,
+            cpu=sizing.cpu,
+            memory_limit_mib=sizing.memory_mib,
+            runtime_platform=sizing.runtime_platform,
             family='BackendAppTaskDef'
         )
         
@@ -94,7 +122,9 @@ class Backend(Construct):
 
         # For HealthCheck, Don't need to set Container's health check, if ALB's health check is enabled.
         # https://repost.aws/questions/QUdmR0oMn2Spa61RpKGWyPfg/ecs-should-i-use-alb-healthchecks-container-healthchecks-or-both
-        task_def.add_container(
+        # The backend is only reached through Service Connect, so the container health check gates traffic
+        # on /api/ready, which turns healthy once credentials and Bedrock connections have been warmed up.
+        container = task_def.add_container(
             'BackendApp',
             container_name=name,
             image=ecs.ContainerImage.from_ecr_repository(
@@ -110,21 +140,78 @@ class Backend(Construct):
                     app_protocol=ecs.AppProtocol.http
                 )
             ],
+            health_check=ecs.HealthCheck(
+                command=[
+                    'CMD-SHELL',
+                    "python3 -c \"import urllib.request; urllib.request.urlopen('http://localhost:8080/api/ready', timeout=2)\""
+                ],
+                interval=Duration.seconds(10),
+                timeout=Duration.seconds(5),
+                retries=3,
+                start_period=Duration.seconds(30)
+            ),
             logging=ecs.LogDrivers.aws_logs(
                 log_group=container_log_group,
                 stream_prefix='service',
                 mode=ecs.AwsLogDriverMode.NON_BLOCKING,
                 max_buffer_size=Size.mebibytes(25)
+            ),
+            environment={
+                'SCALING_METRICS_NAMESPACE': METRICS_NAMESPACE,
+                'SCALING_METRICS_SERVICE': service_name,
+                'JOBS_DB_PATH': f'{JOBS_MOUNT_PATH}/jobs.sqlite3',
+                'JOBS_DB_SHARED': 'true'
+            }
+        )
+
+        # Job Store
+        jobs_file_system = efs.FileSystem(
+            self,
+            'JobsFileSystem',
+            vpc=cluster.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            encrypted=True,
+            throughput_mode=efs.ThroughputMode.ELASTIC,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        jobs_file_system.connections.allow_default_port_from(sg)
+
+        jobs_access_point = jobs_file_system.add_access_point(
+            'JobsAccessPoint',
+            path='/jobs',
+            create_acl=efs.Acl(owner_uid=APP_UID, owner_gid=APP_UID, permissions='750'),
+            posix_user=efs.PosixUser(uid=APP_UID, gid=APP_UID)
+        )
+        jobs_access_point.file_system.grant_read_write(task_def.task_role)
+
+        task_def.add_volume(
+            name='jobs',
+            efs_volume_configuration=ecs.EfsVolumeConfiguration(
+                file_system_id=jobs_file_system.file_system_id,
+                transit_encryption='ENABLED',
+                authorization_config=ecs.AuthorizationConfig(
+                    access_point_id=jobs_access_point.access_point_id,
+                    iam='ENABLED'
+                )
+            )
+        )
+        container.add_mount_points(
+            ecs.MountPoint(
+                container_path=JOBS_MOUNT_PATH,
+                source_volume='jobs',
+                read_only=False
             )
         )
 
         service = ecs.FargateService(
             self,
             'BackendAppService',
-            service_name='BackendAppService',
+            service_name=service_name,
             cluster=cluster,
             task_definition=task_def,
-            desired_count=2,
+            desired_count=sizing.desired_count,
             deployment_controller=ecs.DeploymentController(
                 type=ecs.DeploymentControllerType.ECS
             ),
@@ -132,16 +219,7 @@ class Backend(Construct):
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             security_groups=[sg],
-            capacity_provider_strategies=[
-                ecs.CapacityProviderStrategy(
-                    capacity_provider='FARGATE_SPOT',
-                    weight=2
-                ),
-                ecs.CapacityProviderStrategy(
-                    capacity_provider='FARGATE',
-                    weight=1
-                )
-            ],
+            capacity_provider_strategies=sizing.capacity_provider_strategies,
             service_connect_configuration=ecs.ServiceConnectProps(
                 log_driver=ecs.LogDrivers.aws_logs(
                     log_group=container_log_group,
@@ -165,15 +243,54 @@ class Backend(Construct):
         )
 
         # Task Autoscaling
+        # The backend waits on Bedrock rather than using CPU or memory, so it scales on its load as it
+        # reports it in CloudWatch Embedded Metric Format through the container logs
         scaling = service.auto_scale_task_count(
-            min_capacity=2,
-            max_capacity=10
+            min_capacity=sizing.min_count,
+            max_capacity=sizing.max_count
         )
 
-        scaling.scale_on_memory_utilization(
-            'MemoryScaling',
-            policy_name='MemoryScaling',
-            target_utilization_percent=70
+        def backend_metric(metric_name: str, statistic: str) -> cloudwatch.Metric:
+            return cloudwatch.Metric(
+                namespace=METRICS_NAMESPACE,
+                metric_name=metric_name,
+                dimensions_map={'ServiceName': service_name},
+                statistic=statistic,
+                period=Duration.minutes(1)
+            )
+
+        scaling.scale_to_track_custom_metric(
+            'InFlightRequestsScaling',
+            policy_name='InFlightRequestsScaling',
+            metric=backend_metric('InFlightRequests', cloudwatch.Stats.AVERAGE),
+            target_value=settings['inFlightRequestsTarget'],
+            scale_out_cooldown=Duration.minutes(1),
+            scale_in_cooldown=Duration.minutes(5)
+        )
+
+        scaling.scale_to_track_custom_metric(
+            'QueueDepthScaling',
+            policy_name='QueueDepthScaling',
+            metric=backend_metric('QueueDepth', cloudwatch.Stats.AVERAGE),
+            target_value=settings['queueDepthTarget'],
+            scale_out_cooldown=Duration.minutes(1),
+            scale_in_cooldown=Duration.minutes(5)
+        )
+
+        # Scale-out only: shedding stops once the new tasks take their share, and the target tracking
+        # policies above scale back in
+        scaling.scale_on_metric(
+            'ThrottleRateScaling',
+            metric=backend_metric('ThrottleRate', cloudwatch.Stats.AVERAGE),
+            scaling_steps=[
+                appscaling.ScalingInterval(upper=settings['throttleRateSteps'][0][0], change=0),
+                *[
+                    appscaling.ScalingInterval(lower=percent, change=tasks)
+                    for percent, tasks in settings['throttleRateSteps']
+                ]
+            ],
+            adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            cooldown=Duration.minutes(1)
         )
 
         # CI/CD
@@ -20,6 +20,8 @@ from aws_cdk import (
 from constructs import Construct
 from cdk_ecr_deployment import DockerImageName, ECRDeployment
 
+from genai_demo.applications.sizing import ServiceSizing
+
 
 class Frontend(Construct):
 
@@ -29,6 +31,7 @@ class Frontend(Construct):
         super().__init__(scope, id_)
 
         name = 'frontend-app'
+        sizing = ServiceSizing.from_context(self, 'frontend')
 
         # Frontend Repo
         self.ecr_repo = ecr.Repository(
@@ -43,7 +46,7 @@ class Frontend(Construct):
             self,
             'FrontendAppDockerImage',
             directory='src/apps/frontend/',
-            platform=ecr_assets.Platform.LINUX_AMD64
+            platform=sizing.platform
         )
         image_asset.node.add_dependency(self.ecr_repo)
 
@@ -61,8 +64,9 @@ class Frontend(Construct):
         task_def = ecs.FargateTaskDefinition(
             self,
             'FrontendAppTaskDef',
-            cpu=512,
-            memory_limit_mib=1024,
+            cpu=sizing.cpu,
+            memory_limit_mib=sizing.memory_mib,
+            runtime_platform=sizing.runtime_platform,
             family='FrontendAppTaskDef'
         )
 
@@ -115,7 +119,7 @@ class Frontend(Construct):
             service_name='FrontendAppService',
             cluster=cluster,
             task_definition=task_def,
-            desired_count=2,
+            desired_count=sizing.desired_count,
             deployment_controller=ecs.DeploymentController(
                 type=ecs.DeploymentControllerType.ECS
             ),
@@ -123,16 +127,7 @@ class Frontend(Construct):
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             security_groups=[sg],
-            capacity_provider_strategies=[
-                ecs.CapacityProviderStrategy(
-                    capacity_provider='FARGATE_SPOT',
-                    weight=2
-                ),
-                ecs.CapacityProviderStrategy(
-                    capacity_provider='FARGATE',
-                    weight=1
-                )
-            ],
+            capacity_provider_strategies=sizing.capacity_provider_strategies,
             service_connect_configuration=ecs.ServiceConnectProps(
                 log_driver=ecs.LogDrivers.aws_logs(
                     log_group=container_log_group,
@@ -181,8 +176,8 @@ class Frontend(Construct):
 
         # Task Autoscaling
         scaling = service.auto_scale_task_count(
-            min_capacity=2,
-            max_capacity=10
+            min_capacity=sizing.min_count,
+            max_capacity=sizing.max_count
         )
 
         scaling.scale_on_request_count(
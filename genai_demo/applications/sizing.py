@@ -0,0 +1,109 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+from dataclasses import dataclass
+
+from aws_cdk import (
+    aws_ecs as ecs,
+    aws_ecr_assets as ecr_assets,
+)
+from constructs import Construct
+
+
+# Memory sizes (MiB) Fargate accepts for each CPU size (CPU units)
+# https://docs.aws.amazon.com/AmazonECS/latest/developerguide/fargate-tasks-services.html#fargate-tasks-size
+FARGATE_MEMORY_MIB = {
+    256: [512, 1024, 2048],
+    512: list(range(1024, 4096 + 1, 1024)),
+    1024: list(range(2048, 8192 + 1, 1024)),
+    2048: list(range(4096, 16384 + 1, 1024)),
+    4096: list(range(8192, 30720 + 1, 1024)),
+    8192: list(range(16384, 61440 + 1, 4096)),
+    16384: list(range(32768, 122880 + 1, 8192)),
+}
+
+ARCHITECTURES = {
+    'x86_64': (ecr_assets.Platform.LINUX_AMD64, ecs.CpuArchitecture.X86_64),
+    'arm64': (ecr_assets.Platform.LINUX_ARM64, ecs.CpuArchitecture.ARM64),
+}
+
+# Keys of a service's context in cdk.json, e.g. {"backend": {"architecture": "arm64", "cpu": 1024}}
+CONTEXT_KEYS = {
+    'architecture': 'architecture',
+    'cpu': 'cpu',
+    'memoryMiB': 'memory_mib',
+    'desiredCount': 'desired_count',
+    'minCount': 'min_count',
+    'maxCount': 'max_count',
+}
+
+
+def describe_sizes(sizes: list) -> str:
+    steps = {b - a for a, b in zip(sizes, sizes[1:])}
+    if len(steps) == 1 and len(sizes) > 3:
+        return f'{sizes[0]} to {sizes[-1]} MiB in steps of {steps.pop()} MiB'
+    return f'{", ".join(map(str, sizes))} MiB'
+
+
+@dataclass(frozen=True)
+class ServiceSizing:
+    """Architecture, task size and task counts of a Fargate service, validated at synth time."""
+    architecture: str = 'x86_64'
+    cpu: int = 512
+    memory_mib: int = 1024
+    desired_count: int = 2
+    min_count: int = 2
+    max_count: int = 10
+
+    def __post_init__(self) -> None:
+        if self.architecture not in ARCHITECTURES:
+            raise ValueError(
+                f'Unsupported architecture {self.architecture!r}, expected one of {", ".join(ARCHITECTURES)}'
+            )
+        if self.cpu not in FARGATE_MEMORY_MIB:
+            raise ValueError(
+                f'Unsupported Fargate CPU size {self.cpu}, expected one of {", ".join(map(str, FARGATE_MEMORY_MIB))}'
+            )
+        allowed = FARGATE_MEMORY_MIB[self.cpu]
+        if self.memory_mib not in allowed:
+            raise ValueError(
+                f'Fargate does not support {self.memory_mib} MiB with {self.cpu} CPU units; '
+                f'use {describe_sizes(allowed)}'
+            )
+        if not 1 <= self.min_count <= self.desired_count <= self.max_count:
+            raise ValueError(
+                f'Task counts must satisfy 1 <= minCount <= desiredCount <= maxCount, got '
+                f'{self.min_count}, {self.desired_count} and {self.max_count}'
+            )
+
+    @classmethod
+    def from_context(cls, scope: Construct, key: str) -> 'ServiceSizing':
+        context = scope.node.try_get_context(key) or {}
+        return cls(**{field: context[name] for name, field in CONTEXT_KEYS.items() if name in context})
+
+    @property
+    def platform(self) -> ecr_assets.Platform:
+        return ARCHITECTURES[self.architecture][0]
+
+    @property
+    def runtime_platform(self) -> ecs.RuntimePlatform:
+        return ecs.RuntimePlatform(
+            cpu_architecture=ARCHITECTURES[self.architecture][1],
+            operating_system_family=ecs.OperatingSystemFamily.LINUX
+        )
+
+    # Two of every three tasks run on Fargate Spot, which runs both x86_64 and ARM64 tasks
+    @property
+    def capacity_provider_strategies(self) -> list:
+        return [
+            ecs.CapacityProviderStrategy(
+                capacity_provider='FARGATE_SPOT',
+                weight=2
+            ),
+            ecs.CapacityProviderStrategy(
+                capacity_provider='FARGATE',
+                weight=1
+            )
+        ]
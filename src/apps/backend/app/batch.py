@@ -0,0 +1,78 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import asyncio
+import os
+
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Header
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.cache import CachePolicy
+from app.deadline import deadline_after, timeout_var
+from app.dialog import UserPrompt, build_request, resolve_answer, to_ndjson
+
+
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '1000'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '16'))
+
+
+batch_router = APIRouter()
+
+
+class BatchPrompt(BaseModel):
+    instructions: list[str] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+    # ordered=True emits results in input order, otherwise as soon as each one completes
+    ordered: bool = False
+    # Capped at BATCH_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+
+class BatchItem(BaseModel):
+    index: int
+    text: Optional[str] = None
+    error: Optional[str] = None
+    # Set when the answer was cut off at maxTokens
+    truncated: Optional[bool] = None
+
+
+# Each prompt has the requested timeout from the time it leaves the batch's queue
+async def answer_item(index: int, instruction: str, policy: CachePolicy, semaphore: asyncio.Semaphore) -> BatchItem:
+    async with semaphore:
+        try:
+            with deadline_after(timeout_var.get()):
+                output, _ = await resolve_answer(build_request(UserPrompt(instruction=instruction)), policy)
+            return BatchItem(index=index, text=output.text, truncated=output.truncated or None)
+        except Exception as e:
+            # A failed item is reported on its own line and does not fail the rest of the batch
+            return BatchItem(index=index, error=f'{type(e).__name__}: {e}')
+
+
+async def run_batch(batch: BatchPrompt, policy: CachePolicy) -> AsyncIterator[bytes]:
+    semaphore = asyncio.Semaphore(min(batch.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    tasks = [
+        asyncio.ensure_future(answer_item(index, instruction, policy, semaphore))
+        for index, instruction in enumerate(batch.instructions)
+    ]
+
+    try:
+        for next_item in (tasks if batch.ordered else asyncio.as_completed(tasks)):
+            item = await next_item
+            yield to_ndjson(item.model_dump(exclude_none=True))
+    finally:
+        # The client went away or the batch finished: stop any work that is still queued
+        for task in tasks:
+            task.cancel()
+
+
+# Streams one JSON line per instruction: {"index": 0, "text": "..."} or {"index": 1, "error": "..."}
+@batch_router.post("/prompts:batch")
+async def create_answers(batch: BatchPrompt, cache_control: Optional[str] = Header(default=None)) -> StreamingResponse:
+    return StreamingResponse(
+        run_batch(batch, CachePolicy.from_header(cache_control)),
+        media_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,470 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import asyncio
+import os
+import random
+import time
+import orjson
+
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Optional
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import BotoCoreError, ClientError, EventStreamError
+from fastapi import APIRouter
+from prometheus_client import Counter
+from pydantic import BaseModel
+
+from app.deadline import allows, fit_output
+from app.metrics import BEDROCK_LATENCY, BEDROCK_TTFT, ERRORS, record_usage, register_stats
+from app.regions import RegionHealth, REGION_EXPLORE_RATIO
+from app.limiter import (
+    AdaptiveLimiter, Overloaded, Throttled,
+    LIMITER_INITIAL_LIMIT, LIMITER_MIN_LIMIT, LIMITER_BACKOFF_RATIO,
+    LIMITER_LATENCY_TOLERANCE,
+)
+from app.scheduler import SCHEDULER_LANES, priority_var, tenant_var, tenant_weight
+
+
+BEDROCK_REGION = os.environ.get('BEDROCK_REGION', 'ap-northeast-2')
+# Comma-separated regions to spread calls over, in order of preference
+BEDROCK_REGIONS = [r.strip() for r in os.environ.get('BEDROCK_REGIONS', BEDROCK_REGION).split(',') if r.strip()]
+# Overrides the regional endpoint, e.g. to point at a local stand-in for benchmarks
+BEDROCK_ENDPOINT_URL = os.environ.get('BEDROCK_ENDPOINT_URL')
+# Per-region overrides as region=url pairs, e.g. us-east-1=http://127.0.0.1:9001,us-west-2=http://127.0.0.1:9002
+BEDROCK_ENDPOINT_URLS = dict(
+    pair.strip().split('=', 1) for pair in os.environ.get('BEDROCK_ENDPOINT_URLS', '').split(',') if pair.strip()
+)
+# Upper bound for the adaptive concurrency limit of each region
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', '256'))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '3'))
+BEDROCK_RETRY_BASE_SECONDS = float(os.environ.get('BEDROCK_RETRY_BASE_SECONDS', '0.25'))
+BEDROCK_RETRY_CAP_SECONDS = float(os.environ.get('BEDROCK_RETRY_CAP_SECONDS', '4'))
+BEDROCK_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('BEDROCK_CONNECT_TIMEOUT_SECONDS', '3'))
+# Longest silence between two reads of a response; the request deadline bounds the call as a whole
+BEDROCK_READ_TIMEOUT_SECONDS = float(os.environ.get('BEDROCK_READ_TIMEOUT_SECONDS', '60'))
+# Pooled connections per region opened at startup, before the task reports ready
+BEDROCK_WARMUP_CONNECTIONS = int(os.environ.get('BEDROCK_WARMUP_CONNECTIONS', '4'))
+BEDROCK_WARMUP_TIMEOUT_SECONDS = float(os.environ.get('BEDROCK_WARMUP_TIMEOUT_SECONDS', '10'))
+
+# Not a valid model identifier, so warm-up calls are rejected by Bedrock without invoking a model
+WARMUP_MODEL_ID = 'warmup'
+
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'ServiceUnavailableException', 'TooManyRequestsException'}
+# Errors that say something about the region rather than the request, besides throttling and HTTP 5xx
+REGION_ERROR_CODES = {'InternalServerException', 'ModelStreamErrorException', 'ModelNotReadyException',
+                      'ModelTimeoutException'}
+
+REGION_FAILOVERS = Counter(
+    'genai_region_failovers',
+    'Calls moved to another region because the previous one failed or was saturated',
+    ['from_region', 'to_region']
+)
+
+
+bedrock_router = APIRouter()
+
+
+def error_code(error: Exception) -> str:
+    if isinstance(error, (ClientError, EventStreamError)):
+        return error.response.get('Error', {}).get('Code', type(error).__name__)
+    return type(error).__name__
+
+
+def is_throttling(error: Exception) -> bool:
+    return error_code(error) in THROTTLING_ERROR_CODES
+
+
+# Connection errors, timeouts, throttling after retries and server-side errors count against the region
+def is_region_failure(error: Exception) -> bool:
+    if isinstance(error, Throttled) or isinstance(error, BotoCoreError):
+        return True
+    if isinstance(error, (ClientError, EventStreamError)):
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return is_throttling(error) or error_code(error) in REGION_ERROR_CODES or status >= 500
+    return False
+
+
+class BedrockRuntime:
+    """Event-loop native bedrock-runtime client behind an adaptive concurrency limiter.
+
+    Throttled calls are retried here, with decorrelated jitter, rather than inside botocore
+    so that every throttle is seen by the limiter.
+    """
+
+    def __init__(self, region_name: str, limiter: AdaptiveLimiter, endpoint_url: Optional[str] = None) -> None:
+        self.region_name = region_name
+        self.endpoint_url = endpoint_url
+        self.limiter = limiter
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._session = None
+        self._client = None
+        self._start_lock = asyncio.Lock()
+
+    # Called from the lifespan, or lazily by the first call when the app is used without one
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._client is not None:
+                return
+            self._exit_stack = AsyncExitStack()
+            self._session = get_session()
+            self._client = await self._exit_stack.enter_async_context(
+                self._session.create_client(
+                    service_name='bedrock-runtime',
+                    region_name=self.region_name,
+                    endpoint_url=self.endpoint_url,
+                    config=AioConfig(
+                        max_pool_connections=self.limiter.max_limit,
+                        connect_timeout=BEDROCK_CONNECT_TIMEOUT_SECONDS,
+                        read_timeout=BEDROCK_READ_TIMEOUT_SECONDS,
+                        retries={'total_max_attempts': 1}
+                    )
+                )
+            )
+
+    # Resolves credentials and opens TLS connections into the pool, so that the first requests
+    # don't pay for the credential fetch, DNS lookup and handshake
+    async def warm(self, connections: int = BEDROCK_WARMUP_CONNECTIONS) -> None:
+        await self.start()
+        credentials = await self._session.get_credentials()
+        if credentials is not None:
+            await credentials.get_frozen_credentials()
+        await asyncio.gather(*(self._warm_connection() for _ in range(connections)))
+
+    async def _warm_connection(self) -> None:
+        try:
+            await self._client.converse(modelId=WARMUP_MODEL_ID, messages=[{'role': 'user', 'content': [{'text': '.'}]}])
+        except ClientError:
+            pass
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+        self._exit_stack = None
+        self._session = None
+        self._client = None
+
+    @property
+    def in_flight(self) -> int:
+        return self.limiter.in_flight
+
+    # On success the caller owns the limiter slot and must release it. maxTokens of Converse calls is
+    # fitted to the request deadline once the slot is taken, so that time spent queueing is accounted for.
+    async def _invoke(self, operation: str, lane: str, fit: bool = True, **kwargs) -> tuple[dict, float]:
+        if self._client is None:
+            await self.start()
+        tenant = tenant_var.get()
+        delay = BEDROCK_RETRY_BASE_SECONDS
+        for attempt in range(1, BEDROCK_MAX_ATTEMPTS + 1):
+            await self.limiter.acquire(lane, tenant, tenant_weight(tenant))
+            started = time.monotonic()
+            try:
+                return await getattr(self._client, operation)(**(fit_output(kwargs) if fit else kwargs)), started
+            except ClientError as e:
+                self.limiter.release(lane)
+                ERRORS.labels('bedrock', error_code(e)).inc()
+                if not is_throttling(e):
+                    raise
+                self.limiter.on_throttle()
+                delay = min(BEDROCK_RETRY_CAP_SECONDS, random.uniform(BEDROCK_RETRY_BASE_SECONDS, delay * 3))
+                # A retry that cannot finish before the deadline would only hold the caller up
+                if attempt == BEDROCK_MAX_ATTEMPTS or not allows(delay):
+                    raise Throttled('Bedrock is throttling requests') from e
+            except BaseException as e:
+                self.limiter.release(lane)
+                if isinstance(e, Exception):
+                    ERRORS.labels('bedrock', error_code(e)).inc()
+                raise
+
+            await asyncio.sleep(delay)
+
+    async def converse(self, **kwargs) -> dict:
+        lane = priority_var.get().value
+        result, started = await self._invoke('converse', lane, **kwargs)
+        try:
+            elapsed = time.monotonic() - started
+            usage = result.get('usage', {})
+            self.limiter.on_success(elapsed / max(usage.get('outputTokens', 0), 1))
+            record_usage('converse', kwargs['modelId'], self.region_name, usage, elapsed)
+            return result
+        finally:
+            self.limiter.release(lane)
+
+    # The limiter slot is held until the caller has drained or abandoned the stream
+    @asynccontextmanager
+    async def converse_stream(self, **kwargs) -> AsyncIterator[AsyncIterator[dict]]:
+        lane = priority_var.get().value
+        response, started = await self._invoke('converse_stream', lane, **kwargs)
+        stream = response['stream']
+        try:
+            yield self._observe(stream, kwargs['modelId'], started)
+        finally:
+            stream.close()
+            self.limiter.release(lane)
+
+    # InvokeModel with a JSON body, e.g. for embeddings; returns the decoded response body
+    async def invoke_model(self, **kwargs) -> dict:
+        lane = priority_var.get().value
+        response, started = await self._invoke('invoke_model', lane, fit=False, **kwargs)
+        try:
+            body = await response['body'].read()
+            self.limiter.on_success()
+            BEDROCK_LATENCY.labels('invoke_model', kwargs['modelId'], self.region_name).observe(time.monotonic() - started)
+            return orjson.loads(body)
+        finally:
+            self.limiter.release(lane)
+
+    # Feeds per-token latency and mid-stream throttles back into the limiter and records stream metrics
+    async def _observe(self, stream: AsyncIterator[dict], model_id: str, started: float) -> AsyncIterator[dict]:
+        first_token = True
+        try:
+            async for event in stream:
+                if first_token and 'contentBlockDelta' in event:
+                    first_token = False
+                    BEDROCK_TTFT.labels(model_id, self.region_name).observe(time.monotonic() - started)
+                elif 'metadata' in event:
+                    elapsed = time.monotonic() - started
+                    usage = event['metadata'].get('usage', {})
+                    self.limiter.on_success(elapsed / max(usage.get('outputTokens', 0), 1))
+                    record_usage('converse_stream', model_id, self.region_name, usage, elapsed)
+                yield event
+        except EventStreamError as e:
+            ERRORS.labels('bedrock', error_code(e)).inc()
+            if is_throttling(e):
+                self.limiter.on_throttle()
+            raise
+
+
+class RegionPool:
+    """One BedrockRuntime per region, each call going to the best scoring healthy region.
+
+    Regions are ranked by EWMA latency, error rate and how much of their concurrency limit is
+    in use. A call that fails because of the region, or finds its local queue full, is tried
+    in the next region as long as nothing has been streamed yet.
+    """
+
+    def __init__(self, runtimes: list[BedrockRuntime]) -> None:
+        self.runtimes = {runtime.region_name: runtime for runtime in runtimes}
+        self.health = {runtime.region_name: RegionHealth(runtime.region_name) for runtime in runtimes}
+
+    async def start(self) -> None:
+        for runtime in self.runtimes.values():
+            await runtime.start()
+
+    async def close(self) -> None:
+        for runtime in self.runtimes.values():
+            await runtime.close()
+
+    async def warm(self) -> None:
+        await asyncio.gather(*(runtime.warm() for runtime in self.runtimes.values()))
+
+    @property
+    def in_flight(self) -> int:
+        return sum(runtime.in_flight for runtime in self.runtimes.values())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(runtime.limiter.queue_depth for runtime in self.runtimes.values())
+
+    # Regions to try in order, and whether every region is ejected
+    def _ranked(self) -> tuple[list[str], bool]:
+        now = time.monotonic()
+        available = [health for health in self.health.values() if health.available(now)]
+        if not available:
+            # Keep serving from the regions due back first rather than failing outright
+            return [health.name for health in sorted(self.health.values(), key=lambda h: h.ejected_until)], True
+
+        ranked = sorted(available, key=lambda health: health.score(self._load(health.name)))
+        if len(ranked) > 1 and random.random() < REGION_EXPLORE_RATIO:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return [health.name for health in ranked], False
+
+    def _load(self, region: str) -> float:
+        limiter = self.runtimes[region].limiter
+        return (limiter.in_flight + limiter.queue_depth) / limiter.limit
+
+    # Whether to go on with the next region
+    def _on_error(self, region: str, error: BaseException, probe: bool) -> bool:
+        health = self.health[region]
+        if isinstance(error, Exception) and is_region_failure(error):
+            health.on_failure()
+            return True
+        if probe:
+            health.end_probe()
+        # Shed locally because this region's queue is full; another region may still have room
+        return isinstance(error, Overloaded)
+
+    async def converse(self, **kwargs) -> dict:
+        error: Optional[Exception] = None
+        failed: Optional[str] = None
+        regions, panic = self._ranked()
+        for region in regions:
+            health = self.health[region]
+            if not (health.acquire() or panic):
+                continue
+            probe = health.probing and not panic
+            if failed is not None:
+                REGION_FAILOVERS.labels(failed, region).inc()
+            started = time.monotonic()
+            try:
+                result = await self.runtimes[region].converse(**kwargs)
+            except BaseException as e:
+                if not self._on_error(region, e, probe):
+                    raise
+                error, failed = e, region
+                continue
+
+            elapsed = time.monotonic() - started
+            health.on_success(elapsed / max(result.get('usage', {}).get('outputTokens', 0), 1))
+            return result
+
+        raise error or Overloaded('No Bedrock region is available')
+
+    # Region health is not fed latencies here, since they are not comparable with per-token latencies
+    async def invoke_model(self, **kwargs) -> dict:
+        error: Optional[Exception] = None
+        failed: Optional[str] = None
+        regions, panic = self._ranked()
+        for region in regions:
+            health = self.health[region]
+            if not (health.acquire() or panic):
+                continue
+            probe = health.probing and not panic
+            if failed is not None:
+                REGION_FAILOVERS.labels(failed, region).inc()
+            try:
+                result = await self.runtimes[region].invoke_model(**kwargs)
+            except BaseException as e:
+                if not self._on_error(region, e, probe):
+                    raise
+                error, failed = e, region
+                continue
+
+            if probe:
+                health.end_probe()
+            return result
+
+        raise error or Overloaded('No Bedrock region is available')
+
+    @asynccontextmanager
+    async def converse_stream(self, **kwargs) -> AsyncIterator[AsyncIterator[dict]]:
+        error: Optional[Exception] = None
+        failed: Optional[str] = None
+        async with AsyncExitStack() as stack:
+            regions, panic = self._ranked()
+            for region in regions:
+                health = self.health[region]
+                if not (health.acquire() or panic):
+                    continue
+                probe = health.probing and not panic
+                if failed is not None:
+                    REGION_FAILOVERS.labels(failed, region).inc()
+                started = time.monotonic()
+                try:
+                    events = await stack.enter_async_context(self.runtimes[region].converse_stream(**kwargs))
+                except BaseException as e:
+                    if not self._on_error(region, e, probe):
+                        raise
+                    error, failed = e, region
+                    continue
+                break
+            else:
+                raise error or Overloaded('No Bedrock region is available')
+
+            yield self._track(region, events, probe, started)
+
+    # Latency is taken client-side so that it includes the round trip to the region
+    async def _track(self, region: str, events: AsyncIterator[dict], probe: bool,
+                     started: float) -> AsyncIterator[dict]:
+        health = self.health[region]
+        settled = False
+        try:
+            async for event in events:
+                if 'metadata' in event:
+                    elapsed = time.monotonic() - started
+                    health.on_success(elapsed / max(event['metadata'].get('usage', {}).get('outputTokens', 0), 1))
+                    settled = True
+                yield event
+        except Exception as e:
+            if is_region_failure(e):
+                health.on_failure()
+                settled = True
+            raise
+        finally:
+            if probe and not settled:
+                health.end_probe()
+
+    def limiter_stats(self) -> dict:
+        return {region: runtime.limiter.stats() for region, runtime in self.runtimes.items()}
+
+    def health_stats(self) -> dict:
+        return {region: health.stats() for region, health in self.health.items()}
+
+    # Per priority class, summed over regions
+    def lane_stats(self) -> dict:
+        lanes = {}
+        for runtime in self.runtimes.values():
+            for lane, stats in runtime.limiter.stats()['lanes'].items():
+                totals = lanes.setdefault(lane, dict.fromkeys(stats, 0))
+                for name, value in stats.items():
+                    totals[name] += value
+        return lanes
+
+
+def create_runtime(region: str) -> BedrockRuntime:
+    return BedrockRuntime(
+        region_name=region,
+        endpoint_url=BEDROCK_ENDPOINT_URLS.get(region, BEDROCK_ENDPOINT_URL),
+        limiter=AdaptiveLimiter(
+            initial_limit=LIMITER_INITIAL_LIMIT,
+            min_limit=LIMITER_MIN_LIMIT,
+            max_limit=BEDROCK_MAX_CONCURRENCY,
+            backoff_ratio=LIMITER_BACKOFF_RATIO,
+            latency_tolerance=LIMITER_LATENCY_TOLERANCE,
+            lanes=SCHEDULER_LANES
+        )
+    )
+
+
+bedrock = RegionPool([create_runtime(region) for region in BEDROCK_REGIONS])
+
+register_stats('genai_limiter', bedrock.limiter_stats, counters=['acquired', 'throttled', 'rejected'], label='region')
+register_stats('genai_region', bedrock.health_stats, counters=['ejections'], label='region')
+register_stats('genai_lane', bedrock.lane_stats, counters=['rejected'], label='priority')
+
+
+class LaneStats(BaseModel):
+    limit: int
+    in_flight: int
+    queue_depth: int
+    rejected: int
+
+
+class LimiterStats(BaseModel):
+    limit: float
+    in_flight: int
+    queue_depth: int
+    acquired: int
+    throttled: int
+    rejected: int
+    baseline_latency: Optional[float]
+    lanes: dict[str, LaneStats]
+
+
+class RegionStats(BaseModel):
+    latency: Optional[float]
+    error_rate: float
+    ejected: bool
+    ejections: int
+    limiter: LimiterStats
+
+
+@bedrock_router.get("/bedrock/stats", response_model=dict[str, RegionStats])
+def get_bedrock_stats() -> dict[str, RegionStats]:
+    return {
+        region: RegionStats(**bedrock.health[region].stats(), limiter=LimiterStats(**runtime.limiter.stats()))
+        for region, runtime in bedrock.runtimes.items()
+    }
@@ -0,0 +1,244 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import hashlib
+import json
+import os
+import time
+import orjson
+
+from collections import OrderedDict
+from enum import Enum
+from typing import Callable, Optional
+from fastapi import APIRouter
+from pydantic import BaseModel
+
+from app.metrics import register_stats
+from app.singleflight import inflight
+
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory | redis | none
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '3600'))
+# Any Redis-protocol server reachable from every task, e.g. ElastiCache or a local redis-server
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+KEY_PREFIX = 'genai:answer:'
+
+
+cache_router = APIRouter()
+
+
+class CachePolicy(Enum):
+    DEFAULT = 'default'    # read and write
+    REFRESH = 'refresh'    # skip the read, store the fresh answer
+    BYPASS = 'bypass'      # neither read nor write
+
+    @classmethod
+    def from_header(cls, cache_control: Optional[str]) -> 'CachePolicy':
+        directives = {d.strip().lower() for d in (cache_control or '').split(',')}
+        if 'no-store' in directives:
+            return cls.BYPASS
+        if 'no-cache' in directives or 'max-age=0' in directives:
+            return cls.REFRESH
+        return cls.DEFAULT
+
+    @property
+    def read(self) -> bool:
+        return self is CachePolicy.DEFAULT
+
+    @property
+    def write(self) -> bool:
+        return self is not CachePolicy.BYPASS
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+# Key on everything that shapes the answer: model, system prompt, messages and inference parameters.
+# Text is whitespace-normalized so trivially different spellings of the same question share an entry.
+def make_key(request: dict) -> str:
+    normalized = {
+        **request,
+        'messages': [
+            {
+                'role': message['role'],
+                'content': [
+                    {**block, 'text': normalize_text(block['text'])} if 'text' in block else block
+                    for block in message['content']
+                ]
+            }
+            for message in request['messages']
+        ]
+    }
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return KEY_PREFIX + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # Callers that must not lose concurrent updates, like the session store, serialize them per key
+    async def update(self, key: str, fn: Callable[[Optional[bytes]], bytes], ttl: int) -> None:
+        await self.set(key, fn(await self.get(key)), ttl)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+# Size is bounded on the server side, e.g. maxmemory with maxmemory-policy allkeys-lru
+class RedisBackend:
+
+    def __init__(self, url: str) -> None:
+        import redis.asyncio as redis
+
+        self.url = url
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        await self._client.set(key, value, ex=ttl)
+
+    # WATCH/MULTI: the write fails if another task changed the key after it was read, and is then redone
+    async def update(self, key: str, fn: Callable[[Optional[bytes]], bytes], ttl: int) -> None:
+        async def write(pipe) -> None:
+            value = fn(await pipe.get(key))
+            pipe.multi()
+            pipe.set(key, value, ex=ttl)
+
+        await self._client.transaction(write, key)
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class ResponseCache:
+
+    def __init__(self, backend, ttl: int) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        if self.backend is None:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            # A shared store outage degrades to a miss rather than failing the request
+            self.errors += 1
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orjson.loads(value)
+
+    async def set(self, key: str, value: dict) -> None:
+        if self.backend is None:
+            return
+        value = {**value, 'cached_at': time.time()}
+        try:
+            await self.backend.set(key, orjson.dumps(value), self.ttl)
+        except Exception:
+            self.errors += 1
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+        if isinstance(self.backend, MemoryBackend):
+            stats['entries'] = len(self.backend)
+            stats['max_entries'] = self.backend.max_entries
+            stats['evictions'] = self.backend.evictions
+        return stats
+
+
+def create_backend(name: str, max_entries: int = CACHE_MAX_ENTRIES, url: str = CACHE_REDIS_URL):
+    if name == 'memory':
+        return MemoryBackend(max_entries=max_entries)
+    if name == 'redis':
+        return RedisBackend(url=url)
+    if name == 'none':
+        return None
+    raise ValueError(f'Unknown backend: {name}')
+
+
+response_cache = ResponseCache(
+    backend=create_backend(CACHE_BACKEND),
+    ttl=CACHE_TTL_SECONDS
+)
+
+register_stats('genai_cache', response_cache.stats, counters=['hits', 'misses', 'errors', 'evictions'])
+register_stats('genai_singleflight', inflight.stats, counters=['calls', 'coalesced'])
+
+
+class CoalescingStats(BaseModel):
+    calls: int
+    coalesced: int
+    in_flight: int
+
+
+class CacheStats(BaseModel):
+    backend: Optional[str]
+    hits: int
+    misses: int
+    errors: int
+    hit_ratio: float
+    entries: Optional[int] = None
+    max_entries: Optional[int] = None
+    evictions: Optional[int] = None
+    coalescing: CoalescingStats
+
+
+@cache_router.get("/cache/stats", response_model=CacheStats)
+def get_cache_stats() -> CacheStats:
+    return CacheStats(**response_cache.stats(), coalescing=CoalescingStats(**inflight.stats()))
@@ -0,0 +1,106 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import gzip
+import os
+
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+# Below this size the CPU spent compressing buys almost nothing on the wire
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '5'))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get('COMPRESSION_ZSTD_LEVEL', '3'))
+
+# In order of preference; zstd only when the zstandard package is installed
+ENCODINGS = ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        quality = params.strip().removeprefix('q=').strip()
+        try:
+            if quality and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name.strip().lower())
+
+    for encoding in ENCODINGS:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compresses complete responses above a size threshold with zstd or gzip, as negotiated.
+
+    Streamed responses (more than one body message, e.g. NDJSON answers) are passed through
+    untouched, so that every delta still reaches the client as soon as it is produced.
+    """
+
+    def __init__(self, app, min_bytes: int = COMPRESSION_MIN_BYTES) -> None:
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+
+            body = message.get('body', b'')
+            response_headers = {name.lower(): value for name, value in start.get('headers', [])}
+            if (message.get('more_body', False) or len(body) < self.min_bytes
+                    or b'content-encoding' in response_headers):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            start['headers'] = [
+                (name, value) for name, value in start.get('headers', [])
+                if name.lower() != b'content-length'
+            ] + [
+                (b'content-encoding', encoding.encode()),
+                (b'content-length', str(len(compressed)).encode()),
+                (b'vary', b'Accept-Encoding')
+            ]
+            await send(start)
+            await send({**message, 'body': compressed})
+
+        await self.app(scope, receive, send_compressed)
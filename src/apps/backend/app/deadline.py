@@ -0,0 +1,205 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Request deadlines: the frontend says how long it is willing to wait in X-Request-Timeout-Ms, and the
+# backend fits queueing, the Bedrock call and the length of the answer into that time. Work for a request
+# whose deadline has passed or whose client has gone away is cancelled, upstream calls included.
+
+import asyncio
+import os
+
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional, TypeVar
+from fastapi.responses import ORJSONResponse, Response
+from prometheus_client import Counter
+
+
+REQUEST_TIMEOUT_HEADER = 'x-request-timeout-ms'
+# Used when the caller sends no deadline
+REQUEST_TIMEOUT_DEFAULT_MS = int(os.environ.get('REQUEST_TIMEOUT_DEFAULT_MS', '120000'))
+# Service Connect cuts requests after its per-request timeout (5 minutes) anyway
+REQUEST_TIMEOUT_MAX_MS = int(os.environ.get('REQUEST_TIMEOUT_MAX_MS', '300000'))
+# A conservative generation speed, used to size maxTokens to the time that is left
+DEADLINE_OUTPUT_TOKENS_PER_SECOND = float(os.environ.get('DEADLINE_OUTPUT_TOKENS_PER_SECOND', '30'))
+# Part of the remaining time set aside for the time to first token and the way back to the client
+DEADLINE_FIRST_TOKEN_SECONDS = float(os.environ.get('DEADLINE_FIRST_TOKEN_SECONDS', '1.0'))
+# With less time left than this many tokens take, the call is not started
+DEADLINE_MIN_OUTPUT_TOKENS = int(os.environ.get('DEADLINE_MIN_OUTPUT_TOKENS', '16'))
+
+# Routes that outlast a single answer get no request deadline, only a disconnect cancels them: each
+# prompt of a batch is given the requested timeout of its own, and a long poll is bounded by its wait
+UNBOUNDED_PATHS = ('/api/prompts:batch', '/api/jobs/')
+
+# Lets the answer paths report an expired deadline themselves before the middleware cuts the request
+DEADLINE_GRACE_SECONDS = 0.25
+
+T = TypeVar('T')
+
+# Absolute deadline of the current request, on the event loop's clock
+deadline_var: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+# Timeout the caller asked for, in seconds
+timeout_var: ContextVar[float] = ContextVar('timeout', default=REQUEST_TIMEOUT_DEFAULT_MS / 1000)
+
+CANCELLED_REQUESTS = Counter(
+    'genai_cancelled_requests',
+    'Requests whose work was cancelled because the deadline passed or the client disconnected',
+    ['reason']
+)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def parse_timeout_ms(value: Optional[bytes]) -> int:
+    try:
+        timeout_ms = int(value) if value else REQUEST_TIMEOUT_DEFAULT_MS
+    except ValueError:
+        timeout_ms = REQUEST_TIMEOUT_DEFAULT_MS
+    return max(0, min(timeout_ms, REQUEST_TIMEOUT_MAX_MS))
+
+
+# Seconds left until the deadline, or None outside a request
+def remaining() -> Optional[float]:
+    deadline = deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+def allows(seconds: float) -> bool:
+    left = remaining()
+    return left is None or left > seconds
+
+
+# Caps inferenceConfig.maxTokens at what can be generated in the time left; returns the request unchanged
+# when the configured limit already fits
+def fit_output(request: dict) -> dict:
+    left = remaining()
+    if left is None:
+        return request
+
+    tokens = int((left - DEADLINE_FIRST_TOKEN_SECONDS) * DEADLINE_OUTPUT_TOKENS_PER_SECOND)
+    if tokens < DEADLINE_MIN_OUTPUT_TOKENS:
+        raise DeadlineExceeded('Not enough time left to answer before the deadline')
+
+    config = request.get('inferenceConfig', {})
+    if config.get('maxTokens', tokens + 1) <= tokens:
+        return request
+    return {**request, 'inferenceConfig': {**config, 'maxTokens': tokens}}
+
+
+# Runs a unit of work, such as one prompt of a batch or one attempt of a job, under its own deadline
+@contextmanager
+def deadline_after(seconds: float) -> Iterator[None]:
+    token = deadline_var.set(asyncio.get_running_loop().time() + seconds)
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+
+@asynccontextmanager
+async def within_deadline() -> AsyncIterator[None]:
+    try:
+        async with asyncio.timeout_at(deadline_var.get()) as timeout:
+            yield
+    except TimeoutError as e:
+        if not timeout.expired():
+            raise
+        CANCELLED_REQUESTS.labels('deadline').inc()
+        raise DeadlineExceeded('Request deadline exceeded') from e
+
+
+# Relays events until the deadline. Only the wait for the next event is timed, never the consumer's
+# work between events, which may run in another task.
+async def until_deadline(events: AsyncIterator[T]) -> AsyncIterator[T]:
+    while True:
+        async with within_deadline():
+            try:
+                event = await anext(events)
+            except StopAsyncIteration:
+                return
+        yield event
+
+
+class DeadlineMiddleware:
+    """Sets the request deadline from X-Request-Timeout-Ms and cancels the request's work when it
+    passes or when the client disconnects.
+
+    Requests to UNBOUNDED_PATHS are only cancelled when the client disconnects.
+
+    Cancelling the handler also cancels the Bedrock call or stream it is waiting on, unless other
+    requests share it. A request cut before any response was sent gets 504, or 499 (client closed
+    request) when the client is already gone.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        headers = dict(scope['headers'])
+        timeout_seconds = parse_timeout_ms(headers.get(REQUEST_TIMEOUT_HEADER.encode())) / 1000
+        deadline = None if scope['path'].startswith(UNBOUNDED_PATHS) else loop.time() + timeout_seconds
+        deadline_token = deadline_var.set(deadline)
+        timeout_token = timeout_var.set(timeout_seconds)
+        started = False
+        finished = False
+        disconnected = False
+        watcher: Optional[asyncio.Task] = None
+
+        async def watch_disconnect() -> dict:
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    break
+            if not finished:
+                disconnected = True
+                timeout.reschedule(loop.time())
+            return message
+
+        # Once the body has been read, the next message can only be the disconnect; watch for it from then on
+        async def receive_watching() -> dict:
+            nonlocal watcher
+            if watcher is not None:
+                return await asyncio.shield(watcher)
+            message = await receive()
+            if message['type'] == 'http.request' and not message.get('more_body', False):
+                watcher = asyncio.ensure_future(watch_disconnect())
+            return message
+
+        async def send_tracking(message) -> None:
+            nonlocal started, finished
+            if message['type'] == 'http.response.start':
+                started = True
+            elif message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finished = True
+            await send(message)
+
+        try:
+            async with asyncio.timeout_at(None if deadline is None else deadline + DEADLINE_GRACE_SECONDS) as timeout:
+                await self.app(scope, receive_watching, send_tracking)
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            CANCELLED_REQUESTS.labels('disconnect' if disconnected else 'deadline').inc()
+            if not started:
+                # Nobody reads a 499, but it shows up as such in the access log and metrics
+                response = Response(status_code=499) if disconnected else ORJSONResponse(
+                    {'detail': 'Request deadline exceeded'}, status_code=504
+                )
+                await response(scope, receive, send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            timeout_var.reset(timeout_token)
+            deadline_var.reset(deadline_token)
@@ -3,59 +3,303 @@
 # SPDX-License-Identifier: MIT-0
 ########################################################################
 
-import boto3
+import os
+import time
+import numpy as np
+import orjson
 
-from typing import Union
-from fastapi import APIRouter
-from pydantic import BaseModel
+from typing import AsyncIterator, NamedTuple, Optional
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
+from app.cache import CachePolicy, make_key, response_cache
+from app.deadline import until_deadline, within_deadline
+from app.logger import logger
+from app.retrieval import context_text, retriever
+from app.routing import router
+from app.semantic import SEMANTIC_CACHE_ENABLED, Probe, semantic_cache
+from app.sessions import SESSION_ID_PATTERN, session_store
+from app.singleflight import inflight
 
-dialog_router = APIRouter()
 
+dialog_router = APIRouter()
 
-bedrock_runtime = boto3.client(
-    service_name='bedrock-runtime',
-    region_name='ap-northeast-2'
-)
 
-MODEL_ID = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
+# A longer policy prompt can be kept in a file; it is cached by Bedrock on models that support it
+SYSTEM_PROMPT_FILE = os.environ.get('SYSTEM_PROMPT_FILE')
+if SYSTEM_PROMPT_FILE:
+    with open(SYSTEM_PROMPT_FILE, encoding='utf-8') as f:
+        SYSTEM_PROMPT = f.read().strip()
+else:
+    SYSTEM_PROMPT = os.environ.get('SYSTEM_PROMPT', 'Respond only in Korean')
 
 
 class UserPrompt(BaseModel):
     instruction: str
+    # Name of a configured model, e.g. "fast" or "quality", to bypass automatic routing
+    model: Optional[str] = None
+    # Continues the conversation kept under this ID; without one every prompt stands alone
+    session_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)
 
 
 class Answer(BaseModel):
     text: str
+    session_id: Optional[str] = None
+    # The answer was cut off at maxTokens, which is lowered to what fits in the request's deadline
+    truncated: bool = False
 
 
-@dialog_router.post("/prompt", response_model=Answer)
-def create_answer(prompt: UserPrompt) -> Answer:
-    input_text = prompt.instruction
-    messages = [
+class Generation(NamedTuple):
+    text: str
+    stop_reason: str
+
+    @property
+    def truncated(self) -> bool:
+        return self.stop_reason == 'max_tokens'
+
+
+def build_messages(prompt: UserPrompt, history: list = ()) -> list:
+    return [
+        *history,
         {
             "role": "user",
-            "content": [{"text": input_text}]
-        }        
+            "content": [{"text": prompt.instruction}]
+        }
     ]
 
-    system = [
+
+def build_system() -> list:
+    return [
         {
-            "text": "Respond only in Korean"
+            "text": SYSTEM_PROMPT
         }
-    ] 
-    
-    response = bedrock_runtime.converse(
-        modelId=MODEL_ID,
-        messages=messages,
-        system=system
-    )
-    
-    output_message = response['output']['message']
-    
+    ]
+
+
+# The request as asked, without retrieved documents; see ground_request
+def build_request(prompt: UserPrompt, history: list = ()) -> dict:
+    if prompt.model is not None and prompt.model not in router.models:
+        raise HTTPException(status_code=422, detail=f'Unknown model: {prompt.model}')
+
+    return {
+        'modelId': router.route(prompt.instruction, prompt.model).model_id,
+        'messages': build_messages(prompt, history),
+        'system': build_system()
+    }
+
+
+# What the caches key on. The retrieved documents follow from the instruction and the index version,
+# so a cached answer is found without retrieving them, and a new index leaves older answers behind.
+def cache_scope(request: dict) -> dict:
+    return {**request, 'retrieval': retriever.version} if retriever.enabled else request
+
+
+# Retrieved documents go in the user turn ahead of the instruction, which stays the last block.
+# Done only once the caches have missed, with the semantic cache's vector of the instruction if any.
+async def ground_request(request: dict, vector: Optional[np.ndarray] = None) -> dict:
+    if not retriever.enabled:
+        return request
+    *history, turn = request['messages']
+    documents = await retriever.retrieve(turn['content'][-1]['text'], vector)
+    if not documents:
+        return request
+    return {
+        **request,
+        'messages': [*history, {**turn, 'content': [{"text": context_text(documents)}, *turn['content']]}]
+    }
+
+
+def to_ndjson(event: dict) -> bytes:
+    return orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+
+
+# X-Cache reports what the cache did for this request: HIT, MISS, REFRESH or BYPASS.
+# X-Cache-Similarity marks an answer to a paraphrase served by the semantic cache.
+def cache_headers(policy: CachePolicy, cached: Optional[dict] = None) -> dict:
+    if cached is not None:
+        headers = {'X-Cache': 'HIT', 'Age': str(max(0, int(time.time() - cached['cached_at'])))}
+        if 'similarity' in cached:
+            headers['X-Cache-Similarity'] = str(cached['similarity'])
+        return headers
+    return {'X-Cache': 'MISS' if policy.read else policy.name}
+
+
+async def generate_answer(request: dict, cache_key: Optional[str] = None,
+                          probe: Optional[Probe] = None) -> Generation:
+    request = await ground_request(request, probe.vector if probe is not None else None)
+    async with within_deadline():
+        result = await router.converse(**request)
+
+    output_message = result['output']['message']
+
     output = '\n'.join([content['text'] for content in output_message['content']])
-    print(output)
+    logger.info('answer', extra={'fields': {
+        'model': request['modelId'],
+        'stop_reason': result['stopReason'],
+        'chars': len(output),
+        'text': output
+    }})
+
+    if cache_key is not None and result['stopReason'] == 'end_turn':
+        await response_cache.set(cache_key, {'text': output})
+        if probe is not None:
+            semantic_cache.add(probe, output)
+
+    return Generation(output, result['stopReason'])
+
+
+# Returns the answer and, on a cache hit, the cached entry. Only finished answers are cached.
+async def resolve_answer(request: dict, policy: CachePolicy) -> tuple[Generation, Optional[dict]]:
+    scope = cache_scope(request)
+    key = make_key(scope)
+
+    if policy.read:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return Generation(cached['text'], 'end_turn'), cached
+
+    # Also embedded on REFRESH, so that the fresh answer can be found by paraphrases
+    probe = await semantic_cache.probe(scope) if SEMANTIC_CACHE_ENABLED and policy.write else None
+    if probe is not None and policy.read:
+        semantic_cache.record(probe)
+        if probe.hit is not None:
+            return Generation(probe.hit['text'], 'end_turn'), probe.hit
+
+    # Identical concurrent requests share one upstream call (keyed like the cache)
+    output = await inflight.do(key, lambda: generate_answer(request, key if policy.write else None, probe))
+    return output, None
+
+
+# Answers a prompt in its session, if it has one, and records the exchange there
+async def answer_prompt(prompt: UserPrompt, policy: CachePolicy) -> tuple[Generation, Optional[dict]]:
+    history = await session_store.get(prompt.session_id) if prompt.session_id else []
+    output, cached = await resolve_answer(build_request(prompt, history), policy)
+
+    if prompt.session_id:
+        await session_store.append(prompt.session_id, exchange(prompt.instruction, output.text))
+    return output, cached
+
+
+@dialog_router.post("/prompt", response_model=Answer)
+async def create_answer(prompt: UserPrompt, response: Response,
+                        cache_control: Optional[str] = Header(default=None)) -> Answer:
+    policy = CachePolicy.from_header(cache_control)
+    output, cached = await answer_prompt(prompt, policy)
+
+    response.headers.update(cache_headers(policy, cached))
+    return Answer(text=output.text, session_id=prompt.session_id, truncated=output.truncated)
+
+
+# Stores the relayed answer once the model has finished the turn and the stream was fully drained
+async def stream_answer(request: dict, cache_key: Optional[str] = None) -> AsyncIterator[bytes]:
+    request = await ground_request(request)
+    async with router.converse_stream(**request) as stream:
+        parts = []
+        stop_reason = None
+        try:
+            async for event in until_deadline(stream):
+                if 'messageStart' in event:
+                    yield to_ndjson({'type': 'start', 'role': event['messageStart']['role']})
+                elif 'contentBlockDelta' in event:
+                    text = event['contentBlockDelta']['delta'].get('text')
+                    if text:
+                        parts.append(text)
+                        yield to_ndjson({'type': 'delta', 'text': text})
+                elif 'messageStop' in event:
+                    stop_reason = event['messageStop']['stopReason']
+                    yield to_ndjson({'type': 'stop', 'stop_reason': stop_reason})
+                elif 'metadata' in event:
+                    yield to_ndjson({
+                        'type': 'metadata',
+                        'usage': event['metadata'].get('usage', {}),
+                        'metrics': event['metadata'].get('metrics', {})
+                    })
+        except Exception as e:
+            logger.warning('stream failed', exc_info=e, extra={'fields': {'model': request['modelId']}})
+            yield to_ndjson({'type': 'error', 'message': str(e)})
+            return
+
+    answer = ''.join(parts)
+    logger.info('answer', extra={'fields': {
+        'model': request['modelId'],
+        'stop_reason': stop_reason,
+        'chars': len(answer),
+        'text': answer
+    }})
+
+    if cache_key is not None and stop_reason == 'end_turn':
+        await response_cache.set(cache_key, {'text': answer})
+
+
+def exchange(instruction: str, answer: str) -> list:
+    return [
+        {'role': 'user', 'content': [{'text': instruction}]},
+        {'role': 'assistant', 'content': [{'text': answer}]}
+    ]
+
+
+# Saves the exchange once this caller has received a finished answer. Done per caller rather than in
+# stream_answer, since coalesced and cached answers can be shared by several sessions.
+async def record_exchange(chunks: AsyncIterator[bytes], session_id: str, instruction: str) -> AsyncIterator[bytes]:
+    parts = []
+    stop_reason = None
+    try:
+        async for chunk in chunks:
+            event = orjson.loads(chunk)
+            if event['type'] == 'delta':
+                parts.append(event['text'])
+            elif event['type'] == 'stop':
+                stop_reason = event['stop_reason']
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+    if stop_reason is not None:
+        await session_store.append(session_id, exchange(instruction, ''.join(parts)))
+
+
+async def replay_answer(cached: dict) -> AsyncIterator[bytes]:
+    yield to_ndjson({'type': 'start', 'role': 'assistant'})
+    yield to_ndjson({'type': 'delta', 'text': cached['text']})
+    yield to_ndjson({'type': 'stop', 'stop_reason': 'end_turn'})
+
+
+async def prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    try:
+        yield first
+        async for chunk in rest:
+            yield chunk
+    finally:
+        await rest.aclose()
+
+
+# Relays converse_stream events as newline-delimited JSON:
+#   {"type": "start", "role": "assistant"}       upstream accepted the request
+#   {"type": "delta", "text": "..."}             incremental answer text
+#   {"type": "stop", "stop_reason": "end_turn"}  generation finished
+#   {"type": "metadata", "usage": {...}}         token usage and latency
+#   {"type": "error", "message": "..."}          upstream failed mid-stream
+@dialog_router.post("/prompt/stream")
+async def create_answer_stream(prompt: UserPrompt,
+                               cache_control: Optional[str] = Header(default=None)) -> StreamingResponse:
+    history = await session_store.get(prompt.session_id) if prompt.session_id else []
+    request = build_request(prompt, history)
+    policy = CachePolicy.from_header(cache_control)
+    key = make_key(cache_scope(request))
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
 
-    return Answer(text=output)
+    cached = await response_cache.get(key) if policy.read else None
+    if cached is not None:
+        events = replay_answer(cached)
+        headers.update(cache_headers(policy, cached))
+    else:
+        events = inflight.stream(key, lambda: stream_answer(request, key if policy.write else None))
+        # Pull the first event eagerly so that request errors surface as an HTTP error status
+        events = prepend(await anext(events), events)
+        headers.update(cache_headers(policy))
 
+    if prompt.session_id:
+        events = record_exchange(events, prompt.session_id, prompt.instruction)
 
+    return StreamingResponse(events, media_type='application/x-ndjson', headers=headers)
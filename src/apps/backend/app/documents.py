@@ -0,0 +1,138 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Documents for retrieval: read line by line from text, Markdown and JSON Lines files, split into
+# chunks of whole paragraphs that overlap a little, so that a passage cut at a chunk boundary is
+# still found whole in one of them. Chunks are stored as orjson records in one file, with their
+# offsets in another, and read back through a memory map.
+
+import os
+import numpy as np
+import orjson
+
+from typing import Iterable, Iterator
+
+from app.tokens import estimate_tokens
+
+
+TEXT_EXTENSIONS = ('.txt', '.md')
+JSONL_EXTENSIONS = ('.jsonl',)
+
+
+def find_files(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories.sort()
+                for name in sorted(names):
+                    if name.endswith(TEXT_EXTENSIONS + JSONL_EXTENSIONS):
+                        yield os.path.join(directory, name)
+        else:
+            yield path
+
+
+# Yields (source, lines) per document. A JSON Lines file holds one document per line, as
+# {"text": "...", "source": "..."}; without a source the document is named after its line.
+def read_documents(paths: Iterable[str]) -> Iterator[tuple[str, Iterator[str]]]:
+    for path in find_files(paths):
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(JSONL_EXTENSIONS):
+                for number, line in enumerate(f, start=1):
+                    if line.strip():
+                        document = orjson.loads(line)
+                        yield document.get('source', f'{path}:{number}'), iter(document['text'].splitlines())
+            else:
+                yield path, f
+
+
+def paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    buffer = []
+    for line in lines:
+        if line.strip():
+            buffer.append(line.strip())
+        elif buffer:
+            yield ' '.join(buffer)
+            buffer = []
+    if buffer:
+        yield ' '.join(buffer)
+
+
+# A paragraph longer than a chunk is cut between words
+def split_long(paragraph: str, max_tokens: int) -> Iterator[str]:
+    if estimate_tokens(paragraph) <= max_tokens:
+        yield paragraph
+        return
+    words, tokens = [], 0
+    for word in paragraph.split():
+        size = estimate_tokens(word)
+        if words and tokens + size > max_tokens:
+            yield ' '.join(words)
+            words, tokens = [], 0
+        words.append(word)
+        tokens += size
+    if words:
+        yield ' '.join(words)
+
+
+# Each chunk starts with the last paragraphs of the previous one, up to overlap_tokens
+def chunk_text(lines: Iterable[str], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    window, tokens = [], 0
+    for paragraph in paragraphs(lines):
+        for piece in split_long(paragraph, max_tokens):
+            size = estimate_tokens(piece)
+            if window and tokens + size > max_tokens:
+                yield '\n\n'.join(window)
+                kept, kept_tokens = [], 0
+                for previous in reversed(window):
+                    previous_tokens = estimate_tokens(previous)
+                    if kept_tokens + previous_tokens > overlap_tokens:
+                        break
+                    kept.insert(0, previous)
+                    kept_tokens += previous_tokens
+                window, tokens = (kept, kept_tokens) if kept_tokens + size <= max_tokens else ([], 0)
+            window.append(piece)
+            tokens += size
+    if window:
+        yield '\n\n'.join(window)
+
+
+def iter_chunks(paths: Iterable[str], max_tokens: int, overlap_tokens: int) -> Iterator[dict]:
+    for source, lines in read_documents(paths):
+        for text in chunk_text(lines, max_tokens, overlap_tokens):
+            yield {'source': source, 'text': text}
+
+
+class ChunkWriter:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(os.path.join(path, 'chunks.bin'), 'wb')
+        self._offsets = [0]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def write(self, chunk: dict) -> None:
+        data = orjson.dumps(chunk)
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def close(self) -> None:
+        self._file.close()
+        np.save(os.path.join(self.path, 'chunk_offsets.npy'), np.asarray(self._offsets, dtype=np.int64))
+
+
+class ChunkStore:
+    """Chunks written by ChunkWriter, looked up by their position in the order written."""
+
+    def __init__(self, path: str) -> None:
+        self.offsets = np.load(os.path.join(path, 'chunk_offsets.npy'))
+        self.data = np.memmap(os.path.join(path, 'chunks.bin'), dtype=np.uint8, mode='r')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> dict:
+        return orjson.loads(self.data[self.offsets[position]:self.offsets[position + 1]].tobytes())
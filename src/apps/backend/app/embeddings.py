@@ -0,0 +1,100 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Text embeddings as unit-length float32 rows, so that cosine similarity is a dot product.
+# Titan goes through the same Bedrock client, limiter and regions as the answers; the hashing
+# embedder needs no model and is deterministic, for tests and benchmarks.
+
+import asyncio
+import hashlib
+import os
+import re
+import numpy as np
+import orjson
+
+from app.bedrock import bedrock
+
+
+EMBEDDER = os.environ.get('EMBEDDER', 'titan')  # titan | hashing
+EMBEDDING_MODEL_ID = os.environ.get('EMBEDDING_MODEL_ID', 'amazon.titan-embed-text-v2:0')
+# Titan Text Embeddings V2 supports 256, 512 and 1024
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '512'))
+# Titan embeds one text per call, so a batch is sent as this many concurrent calls at most
+EMBEDDING_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', '8'))
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TitanEmbedder:
+
+    def __init__(self, model_id: str, dimensions: int, concurrency: int) -> None:
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.concurrency = concurrency
+        self.calls = 0
+
+    async def _embed_one(self, text: str, semaphore: asyncio.Semaphore) -> list:
+        async with semaphore:
+            self.calls += 1
+            result = await bedrock.invoke_model(
+                modelId=self.model_id,
+                contentType='application/json',
+                accept='application/json',
+                body=orjson.dumps({'inputText': text, 'dimensions': self.dimensions, 'normalize': True})
+            )
+        return result['embedding']
+
+    async def embed(self, texts: list) -> np.ndarray:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        rows = await asyncio.gather(*(self._embed_one(text, semaphore) for text in texts))
+        return normalize(np.asarray(rows, dtype=np.float32).reshape(len(texts), self.dimensions))
+
+
+class HashingEmbedder:
+    """Feature hashing of words and character trigrams into signed buckets.
+
+    Texts that share words or word parts score high, which is enough to tell paraphrases
+    from unrelated prompts in tests, though not a substitute for a trained model.
+    """
+
+    def __init__(self, dimensions: int) -> None:
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list:
+        features = []
+        for word in WORD_PATTERN.findall(text.lower()):
+            features.append(word)
+            padded = f'<{word}>'
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    async def embed(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return normalize(np.stack([self.embed_one(text) for text in texts]))
+
+
+def create_embedder(name: str):
+    if name == 'titan':
+        return TitanEmbedder(EMBEDDING_MODEL_ID, EMBEDDING_DIMENSIONS, EMBEDDING_CONCURRENCY)
+    if name == 'hashing':
+        return HashingEmbedder(EMBEDDING_DIMENSIONS)
+    raise ValueError(f'Unknown embedder: {name}')
+
+
+embedder = create_embedder(EMBEDDER)
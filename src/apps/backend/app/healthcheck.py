@@ -3,7 +3,11 @@
 # SPDX-License-Identifier: MIT-0
 ########################################################################
 
-from fastapi import status, APIRouter
+import time
+
+from enum import Enum
+from typing import Optional
+from fastapi import status, APIRouter, Response
 from pydantic import BaseModel
 
 healthcheck_router = APIRouter()
@@ -12,6 +16,36 @@ class HealthCheck(BaseModel):
     status: str
 
 
+class Phase(Enum):
+    STARTING = 'STARTING'
+    READY = 'READY'
+    DRAINING = 'DRAINING'
+
+
+class Readiness:
+    """Whether the task should receive traffic, as opposed to /health which only says the process is up."""
+
+    def __init__(self) -> None:
+        self.phase = Phase.STARTING
+        self.started_at = time.monotonic()
+        self.startup_seconds: Optional[float] = None
+
+    def set_ready(self) -> None:
+        self.phase = Phase.READY
+        self.startup_seconds = time.monotonic() - self.started_at
+
+    def set_draining(self) -> None:
+        self.phase = Phase.DRAINING
+
+
+readiness = Readiness()
+
+
+class ReadyCheck(BaseModel):
+    status: str
+    startup_seconds: Optional[float]
+
+
 @healthcheck_router.get(
     "/health",
     status_code=status.HTTP_200_OK,
@@ -19,3 +53,15 @@ class HealthCheck(BaseModel):
 )
 def get_health() -> HealthCheck:
     return HealthCheck(status='OK')
+
+
+@healthcheck_router.get(
+    "/ready",
+    status_code=status.HTTP_200_OK,
+    response_model=ReadyCheck,
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {'model': ReadyCheck}}
+)
+def get_ready(response: Response) -> ReadyCheck:
+    if readiness.phase is not Phase.READY:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadyCheck(status=readiness.phase.value, startup_seconds=readiness.startup_seconds)
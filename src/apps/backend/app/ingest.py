@@ -0,0 +1,129 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Builds the retrieval index from documents: streams and chunks them, embeds the chunks in batches
+# with up to --parallelism batches in flight, appends the vectors to a file as they arrive and
+# finally groups them into an IVF index. Documents are never held in memory as a whole. Each run
+# builds a new version of the index next to the previous ones and, once it is complete, switches the
+# link at --index to it in one rename, so a task starting meanwhile loads one version or the other.
+#
+#   cd src/apps/backend
+#   python -m app.ingest docs/ --index /data/retrieval
+#   EMBEDDER=hashing python -m app.ingest docs/ manual.md --index /tmp/retrieval --parallelism 1
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+from typing import Iterable, Iterator, Optional
+
+from app.bedrock import bedrock
+from app.documents import ChunkWriter, iter_chunks
+from app.embeddings import embedder
+from app.vectors import build_ivf, new_version, publish
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def embed_batch(embedder, batch: list) -> tuple[list, np.ndarray]:
+    return batch, await embedder.embed([chunk['text'] for chunk in batch])
+
+
+async def build_index(paths: list, path: str, embedder, batch_size: int, parallelism: int,
+                      chunk_tokens: int, overlap_tokens: int, lists: Optional[int]) -> dict:
+    started = time.perf_counter()
+    chunks = ChunkWriter(path)
+    vectors_path = os.path.join(path, 'vectors.f32')
+    pending: set[asyncio.Task] = set()
+    with open(vectors_path, 'wb') as vectors:
+
+        # Chunks and their vectors are written together, in whichever order the batches complete
+        def write(done: set) -> None:
+            for task in done:
+                batch, embedded = task.result()
+                for chunk in batch:
+                    chunks.write(chunk)
+                vectors.write(np.ascontiguousarray(embedded, dtype=np.float32).tobytes())
+
+        try:
+            for batch in batched(iter_chunks(paths, chunk_tokens, overlap_tokens), batch_size):
+                if len(pending) >= parallelism:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    write(done)
+                pending.add(asyncio.create_task(embed_batch(embedder, batch)))
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                write(done)
+        finally:
+            for task in pending:
+                task.cancel()
+    chunks.close()
+    embedded = time.perf_counter()
+
+    if not len(chunks):
+        raise ValueError(f'No text found in {", ".join(paths)}')
+    build_ivf(np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(len(chunks), embedder.dimensions)),
+              path, lists)
+    os.remove(vectors_path)
+    return {
+        'chunks': len(chunks),
+        'embed_s': round(embedded - started, 2),
+        'index_s': round(time.perf_counter() - embedded, 2),
+        'chunks_per_second': round(len(chunks) / (embedded - started), 1)
+    }
+
+
+async def ingest(paths: list, index_path: str, embedder, batch_size: int = 32, parallelism: int = 4,
+                 chunk_tokens: int = 300, overlap_tokens: int = 50, lists: Optional[int] = None) -> dict:
+    version = new_version(index_path)
+    try:
+        result = await build_index(paths, version, embedder, batch_size, parallelism,
+                                   chunk_tokens, overlap_tokens, lists)
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+    # Tasks that loaded the previous version keep reading it; it is removed when the next one is published
+    publish(index_path, version)
+    return {**result, 'version': os.path.basename(version)}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    try:
+        return await ingest(args.paths, args.index, embedder, args.batch_size, args.parallelism,
+                            args.chunk_tokens, args.overlap_tokens, args.lists)
+    finally:
+        await bedrock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Builds the retrieval index from .txt, .md and .jsonl documents')
+    parser.add_argument('paths', nargs='+', help='files or directories to ingest')
+    parser.add_argument('--index', default=os.environ.get('RETRIEVAL_INDEX_PATH'),
+                        required='RETRIEVAL_INDEX_PATH' not in os.environ,
+                        help='index directory, RETRIEVAL_INDEX_PATH by default')
+    parser.add_argument('--batch-size', type=int, default=32, help='chunks per embedding batch')
+    parser.add_argument('--parallelism', type=int, default=4, help='embedding batches in flight')
+    parser.add_argument('--chunk-tokens', type=int, default=300)
+    parser.add_argument('--overlap-tokens', type=int, default=50)
+    parser.add_argument('--lists', type=int, help='IVF lists; by default 4 * sqrt(chunks), or one list below 10,000 chunks')
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,539 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Asynchronous jobs for long generations: POST /api/jobs queues a prompt and returns at once, a pool of
+# workers in this process answers queued jobs in the background priority class, and the result is
+# fetched with GET /api/jobs/{job_id} (optionally long-polling with ?wait=) or pushed to a callback URL.
+#
+# Jobs are kept in SQLite, so they survive a restart of the process. With several tasks, JOBS_DB_PATH
+# must be on a file system they all mount (the CDK stack puts it on EFS), so that any task can answer
+# for any job: whichever task is asked reads the job from the shared database, and idle workers of every
+# task take queued jobs from it. A running job is leased to its worker; if the task stops without handing
+# it back, another task takes it over once the lease runs out.
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import os
+import socket
+import sqlite3
+import time
+import uuid
+import httpx
+
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Request, Response, status
+from pydantic import BaseModel, HttpUrl, field_validator
+
+from app.cache import CachePolicy
+from app.deadline import deadline_after, timeout_var
+from app.dialog import UserPrompt, answer_prompt
+from app.limiter import Overloaded
+from app.logger import logger
+from app.metrics import register_stats
+from app.ratelimit import allowance_var, bucket_key, token_budget
+from app.routing import router
+from app.scheduler import Priority, priority_var, tenant_var
+
+
+JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', '/tmp/genai-jobs.sqlite3')
+# Set when JOBS_DB_PATH is on a network file system such as EFS: SQLite then keeps a rollback journal,
+# as WAL needs memory shared between the processes, which only works on one host
+JOBS_DB_SHARED = os.environ.get('JOBS_DB_SHARED', 'false').lower() == 'true'
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', '4'))
+JOBS_MAX_QUEUED = int(os.environ.get('JOBS_MAX_QUEUED', '10000'))
+# Jobs shed or throttled by Bedrock are tried again later, with the delay doubling each time
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', '3'))
+JOBS_RETRY_SECONDS = float(os.environ.get('JOBS_RETRY_SECONDS', '10'))
+# Deadline of one attempt, in place of the request deadline of a synchronous call
+JOBS_TIMEOUT_SECONDS = float(os.environ.get('JOBS_TIMEOUT_SECONDS', '900'))
+# Finished jobs are deleted after this long
+JOBS_RESULT_TTL_SECONDS = int(os.environ.get('JOBS_RESULT_TTL_SECONDS', '86400'))
+JOBS_LONG_POLL_MAX_SECONDS = float(os.environ.get('JOBS_LONG_POLL_MAX_SECONDS', '30'))
+JOBS_WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get('JOBS_WEBHOOK_TIMEOUT_SECONDS', '10'))
+JOBS_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('JOBS_WEBHOOK_MAX_ATTEMPTS', '5'))
+# Callbacks carry an HMAC-SHA256 of the body in X-Signature-256 when a secret is set
+JOBS_WEBHOOK_SECRET = os.environ.get('JOBS_WEBHOOK_SECRET')
+# Comma-separated hosts that callbacks may be sent to, at whatever address. Unset, callbacks may go to
+# any host whose addresses are all public, but never to private, loopback or link-local addresses such
+# as the task metadata endpoint.
+JOBS_CALLBACK_HOSTS = frozenset(
+    host.strip().lower() for host in os.environ.get('JOBS_CALLBACK_HOSTS', '').split(',') if host.strip()
+)
+
+# Idle workers look for jobs whose retry delay has passed, and long polls for jobs finished by other
+# tasks, at least this often
+POLL_INTERVAL_SECONDS = 1.0
+# A running job is taken over by another task this long after its last attempt could have ended
+LEASE_MARGIN_SECONDS = 60.0
+CLEANUP_INTERVAL_SECONDS = 60.0
+SIGNATURE_HEADER = 'X-Signature-256'
+JOB_ID_PATTERN = r'^[0-9a-f]{32}$'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    policy TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    finished_at REAL,
+    notified INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+'''
+
+
+jobs_router = APIRouter()
+
+
+class JobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+FINISHED = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+class CallbackRejected(Exception):
+    pass
+
+
+def is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global
+
+
+# Checked on submission, without resolving the host; names are checked again when the callback is sent
+def check_callback_host(host: str) -> None:
+    host = host.strip('[]').lower()
+    if JOBS_CALLBACK_HOSTS:
+        if host not in JOBS_CALLBACK_HOSTS:
+            raise CallbackRejected(f'Callbacks to {host} are not allowed')
+        return
+    try:
+        public = is_public(host)
+    except ValueError:
+        public = host != 'localhost' and not host.endswith('.localhost')
+    if not public:
+        raise CallbackRejected(f'Callbacks to {host} are not allowed: not a public address')
+
+
+# Resolves the callback host and sends the request to an address that passed the check, so that a DNS
+# answer changing in between cannot redirect it. TLS is still verified against the host name.
+async def pin_callback(url: httpx.URL) -> tuple[httpx.URL, dict, dict]:
+    check_callback_host(url.host)
+    if JOBS_CALLBACK_HOSTS:
+        return url, {}, {}
+    infos = await asyncio.get_running_loop().getaddrinfo(url.host, url.port, type=socket.SOCK_STREAM)
+    addresses = [info[4][0] for info in infos]
+    if not all(is_public(address) for address in addresses):
+        raise CallbackRejected(f'Callbacks to {url.host} are not allowed: it resolves to a non-public address')
+    return url.copy_with(host=addresses[0]), {'Host': url.netloc.decode('ascii')}, {'sni_hostname': url.host}
+
+
+class JobRequest(UserPrompt):
+    # Receives the finished job as JSON; see JOBS_CALLBACK_HOSTS for where it may point
+    callback_url: Optional[HttpUrl] = None
+
+    @field_validator('callback_url')
+    @classmethod
+    def check_callback_url(cls, url: Optional[HttpUrl]) -> Optional[HttpUrl]:
+        if url is not None:
+            try:
+                check_callback_host(url.host)
+            except CallbackRejected as e:
+                raise ValueError(str(e)) from e
+        return url
+
+
+class Job(BaseModel):
+    job_id: str
+    status: JobStatus
+    text: Optional[str] = None
+    error: Optional[str] = None
+    session_id: Optional[str] = None
+    attempts: int
+    created_at: float
+    finished_at: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> 'Job':
+        return cls(
+            job_id=row['id'],
+            status=row['status'],
+            text=row['result'],
+            error=row['error'],
+            session_id=UserPrompt.model_validate_json(row['prompt']).session_id,
+            attempts=row['attempts'],
+            created_at=row['created_at'],
+            finished_at=row['finished_at']
+        )
+
+
+class JobStore:
+    """The jobs table. All access goes through one thread, so the event loop never waits on disk
+    and SQLite sees a single writer."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jobs-db')
+        self._db: Optional[sqlite3.Connection] = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        await self._run(self._open)
+
+    def _open(self) -> None:
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        if JOBS_DB_SHARED:
+            self._db.execute('PRAGMA journal_mode=DELETE')
+        else:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        # Databases created before jobs were leased, or when they kept the submitter's API key
+        columns = {row['name'] for row in self._db.execute('PRAGMA table_info(jobs)')}
+        if 'lease_until' not in columns:
+            self._db.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL')
+        if 'tenant' in columns:
+            self._db.execute('ALTER TABLE jobs RENAME COLUMN tenant TO bucket')
+            for row in self._db.execute('SELECT DISTINCT bucket FROM jobs').fetchall():
+                self._db.execute('UPDATE jobs SET bucket = ? WHERE bucket = ?',
+                                 (bucket_key(row['bucket']), row['bucket']))
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+    async def insert(self, job_id: str, prompt: str, policy: str, bucket: str,
+                     callback_url: Optional[str]) -> sqlite3.Row:
+        now = time.time()
+        return await self._run(self._fetch, '''
+            INSERT INTO jobs (id, status, prompt, policy, bucket, callback_url, created_at, available_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING *
+        ''', (job_id, JobStatus.QUEUED.value, prompt, policy, bucket, callback_url, now, now))
+
+    # Takes the queued job that has been available longest, or a running one whose lease has run out
+    async def claim(self, lease: float) -> Optional[sqlite3.Row]:
+        now = time.time()
+        return await self._run(self._fetch, '''
+            UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?
+            WHERE id = (
+                SELECT id FROM jobs WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?)
+                ORDER BY available_at LIMIT 1
+            )
+            RETURNING *
+        ''', (JobStatus.RUNNING.value, now + lease, JobStatus.QUEUED.value, now, JobStatus.RUNNING.value, now))
+
+    async def finish(self, job_id: str, job_status: JobStatus, result: Optional[str],
+                     error: Optional[str]) -> Optional[sqlite3.Row]:
+        return await self._run(self._fetch, '''
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? RETURNING *
+        ''', (job_status.value, result, error, time.time(), job_id))
+
+    async def retry(self, job_id: str, delay: float, error: str) -> None:
+        await self._run(self._execute, 'UPDATE jobs SET status = ?, error = ?, available_at = ? WHERE id = ?',
+                        (JobStatus.QUEUED.value, error, time.time() + delay, job_id))
+
+    async def mark_notified(self, job_id: str) -> None:
+        await self._run(self._execute, 'UPDATE jobs SET notified = 1 WHERE id = ?', (job_id,))
+
+    async def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        return await self._run(self._fetch, 'SELECT * FROM jobs WHERE id = ?', (job_id,))
+
+    # Hands jobs this process was running back to the queue
+    async def release(self, job_ids: list) -> None:
+        await self._run(self._execute, f'''
+            UPDATE jobs SET status = ?, lease_until = NULL WHERE status = ? AND id IN ({', '.join('?' * len(job_ids))})
+        ''', (JobStatus.QUEUED.value, JobStatus.RUNNING.value, *job_ids))
+
+    # Callbacks still owed for finished jobs. With several tasks, each one delivers them when it starts,
+    # so callbacks are delivered at least once; the job ID in the body tells repeats apart.
+    async def undelivered(self) -> list[sqlite3.Row]:
+        return await self._run(self._fetch_all, '''
+            SELECT * FROM jobs WHERE status IN (?, ?) AND callback_url IS NOT NULL AND notified = 0
+        ''', tuple(s.value for s in FINISHED))
+
+    async def expire(self, ttl: float) -> int:
+        return await self._run(self._execute, 'DELETE FROM jobs WHERE finished_at < ?', (time.time() - ttl,))
+
+    async def count(self, job_status: JobStatus) -> int:
+        row = await self._run(self._fetch, 'SELECT COUNT(*) FROM jobs WHERE status = ?', (job_status.value,))
+        return row[0]
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        return self._db.execute(sql, params).rowcount
+
+    # Reads every row so that statements with RETURNING run to completion and commit
+    def _fetch(self, sql: str, params: tuple) -> Optional[sqlite3.Row]:
+        rows = self._db.execute(sql, params).fetchall()
+        return rows[0] if rows else None
+
+    def _fetch_all(self, sql: str, params: tuple) -> list[sqlite3.Row]:
+        return self._db.execute(sql, params).fetchall()
+
+
+class JobQueue:
+    """Runs queued jobs on a pool of worker tasks and tells waiters and callbacks when they finish."""
+
+    def __init__(self, store: JobStore, workers: int, max_queued: int) -> None:
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.store_errors = 0
+        self.webhook_failures = 0
+        self._tasks: list[asyncio.Task] = []
+        self._deliveries: set[asyncio.Task] = set()
+        self._waiters: dict[str, asyncio.Event] = {}
+        self._claimed: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        await self.store.open()
+        undelivered = await self.store.undelivered()
+        self.queued = await self.store.count(JobStatus.QUEUED)
+        self._http = httpx.AsyncClient(timeout=JOBS_WEBHOOK_TIMEOUT_SECONDS)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._clean_up()))
+        for row in undelivered:
+            self._notify(row)
+        if self.queued:
+            logger.info('jobs resumed', extra={'fields': {'queued': self.queued}})
+
+    async def close(self) -> None:
+        for task in [*self._tasks, *self._deliveries]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._deliveries, return_exceptions=True)
+        self._tasks = []
+        if self._claimed:
+            await self.store.release(list(self._claimed))
+            self._claimed.clear()
+        if self._http is not None:
+            await self._http.aclose()
+        await self.store.close()
+
+    # The job is charged to the submitter's rate limit bucket, whose key is kept instead of their API key
+    async def submit(self, prompt: UserPrompt, policy: CachePolicy, bucket: str,
+                     callback_url: Optional[str]) -> Job:
+        if self.queued >= self.max_queued:
+            raise Overloaded('Too many jobs queued')
+        row = await self.store.insert(uuid.uuid4().hex, prompt.model_dump_json(), policy.value, bucket, callback_url)
+        self.queued += 1
+        self.submitted += 1
+        self._wakeup.set()
+        return Job.from_row(row)
+
+    # Waits up to `wait` seconds for the job to finish. A job run by this process wakes the waiter as soon
+    # as it finishes; one run by another task is seen at the next read of the store.
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Job]:
+        loop = asyncio.get_running_loop()
+        until = loop.time() + wait
+        row = await self.store.get(job_id)
+        while row is not None and row['status'] not in FINISHED and (left := until - loop.time()) > 0:
+            event = self._waiters.setdefault(job_id, asyncio.Event())
+            try:
+                async with asyncio.timeout(min(left, POLL_INTERVAL_SECONDS)):
+                    await event.wait()
+            except TimeoutError:
+                pass
+            row = await self.store.get(job_id)
+        if row is not None and row['status'] in FINISHED:
+            self._waiters.pop(job_id, None)
+        return Job.from_row(row) if row is not None else None
+
+    # A shared store on EFS can be locked by another task or briefly unreachable; the worker waits and
+    # goes on. A job whose result could not be stored stays claimed, to be handed back by close() or
+    # taken over once its lease runs out.
+    async def _work(self) -> None:
+        while True:
+            try:
+                await self._work_once()
+            except sqlite3.Error as e:
+                self.store_errors += 1
+                logger.warning('job store failed', exc_info=e)
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    async def _work_once(self) -> None:
+        self._wakeup.clear()
+        row = await self.store.claim(JOBS_TIMEOUT_SECONDS + LEASE_MARGIN_SECONDS)
+        if row is None:
+            # Other tasks submit and take jobs too
+            self.queued = await self.store.count(JobStatus.QUEUED)
+            try:
+                async with asyncio.timeout(POLL_INTERVAL_SECONDS):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+            return
+
+        self.queued = max(0, self.queued - 1)
+        self.running += 1
+        # Left claimed if the worker is cancelled, so that close() hands the job back
+        self._claimed.add(row['id'])
+        try:
+            await self._run(row)
+            self._claimed.discard(row['id'])
+        finally:
+            self.running -= 1
+
+    async def _run(self, row: sqlite3.Row) -> None:
+        prompt = UserPrompt.model_validate_json(row['prompt'])
+        priority_token = priority_var.set(Priority.BACKGROUND)
+        # The bucket also stands in for the tenant when the scheduler shares the background class out
+        tenant_token = tenant_var.set(row['bucket'])
+        allowance_token = allowance_var.set(token_budget.bucket_allowance(row['bucket']))
+        try:
+            with deadline_after(JOBS_TIMEOUT_SECONDS):
+                output, _ = await answer_prompt(prompt, CachePolicy(row['policy']))
+        except Overloaded as e:
+            if row['attempts'] < JOBS_MAX_ATTEMPTS:
+                await self.store.retry(row['id'], JOBS_RETRY_SECONDS * 2 ** (row['attempts'] - 1), e.reason)
+                self.queued += 1
+                self.retried += 1
+                return
+            finished = await self.store.finish(row['id'], JobStatus.FAILED, None, e.reason)
+        except Exception as e:
+            logger.warning('job failed', exc_info=e, extra={'fields': {'job_id': row['id']}})
+            finished = await self.store.finish(row['id'], JobStatus.FAILED, None, f'{type(e).__name__}: {e}')
+        else:
+            finished = await self.store.finish(row['id'], JobStatus.SUCCEEDED, output.text, None)
+        finally:
+            allowance_var.reset(allowance_token)
+            tenant_var.reset(tenant_token)
+            priority_var.reset(priority_token)
+
+        # The job was deleted while it ran, e.g. expired by another task after a long outage
+        if finished is None:
+            self._waiters.pop(row['id'], None)
+            return
+        if finished['status'] == JobStatus.SUCCEEDED:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        if (event := self._waiters.pop(row['id'], None)) is not None:
+            event.set()
+        self._notify(finished)
+
+    def _notify(self, row: sqlite3.Row) -> None:
+        if row['callback_url'] is None:
+            return
+        task = asyncio.create_task(self._deliver(row['id'], row['callback_url'], Job.from_row(row)))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    # Retried with backoff on connection errors, 429 and 5xx; any other answer, or a host that is not
+    # allowed, ends the delivery
+    async def _deliver(self, job_id: str, url: str, job: Job) -> None:
+        body = job.model_dump_json().encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if JOBS_WEBHOOK_SECRET:
+            signature = hmac.new(JOBS_WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers[SIGNATURE_HEADER] = f'sha256={signature}'
+
+        delay = 1.0
+        error = None
+        for attempt in range(1, JOBS_WEBHOOK_MAX_ATTEMPTS + 1):
+            try:
+                target, pinned_headers, extensions = await pin_callback(httpx.URL(url))
+                response = await self._http.post(target, content=body, headers={**headers, **pinned_headers},
+                                                 extensions=extensions)
+                if response.status_code != 429 and response.status_code < 500:
+                    if response.is_error:
+                        error = f'HTTP {response.status_code}'
+                    break
+                error = f'HTTP {response.status_code}'
+            except CallbackRejected as e:
+                error = str(e)
+                break
+            except (httpx.HTTPError, OSError) as e:
+                error = type(e).__name__
+            if attempt < JOBS_WEBHOOK_MAX_ATTEMPTS:
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        if error is not None:
+            self.webhook_failures += 1
+            logger.warning('job callback failed', extra={'fields': {'job_id': job_id, 'error': error}})
+        await self.store.mark_notified(job_id)
+
+    async def _clean_up(self) -> None:
+        while True:
+            await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+            try:
+                await self.store.expire(JOBS_RESULT_TTL_SECONDS)
+            except sqlite3.Error as e:
+                logger.warning('job cleanup failed', exc_info=e)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queued,
+            'running': self.running,
+            'workers': self.workers,
+            'submitted': self.submitted,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'retried': self.retried,
+            'store_errors': self.store_errors,
+            'webhook_failures': self.webhook_failures
+        }
+
+
+job_queue = JobQueue(JobStore(JOBS_DB_PATH), workers=JOBS_WORKERS, max_queued=JOBS_MAX_QUEUED)
+
+register_stats('genai_jobs', job_queue.stats,
+               counters=['submitted', 'succeeded', 'failed', 'retried', 'store_errors', 'webhook_failures'])
+
+
+@jobs_router.post("/jobs", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: JobRequest, http_request: Request, response: Response,
+                     cache_control: Optional[str] = Header(default=None)) -> Job:
+    if request.model is not None and request.model not in router.models:
+        raise HTTPException(status_code=422, detail=f'Unknown model: {request.model}')
+    prompt = UserPrompt(**request.model_dump(exclude={'callback_url'}))
+    callback_url = str(request.callback_url) if request.callback_url is not None else None
+    client = http_request.client
+    bucket = bucket_key(tenant_var.get(), client.host if client else None)
+    job = await job_queue.submit(prompt, CachePolicy.from_header(cache_control), bucket, callback_url)
+    response.headers['Location'] = f'/api/jobs/{job.job_id}'
+    return job
+
+
+# ?wait=N holds the request until the job finishes or N seconds pass, within the requested timeout
+@jobs_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str = Path(pattern=JOB_ID_PATTERN),
+                  wait: float = Query(default=0, ge=0, le=JOBS_LONG_POLL_MAX_SECONDS)) -> Job:
+    wait = max(0.0, min(wait, timeout_var.get() - 1))
+    job = await job_queue.get(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return job
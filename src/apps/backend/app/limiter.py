@@ -0,0 +1,244 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import asyncio
+import os
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+from app.metrics import LIMITER_WAIT
+
+
+LIMITER_INITIAL_LIMIT = int(os.environ.get('LIMITER_INITIAL_LIMIT', '16'))
+LIMITER_MIN_LIMIT = int(os.environ.get('LIMITER_MIN_LIMIT', '1'))
+LIMITER_BACKOFF_RATIO = float(os.environ.get('LIMITER_BACKOFF_RATIO', '0.7'))
+# A latency sample this many times above the learned baseline counts as congestion
+LIMITER_LATENCY_TOLERANCE = float(os.environ.get('LIMITER_LATENCY_TOLERANCE', '2.0'))
+# Queue size and longest wait of interactive callers; other priority classes have their own
+LIMITER_MAX_QUEUE = int(os.environ.get('LIMITER_MAX_QUEUE', '64'))
+LIMITER_MAX_WAIT_SECONDS = float(os.environ.get('LIMITER_MAX_WAIT_SECONDS', '5'))
+LIMITER_RETRY_AFTER_SECONDS = int(os.environ.get('LIMITER_RETRY_AFTER_SECONDS', '2'))
+
+# Throttles from calls that were already in flight describe the same overload, so decrease at most this often
+DECREASE_INTERVAL_SECONDS = 1.0
+BASELINE_SMOOTHING = 0.05
+
+
+class Overloaded(Exception):
+
+    def __init__(self, reason: str, retry_after: int = LIMITER_RETRY_AFTER_SECONDS) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# Bedrock itself kept throttling after retries, as opposed to this task shedding load locally
+class Throttled(Overloaded):
+    pass
+
+
+@dataclass(frozen=True)
+class Lane:
+    """A class of callers with its own share of the limit and its own queue."""
+    # Relative share of the slots that free up while several lanes are waiting
+    weight: float
+    # Fraction of the limit the lane may hold at once
+    share: float
+    max_queue: int
+    max_wait: float
+
+
+class FairQueue:
+    """FIFO queues per flow, served in proportion to the flows' weights.
+
+    Stride scheduling: pop() serves the waiting flow with the lowest pass and advances its pass by
+    1/weight. A flow that was idle starts at the pass last served, so it cannot save up credit.
+    """
+
+    def __init__(self) -> None:
+        self._flows: dict[Hashable, deque] = {}
+        self._passes: dict[Hashable, float] = {}
+        self._weights: dict[Hashable, float] = {}
+        self._virtual_time = 0.0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, flow: Hashable, item, weight: float = 1.0) -> None:
+        if flow not in self._flows:
+            self._flows[flow] = deque()
+            self._passes[flow] = self._virtual_time
+        self._weights[flow] = weight
+        self._flows[flow].append(item)
+        self._size += 1
+
+    def pop(self):
+        flow = min(self._flows, key=self._passes.__getitem__)
+        item = self._flows[flow].popleft()
+        self._virtual_time = self._passes[flow]
+        self._passes[flow] += 1 / self._weights[flow]
+        self._size -= 1
+        if not self._flows[flow]:
+            self._forget(flow)
+        return item
+
+    def remove(self, flow: Hashable, item) -> None:
+        self._flows[flow].remove(item)
+        self._size -= 1
+        if not self._flows[flow]:
+            self._forget(flow)
+
+    def _forget(self, flow: Hashable) -> None:
+        del self._flows[flow], self._passes[flow], self._weights[flow]
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit learned from throttles and latency.
+
+    The limit grows by one per round trip while calls succeed at the baseline latency and
+    shrinks multiplicatively on throttling or latency inflation. Callers over the limit wait
+    in a short queue per lane; when the queue is full or the wait is too long they are shed
+    with Overloaded instead of piling up. Freed slots go to the waiting lanes by weight, and
+    within a lane to its flows (tenants) by weight, via stride scheduling.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, backoff_ratio: float,
+                 latency_tolerance: float, lanes: dict[str, Lane]) -> None:
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.lanes = lanes
+        self.in_flight = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.baseline_latency: Optional[float] = None
+        self.lane_in_flight = {name: 0 for name in lanes}
+        self.lane_rejected = {name: 0 for name in lanes}
+        self._last_decrease = 0.0
+        self._queues = {name: FairQueue() for name in lanes}
+        self._passes = {name: 0.0 for name in lanes}
+        self._virtual_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def lane_limit(self, lane: str) -> int:
+        return max(1, int(self.limit * self.lanes[lane].share))
+
+    def _has_room(self, lane: str) -> bool:
+        return self.in_flight < int(self.limit) and self.lane_in_flight[lane] < self.lane_limit(lane)
+
+    def _take(self, lane: str) -> None:
+        self.acquired += 1
+        self.in_flight += 1
+        self.lane_in_flight[lane] += 1
+
+    async def acquire(self, lane: str, flow: Hashable = None, weight: float = 1.0) -> None:
+        queue = self._queues[lane]
+        if not queue and self._has_room(lane):
+            self._take(lane)
+            LIMITER_WAIT.labels(lane).observe(0)
+            return
+
+        if len(queue) >= self.lanes[lane].max_queue:
+            self.rejected += 1
+            self.lane_rejected[lane] += 1
+            raise Overloaded('Too many requests queued for Bedrock')
+
+        if not queue:
+            self._passes[lane] = max(self._passes[lane], self._virtual_time)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.push(flow, waiter, weight)
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.lanes[lane].max_wait):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as this caller gave up, pass it on
+                self.release(lane)
+            else:
+                waiter.cancel()
+                queue.remove(flow, waiter)
+
+            if isinstance(e, TimeoutError):
+                self.rejected += 1
+                self.lane_rejected[lane] += 1
+                raise Overloaded('Timed out waiting for Bedrock capacity') from None
+            raise
+        LIMITER_WAIT.labels(lane).observe(time.monotonic() - started)
+
+    def release(self, lane: str) -> None:
+        self.in_flight -= 1
+        self.lane_in_flight[lane] -= 1
+        self._wake()
+
+    # latency is normalized for answer length (seconds per output token) so samples are comparable
+    def on_success(self, latency: Optional[float] = None) -> None:
+        if latency is not None:
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            else:
+                self.baseline_latency += BASELINE_SMOOTHING * (latency - self.baseline_latency)
+
+            if latency > self.latency_tolerance * self.baseline_latency:
+                self._decrease()
+                return
+
+        # Only grow while the current limit is actually being used
+        if self.in_flight >= int(self.limit) - 1:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_throttle(self) -> None:
+        self.throttled += 1
+        self._decrease()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_INTERVAL_SECONDS:
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+
+    def _wake(self) -> None:
+        while self.in_flight < int(self.limit):
+            ready = [lane for lane, queue in self._queues.items() if queue and self._has_room(lane)]
+            if not ready:
+                return
+            lane = min(ready, key=self._passes.__getitem__)
+            self._virtual_time = self._passes[lane]
+            self._passes[lane] += 1 / self.lanes[lane].weight
+            waiter = self._queues[lane].pop()
+            if not waiter.done():
+                self._take(lane)
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'acquired': self.acquired,
+            'throttled': self.throttled,
+            'rejected': self.rejected,
+            'baseline_latency': self.baseline_latency,
+            'lanes': {
+                lane: {
+                    'limit': self.lane_limit(lane),
+                    'in_flight': self.lane_in_flight[lane],
+                    'queue_depth': len(self._queues[lane]),
+                    'rejected': self.lane_rejected[lane]
+                }
+                for lane in self.lanes
+            }
+        }
@@ -0,0 +1,189 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Structured JSON logging that stays off the request path: handlers only put records on a
+# bounded queue, and a background thread formats and writes them to stdout (awslogs).
+#
+#   logger.info('answer', extra={'fields': {'model': model_id, 'text': output}})
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.metrics import register_stats
+
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+# String fields longer than this are cut, so a multi-KB answer costs a few hundred bytes of log
+LOG_MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', '256'))
+# Logs prompts and answers in full; meant for debugging only
+LOG_FULL_BODY = os.environ.get('LOG_FULL_BODY', 'false').lower() == 'true'
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+# Per-path overrides as path=rate pairs matched by longest prefix, e.g. /api/prompt=0.1,/api/health=0
+LOG_SAMPLE_RATES = {
+    path.strip(): float(rate)
+    for path, rate in (pair.split('=', 1) for pair in os.environ.get('LOG_SAMPLE_RATES', '').split(',') if pair.strip())
+}
+
+REQUEST_ID_HEADER = 'x-request-id'
+
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+sampled_var: ContextVar[bool] = ContextVar('sampled', default=True)
+
+logger = logging.getLogger('genai')
+
+
+def sample_rate(path: str) -> float:
+    matches = [prefix for prefix in LOG_SAMPLE_RATES if path.startswith(prefix)]
+    return LOG_SAMPLE_RATES[max(matches, key=len)] if matches else LOG_SAMPLE_RATE
+
+
+def truncate(value):
+    if LOG_FULL_BODY or not isinstance(value, str) or len(value) <= LOG_MAX_FIELD_CHARS:
+        return value
+    return f'{value[:LOG_MAX_FIELD_CHARS]}…(+{len(value) - LOG_MAX_FIELD_CHARS} chars)'
+
+
+class JsonFormatter(logging.Formatter):
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for name, value in getattr(record, 'fields', {}).items():
+            entry[name] = truncate(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Tags records with the request ID and drops unsampled requests' records below WARNING.
+
+    Runs in the caller, where the request's context variables are visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return record.levelno >= logging.WARNING or sampled_var.get()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Drops records when the queue is full instead of blocking or raising in the request path."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    # Formatting is left to the listener thread; the record only crosses threads within this process
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(ContextFilter())
+
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(JsonFormatter())
+listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+
+def setup_logging() -> None:
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn's own loggers go through the queue too; its access log is replaced by RequestContextMiddleware
+    for name in ('uvicorn', 'uvicorn.error', 'uvicorn.access'):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger('uvicorn.access').disabled = True
+
+    if listener._thread is None:
+        listener.start()
+
+
+# Flushes what is still queued; called on shutdown
+def stop_logging() -> None:
+    if listener._thread is not None:
+        listener.stop()
+
+
+def logging_stats() -> dict:
+    return {
+        'queue_depth': log_queue.qsize(),
+        'dropped': queue_handler.dropped
+    }
+
+
+register_stats('genai_logging', logging_stats, counters=['dropped'])
+
+
+class RequestContextMiddleware:
+    """Assigns each request an ID (or adopts the caller's X-Request-ID), echoes it in the response,
+    decides once whether the request's logs are sampled and writes one access log line."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b'').decode('latin-1')[:64] or uuid.uuid4().hex
+        request_id_token = request_id_var.set(request_id)
+        sampled_token = sampled_var.set(random.random() < sample_rate(scope['path']))
+        status = 500
+
+        async def send_with_request_id(message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message['headers'] = [*message.get('headers', []), (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            route = scope.get('route')
+            logger.log(
+                logging.WARNING if status >= 500 else logging.INFO,
+                'request',
+                extra={'fields': {
+                    'method': scope['method'],
+                    'route': route.path if route is not None else scope['path'],
+                    'status': status,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+                }}
+            )
+            sampled_var.reset(sampled_token)
+            request_id_var.reset(request_id_token)
@@ -0,0 +1,168 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import time
+
+from typing import Callable, Iterable, Optional
+from fastapi import APIRouter, Response
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+
+metrics_router = APIRouter()
+
+
+# Generations take seconds to minutes, so the default sub-second buckets are too fine
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TTFT_BUCKETS = (0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+TOKEN_RATE_BUCKETS = (5, 10, 20, 30, 40, 50, 60, 80, 100, 150, 200)
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+HTTP_REQUEST_LATENCY = Histogram(
+    'genai_http_request_duration_seconds',
+    'Time to serve a request, including the whole body of streamed responses',
+    ['route', 'method'],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS = Counter(
+    'genai_http_requests',
+    'Requests served',
+    ['route', 'method', 'status']
+)
+HTTP_IN_FLIGHT = Gauge(
+    'genai_http_requests_in_flight',
+    'Requests currently being served'
+)
+ERRORS = Counter(
+    'genai_errors',
+    'Errors by where they were raised and exception type or AWS error code',
+    ['source', 'type']
+)
+
+BEDROCK_LATENCY = Histogram(
+    'genai_bedrock_request_duration_seconds',
+    'Bedrock call duration, until the end of the stream for converse_stream',
+    ['operation', 'model', 'region'],
+    buckets=LATENCY_BUCKETS
+)
+BEDROCK_TTFT = Histogram(
+    'genai_bedrock_time_to_first_token_seconds',
+    'Time from calling converse_stream to the first content delta',
+    ['model', 'region'],
+    buckets=TTFT_BUCKETS
+)
+BEDROCK_TOKENS = Counter(
+    'genai_bedrock_tokens',
+    'Tokens reported in the usage block of Bedrock responses',
+    ['direction', 'model']
+)
+BEDROCK_TOKEN_RATE = Histogram(
+    'genai_bedrock_output_tokens_per_second',
+    'Output tokens per second of generation time, per call',
+    buckets=TOKEN_RATE_BUCKETS
+)
+
+LIMITER_WAIT = Histogram(
+    'genai_limiter_wait_seconds',
+    'Time a Bedrock call waited for a concurrency slot, by priority class',
+    ['priority'],
+    buckets=WAIT_BUCKETS
+)
+
+
+def record_usage(operation: str, model_id: str, region: str, usage: dict, elapsed: float) -> None:
+    BEDROCK_LATENCY.labels(operation, model_id, region).observe(elapsed)
+    BEDROCK_TOKENS.labels('input', model_id).inc(usage.get('inputTokens', 0))
+    BEDROCK_TOKENS.labels('output', model_id).inc(usage.get('outputTokens', 0))
+    # Reported when prompt caching is in use; inputTokens then only counts the uncached part
+    BEDROCK_TOKENS.labels('cache_read', model_id).inc(usage.get('cacheReadInputTokens', 0))
+    BEDROCK_TOKENS.labels('cache_write', model_id).inc(usage.get('cacheWriteInputTokens', 0))
+    if elapsed > 0 and usage.get('outputTokens'):
+        BEDROCK_TOKEN_RATE.observe(usage['outputTokens'] / elapsed)
+
+
+class StatsCollector(Collector):
+    """Exposes a component's stats() dict at scrape time, so the hot path pays nothing for it.
+
+    With a label, stats() returns one such dict per label value, e.g. per region.
+    """
+
+    def __init__(self, namespace: str, stats: Callable[[], dict], counters: Iterable[str] = (),
+                 label: Optional[str] = None) -> None:
+        self.namespace = namespace
+        self.stats = stats
+        self.counters = set(counters)
+        self.label = label
+
+    def collect(self):
+        rows = self.stats().items() if self.label else [(None, self.stats())]
+        families = {}
+        for label_value, stats in rows:
+            for name, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if name not in families:
+                    family = CounterMetricFamily if name in self.counters else GaugeMetricFamily
+                    families[name] = family(f'{self.namespace}_{name}', f'{self.namespace} {name}',
+                                            labels=[self.label] if self.label else [])
+                families[name].add_metric([label_value] if self.label else [], value)
+        yield from families.values()
+
+
+def register_stats(namespace: str, stats: Callable[[], dict], counters: Iterable[str] = (),
+                   label: Optional[str] = None) -> None:
+    REGISTRY.register(StatsCollector(namespace, stats, counters, label))
+
+
+class InFlight:
+    """Requests being served, kept as a plain count so that the autoscaling metrics can sample it cheaply."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+
+http_in_flight = InFlight()
+HTTP_IN_FLIGHT.set_function(lambda: http_in_flight.count)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware so that streamed responses are timed until their last chunk."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        http_in_flight.count += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            ERRORS.labels('http', type(e).__name__).inc()
+            raise
+        finally:
+            http_in_flight.count -= 1
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = scope.get('route')
+            path = route.path if route is not None else 'unmatched'
+            HTTP_REQUEST_LATENCY.labels(path, scope['method']).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(path, scope['method'], str(status)).inc()
+
+
+@metrics_router.get("/metrics")
+def get_metrics() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,76 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Bedrock prompt caching: a cachePoint block marks the end of a prefix that Bedrock may keep
+# for a few minutes, so later requests sharing it are billed and prefilled at the cached rate.
+# https://docs.aws.amazon.com/bedrock/latest/userguide/prompt-caching.html
+
+import os
+import re
+
+from app.tokens import estimate_message_tokens, estimate_tokens
+
+
+PROMPT_CACHE_ENABLED = os.environ.get('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'
+# Prefixes shorter than the model's minimum are not cached, so a checkpoint there is wasted
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get('PROMPT_CACHE_MIN_TOKENS', '1024'))
+# A single block this large in the new user turn, e.g. a pasted document, gets its own checkpoint
+PROMPT_CACHE_LARGE_BLOCK_TOKENS = int(os.environ.get('PROMPT_CACHE_LARGE_BLOCK_TOKENS', '2048'))
+
+# Models that accept cachePoint blocks; others reject the request, so configure per model if in doubt
+PROMPT_CACHE_MODEL_PATTERN = re.compile(
+    r'claude-3-5-haiku|claude-3-7-sonnet|claude-sonnet-4|claude-opus-4|amazon\.nova-'
+)
+MAX_CACHE_POINTS = 4
+
+CACHE_POINT = {'cachePoint': {'type': 'default'}}
+
+
+def supports_prompt_cache(model_id: str) -> bool:
+    return PROMPT_CACHE_MODEL_PATTERN.search(model_id) is not None
+
+
+def block_tokens(block: dict) -> int:
+    if 'text' in block:
+        return estimate_tokens(block['text'])
+    if 'document' in block:
+        return len(block['document'].get('source', {}).get('bytes', b'')) // 4
+    return 0
+
+
+# Returns a copy of a Converse request with checkpoints after the system prompt, after the history
+# that precedes the new user turn, and after large blocks of that turn, wherever the prefix up to
+# that point is long enough to be cached.
+def add_cache_points(request: dict, min_tokens: int = PROMPT_CACHE_MIN_TOKENS,
+                     large_block_tokens: int = PROMPT_CACHE_LARGE_BLOCK_TOKENS) -> dict:
+    system = list(request.get('system', []))
+    messages = [{**message, 'content': list(message['content'])} for message in request['messages']]
+    budget = MAX_CACHE_POINTS
+
+    prefix = sum(block_tokens(block) for block in system)
+    if system and prefix >= min_tokens:
+        system.append(CACHE_POINT)
+        budget -= 1
+
+    history, turn = messages[:-1], messages[-1]
+    prefix += estimate_message_tokens(history)
+    if history and prefix >= min_tokens and budget:
+        history[-1]['content'].append(CACHE_POINT)
+        budget -= 1
+
+    content = []
+    for block in turn['content']:
+        content.append(block)
+        tokens = block_tokens(block)
+        prefix += tokens
+        if tokens >= large_block_tokens and prefix >= min_tokens and budget:
+            content.append(CACHE_POINT)
+            budget -= 1
+    turn['content'] = content
+
+    prepared = {**request, 'messages': messages}
+    if 'system' in request:
+        prepared['system'] = system
+    return prepared
@@ -0,0 +1,353 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Token budgets per caller. Every caller, identified by its X-API-Key or else by its address, has a token
+# bucket that refills at its tokens-per-minute rate. A Bedrock call takes its estimated input tokens plus
+# the output it may produce from the bucket before it starts, and is settled against the usage Bedrock
+# reports afterwards, so a bucket can run into debt that the caller's next requests have to wait out.
+# A caller in debt is turned away with 429 before its request body is read.
+
+import hashlib
+import math
+import os
+import time
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+from fastapi.responses import ORJSONResponse
+from prometheus_client import Counter
+
+from app.cache import CACHE_REDIS_URL
+from app.limiter import Overloaded
+from app.logger import logger
+from app.metrics import register_stats
+from app.scheduler import tenant_var
+from app.tokens import estimate_message_tokens, estimate_tokens
+
+
+# Off by default: X-API-Key is not verified, and callers without one are told apart by address, which
+# behind a proxy or Service Connect is the proxy's. Turn it on where an upstream authenticates the keys.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'none')  # memory | redis | none
+RATE_LIMIT_TOKENS_PER_MINUTE = int(os.environ.get('RATE_LIMIT_TOKENS_PER_MINUTE', '100000'))
+# Budgets of callers that pay for more or less, as api_key=tokens_per_minute pairs
+RATE_LIMIT_TENANT_TOKENS_PER_MINUTE = {
+    key.strip(): int(tokens)
+    for key, tokens in (
+        pair.split('=', 1) for pair in os.environ.get('RATE_LIMIT_TENANT_TOKENS_PER_MINUTE', '').split(',') if pair.strip()
+    )
+}
+# A full bucket holds this many minutes of budget, the largest burst after a quiet period
+RATE_LIMIT_BURST_MINUTES = float(os.environ.get('RATE_LIMIT_BURST_MINUTES', '1.0'))
+# Output reserved for a request that does not set inferenceConfig.maxTokens
+RATE_LIMIT_OUTPUT_TOKENS = int(os.environ.get('RATE_LIMIT_OUTPUT_TOKENS', '512'))
+# Requests checked for a budget before they are read, matched by path prefix (POST only)
+RATE_LIMIT_PATHS = tuple(
+    path.strip() for path in os.environ.get('RATE_LIMIT_PATHS', '/api/prompt,/api/jobs').split(',') if path.strip()
+)
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get('RATE_LIMIT_MAX_BUCKETS', '10000'))
+# Shared by every task, so that a caller's budget does not grow with the number of tasks
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', CACHE_REDIS_URL)
+
+KEY_PREFIX = 'genai:ratelimit:'
+
+RATE_LIMITED = Counter(
+    'genai_rate_limited_requests',
+    'Requests turned away for lack of token budget, on arrival or when reserving tokens for a Bedrock call',
+    ['stage']
+)
+
+# Refill, take and expire in one round trip. Redis returns Lua numbers as integers, hence the tostring.
+TAKE_SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = force or tokens >= math.min(cost, capacity)
+if allowed then
+    tokens = math.min(capacity, tokens - cost)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed and 1 or 0, tostring(tokens)}
+'''
+
+
+class RateLimited(Overloaded):
+    pass
+
+
+@dataclass
+class Allowance:
+    """The bucket a request is charged to and what was left in it when last seen."""
+    key: str
+    tokens_per_minute: int
+    remaining: float
+
+    def headers(self) -> list:
+        return [
+            (b'x-ratelimit-limit-tokens', str(self.tokens_per_minute).encode()),
+            (b'x-ratelimit-remaining-tokens', str(max(0, int(self.remaining))).encode())
+        ]
+
+
+allowance_var: ContextVar[Optional[Allowance]] = ContextVar('allowance', default=None)
+
+
+# API keys are hashed so that they do not end up in the shared store
+def bucket_key(tenant: str, client: Optional[str] = None) -> str:
+    if tenant:
+        return 'key:' + hashlib.sha256(tenant.encode()).hexdigest()[:32]
+    return 'ip:' + (client or 'unknown')
+
+
+# Everything Bedrock counts against the token quota, cached prompt tokens included
+def used_tokens(usage: dict) -> int:
+    return (usage.get('inputTokens', 0) + usage.get('outputTokens', 0)
+            + usage.get('cacheReadInputTokens', 0) + usage.get('cacheWriteInputTokens', 0))
+
+
+def estimate_request_tokens(request: dict) -> int:
+    system = sum(estimate_tokens(block['text']) for block in request.get('system', []) if 'text' in block)
+    output = request.get('inferenceConfig', {}).get('maxTokens', RATE_LIMIT_OUTPUT_TOKENS)
+    return estimate_message_tokens(request['messages']) + system + output
+
+
+class MemoryBuckets:
+
+    def __init__(self, max_buckets: int) -> None:
+        self.max_buckets = max_buckets
+        self.evictions = 0
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    # A cost above the capacity is let through from a full bucket, leaving it in debt
+    async def take(self, key: str, cost: float, capacity: float, rate: float, force: bool = False) -> tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = force or tokens >= min(cost, capacity)
+        if allowed:
+            tokens = min(capacity, tokens - cost)
+
+        # Least recently used buckets go first; a forgotten bucket starts over full
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return allowed, tokens
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBuckets:
+
+    def __init__(self, url: str) -> None:
+        import redis.asyncio as redis
+
+        self.url = url
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, cost: float, capacity: float, rate: float, force: bool = False) -> tuple[bool, float]:
+        allowed, tokens = await self._take(keys=[key], args=[capacity, rate, cost, '1' if force else '0'])
+        return bool(allowed), float(tokens)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_buckets(name: str):
+    if name == 'memory':
+        return MemoryBuckets(max_buckets=RATE_LIMIT_MAX_BUCKETS)
+    if name == 'redis':
+        return RedisBuckets(url=RATE_LIMIT_REDIS_URL)
+    if name == 'none':
+        return None
+    raise ValueError(f'Unknown backend: {name}')
+
+
+class Charge:
+    """Tokens taken for one Bedrock call, settled against the reported usage when the call ends."""
+
+    def __init__(self, allowance: Allowance, estimate: int) -> None:
+        self.allowance = allowance
+        self.estimate = estimate
+        self.used: Optional[int] = None
+        self.started = False
+
+    def record(self, usage: dict) -> None:
+        self.used = used_tokens(usage)
+
+    # Picks up the usage from the metadata event at the end of a stream
+    async def observe(self, events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        self.started = True
+        async for event in events:
+            if 'metadata' in event:
+                self.record(event['metadata'].get('usage', {}))
+            yield event
+
+
+class TokenBudget:
+    """Per-caller token buckets in a memory or Redis backend.
+
+    Like the response cache, an unreachable shared backend lets requests through rather than
+    failing them; Bedrock's own quota is still there behind it.
+    """
+
+    def __init__(self, backend, tokens_per_minute: int, tenant_tokens_per_minute: dict,
+                 burst_minutes: float) -> None:
+        self.backend = backend
+        self.tokens_per_minute = tokens_per_minute
+        self.tenant_tokens_per_minute = tenant_tokens_per_minute
+        self._bucket_tokens_per_minute = {
+            bucket_key(tenant): tokens for tenant, tokens in tenant_tokens_per_minute.items()
+        }
+        self.burst_minutes = burst_minutes
+        self.reserved = 0
+        self.refunded = 0
+        self.overdrawn = 0
+        self.errors = 0
+
+    def allowance(self, tenant: str, client: Optional[str] = None) -> Allowance:
+        return self.bucket_allowance(bucket_key(tenant, client))
+
+    # For work that outlives its request, such as jobs, which keep the bucket key rather than the API key
+    def bucket_allowance(self, key: str) -> Allowance:
+        tokens_per_minute = self._bucket_tokens_per_minute.get(key, self.tokens_per_minute)
+        return Allowance(key, tokens_per_minute, tokens_per_minute * self.burst_minutes)
+
+    async def _take(self, allowance: Allowance, cost: float, force: bool = False) -> bool:
+        capacity = allowance.tokens_per_minute * self.burst_minutes
+        try:
+            allowed, allowance.remaining = await self.backend.take(
+                KEY_PREFIX + allowance.key, cost, capacity, allowance.tokens_per_minute / 60, force
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning('Rate limit backend failed', exc_info=e)
+            return True
+        return allowed
+
+    def retry_after(self, allowance: Allowance, cost: float = 0) -> int:
+        deficit = min(cost, allowance.tokens_per_minute * self.burst_minutes) - allowance.remaining
+        return max(1, math.ceil(deficit / (allowance.tokens_per_minute / 60)))
+
+    # Whether the caller still has budget at all; costs one backend round trip and no token estimate
+    async def check(self, allowance: Allowance) -> bool:
+        return await self._take(allowance, 0)
+
+    @asynccontextmanager
+    async def charge(self, request: dict) -> AsyncIterator[Charge]:
+        allowance = allowance_var.get() or self.allowance(tenant_var.get())
+        charge = Charge(allowance, estimate_request_tokens(request))
+        if self.backend is None:
+            yield charge
+            return
+
+        if not await self._take(allowance, charge.estimate):
+            RATE_LIMITED.labels('reservation').inc()
+            raise RateLimited('Token budget exceeded', self.retry_after(allowance, charge.estimate))
+        self.reserved += charge.estimate
+
+        try:
+            yield charge
+        except BaseException:
+            # Nothing was generated for a call that failed before its first event
+            if charge.used is None and not charge.started:
+                charge.used = 0
+            raise
+        finally:
+            # Without reported usage, e.g. for a stream that broke off, the estimate stands
+            if charge.used is not None and charge.used != charge.estimate:
+                await self._take(allowance, charge.used - charge.estimate, force=True)
+                if charge.used < charge.estimate:
+                    self.refunded += charge.estimate - charge.used
+                else:
+                    self.overdrawn += charge.used - charge.estimate
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        stats = {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'reserved': self.reserved,
+            'refunded': self.refunded,
+            'overdrawn': self.overdrawn,
+            'errors': self.errors
+        }
+        if isinstance(self.backend, MemoryBuckets):
+            stats['buckets'] = len(self.backend)
+            stats['evictions'] = self.backend.evictions
+        return stats
+
+
+token_budget = TokenBudget(
+    backend=create_buckets(RATE_LIMIT_BACKEND),
+    tokens_per_minute=RATE_LIMIT_TOKENS_PER_MINUTE,
+    tenant_tokens_per_minute=RATE_LIMIT_TENANT_TOKENS_PER_MINUTE,
+    burst_minutes=RATE_LIMIT_BURST_MINUTES
+)
+
+register_stats('genai_rate_limit', token_budget.stats,
+               counters=['reserved', 'refunded', 'overdrawn', 'errors', 'evictions'])
+
+
+def is_limited(scope) -> bool:
+    return scope['method'] == 'POST' and scope['path'].startswith(RATE_LIMIT_PATHS)
+
+
+class RateLimitMiddleware:
+    """Turns away callers whose token bucket is in debt and reports the remaining budget.
+
+    Runs inside SchedulerMiddleware, which identifies the tenant. Responses to limited paths carry
+    X-RateLimit-Limit-Tokens and X-RateLimit-Remaining-Tokens; a streamed answer reports the budget
+    as it was when the stream started.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http' or token_budget.backend is None or not is_limited(scope):
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get('client')
+        allowance = token_budget.allowance(tenant_var.get(), client[0] if client else None)
+        if not await token_budget.check(allowance):
+            RATE_LIMITED.labels('admission').inc()
+            response = ORJSONResponse(
+                {'detail': 'Token budget exceeded'},
+                status_code=429,
+                headers={'Retry-After': str(token_budget.retry_after(allowance))}
+            )
+            response.raw_headers.extend(allowance.headers())
+            await response(scope, receive, send)
+            return
+
+        async def send_with_budget(message) -> None:
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': [*message.get('headers', []), *allowance.headers()]}
+            await send(message)
+
+        allowance_token = allowance_var.set(allowance)
+        try:
+            await self.app(scope, receive, send_with_budget)
+        finally:
+            allowance_var.reset(allowance_token)
@@ -0,0 +1,98 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import os
+import time
+
+from typing import Optional
+
+
+REGION_EWMA_ALPHA = float(os.environ.get('REGION_EWMA_ALPHA', '0.2'))
+# How much a region's score worsens per unit of error rate (0.5 errors → 3x with the default)
+REGION_ERROR_PENALTY = float(os.environ.get('REGION_ERROR_PENALTY', '4'))
+REGION_EJECT_ERROR_RATE = float(os.environ.get('REGION_EJECT_ERROR_RATE', '0.5'))
+REGION_EJECT_CONSECUTIVE_FAILURES = int(os.environ.get('REGION_EJECT_CONSECUTIVE_FAILURES', '3'))
+REGION_EJECT_SECONDS = float(os.environ.get('REGION_EJECT_SECONDS', '10'))
+REGION_EJECT_MAX_SECONDS = float(os.environ.get('REGION_EJECT_MAX_SECONDS', '300'))
+# Share of calls sent to a random region instead of the best one so that idle regions keep fresh samples
+REGION_EXPLORE_RATIO = float(os.environ.get('REGION_EXPLORE_RATIO', '0.05'))
+
+
+class RegionHealth:
+    """EWMA latency and error rate of one region, with outlier ejection.
+
+    A region is ejected after consecutive failures or once its error rate crosses the
+    threshold, for a period that doubles with each failed probe. When the period is over
+    a single call is let through as a probe; its outcome restores or re-ejects the region.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.probing = False
+        self._backoff = 0
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > 0
+
+    def available(self, now: float) -> bool:
+        return not self.ejected or (now >= self.ejected_until and not self.probing)
+
+    # False when the region can't take the call; the first call after an ejection becomes its probe
+    def acquire(self) -> bool:
+        if not self.ejected:
+            return True
+        if not self.available(time.monotonic()):
+            return False
+        self.probing = True
+        return True
+
+    # Gives up a probe whose call ended without saying anything about the region
+    def end_probe(self) -> None:
+        self.probing = False
+
+    # latency is seconds per output token, as for the concurrency limiter
+    def on_success(self, latency: float) -> None:
+        self.latency = latency if self.latency is None else self.latency + REGION_EWMA_ALPHA * (latency - self.latency)
+        self.error_rate -= REGION_EWMA_ALPHA * self.error_rate
+        self.consecutive_failures = 0
+        if self.ejected:
+            self.ejected_until = 0.0
+            self.probing = False
+            self.error_rate = 0.0
+            self._backoff = 0
+
+    def on_failure(self) -> None:
+        self.error_rate += REGION_EWMA_ALPHA * (1 - self.error_rate)
+        self.consecutive_failures += 1
+        if (self.probing or self.consecutive_failures >= REGION_EJECT_CONSECUTIVE_FAILURES
+                or self.error_rate >= REGION_EJECT_ERROR_RATE):
+            self._eject()
+
+    def _eject(self) -> None:
+        if self.ejected and not self.probing:
+            return
+        self.ejections += 1
+        self.ejected_until = time.monotonic() + min(REGION_EJECT_MAX_SECONDS, REGION_EJECT_SECONDS * 2 ** self._backoff)
+        self._backoff += 1
+        self.probing = False
+        self.consecutive_failures = 0
+
+    # Lower is better: a region that has not been sampled yet scores 0 so that it is tried early
+    def score(self, load: float) -> float:
+        return (self.latency or 0.0) * (1 + REGION_ERROR_PENALTY * self.error_rate) * (1 + load)
+
+    def stats(self) -> dict:
+        return {
+            'latency': self.latency,
+            'error_rate': round(self.error_rate, 4),
+            'ejected': int(self.ejected),
+            'ejections': self.ejections
+        }
@@ -0,0 +1,127 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Grounds answers in documents ingested with `python -m app.ingest`: the instruction is embedded,
+# unless the semantic cache already did, the nearest chunks are looked up in the IVF index at
+# RETRIEVAL_INDEX_PATH, and those that are similar enough are added to the user turn ahead of the
+# instruction.
+
+import asyncio
+import os
+import time
+import numpy as np
+
+from typing import Optional
+from prometheus_client import Histogram
+
+from app.documents import ChunkStore
+from app.embeddings import embedder
+from app.logger import logger
+from app.metrics import register_stats
+from app.vectors import IVFIndex, current_version
+
+
+# Link to the current index version written by app.ingest; retrieval is off without it
+RETRIEVAL_INDEX_PATH = os.environ.get('RETRIEVAL_INDEX_PATH')
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', '4'))
+# IVF lists scanned per query: more finds more of the true nearest chunks, at a higher cost
+RETRIEVAL_NPROBE = int(os.environ.get('RETRIEVAL_NPROBE', '16'))
+# Chunks less similar to the instruction than this are left out
+RETRIEVAL_MIN_SCORE = float(os.environ.get('RETRIEVAL_MIN_SCORE', '0.3'))
+# Reads the whole index into memory on startup instead of paging it in from disk as it is searched
+RETRIEVAL_PRELOAD = os.environ.get('RETRIEVAL_PRELOAD', 'false').lower() == 'true'
+
+CONTEXT_PROMPT = 'Answer using the following documents where they are relevant.'
+
+RETRIEVAL_LATENCY = Histogram(
+    'genai_retrieval_duration_seconds',
+    'Time to retrieve document chunks for a prompt, by stage',
+    ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+def context_text(chunks: list) -> str:
+    documents = '\n\n'.join(
+        f'<document source="{chunk["source"]}">\n{chunk["text"]}\n</document>' for chunk in chunks
+    )
+    return f'{CONTEXT_PROMPT}\n\n{documents}'
+
+
+class Retriever:
+
+    def __init__(self, path: str, top_k: int, nprobe: int, min_score: float, preload: bool) -> None:
+        self.path = path
+        self.top_k = top_k
+        self.nprobe = nprobe
+        self.min_score = min_score
+        self.preload = preload
+        self.version = None
+        self.index = None
+        self.chunks = None
+        self.searches = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    # The link is resolved once, so the index and the chunks come from the same version even if
+    # ingest publishes another one meanwhile
+    def _load(self) -> tuple[str, IVFIndex, ChunkStore]:
+        version = current_version(self.path)
+        if version is None:
+            raise FileNotFoundError(f'No retrieval index at {self.path}')
+        return os.path.basename(version), IVFIndex.load(version, self.preload), ChunkStore(version)
+
+    async def start(self) -> None:
+        self.version, self.index, self.chunks = await asyncio.to_thread(self._load)
+        if self.index.dimensions != embedder.dimensions:
+            raise ValueError(
+                f'Index at {self.path} has {self.index.dimensions} dimensions, the embedder {embedder.dimensions}'
+            )
+
+    # Like the caches, a failed lookup degrades to an answer without documents rather than an error.
+    # A vector the semantic cache has already embedded the text into is used as is.
+    async def retrieve(self, text: str, vector: Optional[np.ndarray] = None) -> list:
+        started = time.perf_counter()
+        try:
+            if vector is None:
+                vector = (await embedder.embed([text]))[0]
+                RETRIEVAL_LATENCY.labels('embed').observe(time.perf_counter() - started)
+            embedded = time.perf_counter()
+            # The scan releases the GIL, so other requests are served meanwhile
+            scores, ids = await asyncio.to_thread(self.index.search, vector, self.top_k, self.nprobe)
+        except Exception as e:
+            self.errors += 1
+            logger.warning('retrieval failed', exc_info=e)
+            return []
+
+        self.searches += 1
+        RETRIEVAL_LATENCY.labels('search').observe(time.perf_counter() - embedded)
+        return [
+            {**self.chunks[int(i)], 'score': round(float(score), 4)}
+            for score, i in zip(scores, ids)
+            if score >= self.min_score
+        ]
+
+    def stats(self) -> dict:
+        return {
+            'chunks': len(self.index) if self.index is not None else 0,
+            'lists': self.index.lists if self.index is not None else 0,
+            'searches': self.searches,
+            'errors': self.errors
+        }
+
+
+retriever = Retriever(
+    path=RETRIEVAL_INDEX_PATH,
+    top_k=RETRIEVAL_TOP_K,
+    nprobe=RETRIEVAL_NPROBE,
+    min_score=RETRIEVAL_MIN_SCORE,
+    preload=RETRIEVAL_PRELOAD
+)
+
+register_stats('genai_retrieval', retriever.stats, counters=['searches', 'errors'])
@@ -0,0 +1,154 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import json
+import os
+import re
+
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+from prometheus_client import Counter
+
+from app.bedrock import bedrock
+from app.limiter import Throttled
+from app.promptcache import PROMPT_CACHE_ENABLED, add_cache_points, supports_prompt_cache
+from app.ratelimit import token_budget
+from app.tokens import estimate_tokens
+
+
+# Neither accepts cachePoint blocks, so Bedrock prompt caching (app.promptcache) only takes effect once
+# BEDROCK_MODELS names a model that does
+DEFAULT_MODELS = [
+    {'name': 'fast', 'model_id': 'anthropic.claude-3-haiku-20240307-v1:0'},
+    {'name': 'quality', 'model_id': 'anthropic.claude-3-5-sonnet-20240620-v1:0'},
+]
+
+# JSON list of {"name": ..., "model_id": ..., "prompt_cache": true|false}; the order is also the fallback order
+# on throttling. prompt_cache defaults to whether the model is known to support Bedrock prompt caching.
+BEDROCK_MODELS = json.loads(os.environ.get('BEDROCK_MODELS', json.dumps(DEFAULT_MODELS)))
+ROUTING_ENABLED = os.environ.get('ROUTING_ENABLED', 'true').lower() == 'true'
+ROUTING_SMALL_MODEL = os.environ.get('ROUTING_SMALL_MODEL', 'fast')
+ROUTING_LARGE_MODEL = os.environ.get('ROUTING_LARGE_MODEL', 'quality')
+# Prompts at or above either bound go to the large model
+ROUTING_LONG_INPUT_TOKENS = int(os.environ.get('ROUTING_LONG_INPUT_TOKENS', '400'))
+ROUTING_COMPLEXITY_THRESHOLD = float(os.environ.get('ROUTING_COMPLEXITY_THRESHOLD', '0.4'))
+
+COMPLEXITY_MARKERS = re.compile(
+    r'코드|분석|비교|설계|증명|추론|단계별|장단점|요약|번역|'
+    r'code|analy[sz]e|compare|design|prove|reason|step by step|trade-?offs?|summari[sz]e|translate',
+    re.IGNORECASE
+)
+CODE_PATTERN = re.compile(r'```|\bdef |\bclass |\bSELECT\b|[{};]\s*$', re.MULTILINE)
+
+ROUTING_DECISIONS = Counter(
+    'genai_routing_decisions',
+    'Model chosen for a request and why',
+    ['model', 'reason']
+)
+ROUTING_FALLBACKS = Counter(
+    'genai_routing_fallbacks',
+    'Requests moved to another model because the chosen one was throttled',
+    ['from_model', 'to_model']
+)
+
+
+@dataclass(frozen=True)
+class Model:
+    name: str
+    model_id: str
+    prompt_cache: Optional[bool] = None
+
+    @property
+    def caches_prompts(self) -> bool:
+        if not PROMPT_CACHE_ENABLED:
+            return False
+        return self.prompt_cache if self.prompt_cache is not None else supports_prompt_cache(self.model_id)
+
+
+# 0.0 for a one-line question, towards 1.0 for long, multi-part, analytical or code-heavy prompts
+def complexity_score(text: str) -> float:
+    score = 0.5 * min(estimate_tokens(text) / ROUTING_LONG_INPUT_TOKENS, 1.0)
+    score += 0.15 * min(len(COMPLEXITY_MARKERS.findall(text)), 3)
+    score += 0.05 * min(text.count('?') + text.count('？'), 3)
+    if CODE_PATTERN.search(text):
+        score += 0.2
+    return min(score, 1.0)
+
+
+class ModelRouter:
+    """Picks a model per request and falls back to the other configured models on throttling."""
+
+    def __init__(self, models: list, small: str, large: str, enabled: bool = True) -> None:
+        self.models = {m['name']: Model(**m) for m in models}
+        self._by_id = {m.model_id: m for m in self.models.values()}
+        self.small = self.models[small]
+        self.large = self.models[large]
+        self.enabled = enabled
+
+    def route(self, instruction: str, hint: Optional[str] = None) -> Model:
+        if hint is not None:
+            model, reason = self.models[hint], 'hint'
+        elif not self.enabled:
+            model, reason = self.large, 'default'
+        elif estimate_tokens(instruction) >= ROUTING_LONG_INPUT_TOKENS:
+            model, reason = self.large, 'long_input'
+        elif complexity_score(instruction) >= ROUTING_COMPLEXITY_THRESHOLD:
+            model, reason = self.large, 'complex'
+        else:
+            model, reason = self.small, 'simple'
+
+        ROUTING_DECISIONS.labels(model.name, reason).inc()
+        return model
+
+    def candidates(self, request: dict) -> list:
+        first = request['modelId']
+        return [first] + [m.model_id for m in self.models.values() if m.model_id != first]
+
+    # Cache checkpoints are added per candidate, since a fallback model may not accept them
+    def prepare(self, request: dict, model_id: str) -> dict:
+        request = {**request, 'modelId': model_id}
+        model = self._by_id.get(model_id)
+        if model is not None and model.caches_prompts:
+            request = add_cache_points(request)
+        return request
+
+    # The caller's token budget is charged once per request, whichever model ends up answering it
+    async def converse(self, **request) -> dict:
+        candidates = self.candidates(request)
+        async with token_budget.charge(request) as charge:
+            for i, model_id in enumerate(candidates):
+                try:
+                    result = await bedrock.converse(**self.prepare(request, model_id))
+                    charge.record(result.get('usage', {}))
+                    return result
+                except Throttled:
+                    if i == len(candidates) - 1:
+                        raise
+                    ROUTING_FALLBACKS.labels(model_id, candidates[i + 1]).inc()
+
+    @asynccontextmanager
+    async def converse_stream(self, **request) -> AsyncIterator[AsyncIterator[dict]]:
+        candidates = self.candidates(request)
+        async with token_budget.charge(request) as charge, AsyncExitStack() as stack:
+            for i, model_id in enumerate(candidates):
+                try:
+                    events = await stack.enter_async_context(
+                        bedrock.converse_stream(**self.prepare(request, model_id))
+                    )
+                    break
+                except Throttled:
+                    if i == len(candidates) - 1:
+                        raise
+                    ROUTING_FALLBACKS.labels(model_id, candidates[i + 1]).inc()
+            yield charge.observe(events)
+
+
+router = ModelRouter(
+    models=BEDROCK_MODELS,
+    small=ROUTING_SMALL_MODEL,
+    large=ROUTING_LARGE_MODEL,
+    enabled=ROUTING_ENABLED
+)
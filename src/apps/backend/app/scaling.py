@@ -0,0 +1,111 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Metrics the ECS service scales on, written to stdout in CloudWatch Embedded Metric Format. The awslogs
+# driver ships them with the other logs and CloudWatch extracts them as custom metrics, so neither an
+# agent nor PutMetricData permissions are needed. Every task reports once a minute:
+#
+#   InFlightRequests  HTTP requests being served, averaged over the minute
+#   QueueDepth        Bedrock calls waiting for a concurrency slot, averaged over the minute
+#   ThrottleRate      percentage of Bedrock calls throttled by Bedrock or shed by the concurrency limiter
+#                     during the minute
+
+import asyncio
+import logging
+import os
+import time
+
+from app.bedrock import bedrock
+from app.metrics import http_in_flight
+
+
+SCALING_METRICS_ENABLED = os.environ.get('SCALING_METRICS_ENABLED', 'true').lower() == 'true'
+SCALING_METRICS_NAMESPACE = os.environ.get('SCALING_METRICS_NAMESPACE', 'GenAIDemo')
+# Dimension value the scaling policies select on; tasks of one service report under the same name
+SCALING_METRICS_SERVICE = os.environ.get('SCALING_METRICS_SERVICE', 'BackendAppService')
+SCALING_METRICS_INTERVAL_SECONDS = int(os.environ.get('SCALING_METRICS_INTERVAL_SECONDS', '60'))
+
+SAMPLE_INTERVAL_SECONDS = 1.0
+
+UNITS = {
+    'InFlightRequests': 'Count',
+    'QueueDepth': 'Count',
+    'ThrottleRate': 'Percent'
+}
+
+# Written even when LOG_LEVEL hides INFO, since scaling depends on these lines
+metrics_logger = logging.getLogger('genai.scaling')
+metrics_logger.setLevel(logging.INFO)
+
+
+def limiter_totals() -> tuple[int, int, int]:
+    stats = bedrock.limiter_stats().values()
+    return (sum(s['acquired'] for s in stats), sum(s['rejected'] for s in stats),
+            sum(s['throttled'] for s in stats))
+
+
+# Between two limiter_totals: every attempt takes a slot, so throttled attempts are among the acquired ones,
+# while shed calls never got one. Bedrock throttles count before they have brought the limit down.
+def throttle_rate(before: tuple, after: tuple) -> float:
+    acquired, rejected, throttled = (total - earlier for total, earlier in zip(after, before))
+    calls = acquired + rejected
+    return 100 * (rejected + throttled) / calls if calls else 0.0
+
+
+def emf_record(namespace: str, service: str, values: dict) -> dict:
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [['ServiceName']],
+                'Metrics': [{'Name': name, 'Unit': UNITS[name]} for name in values]
+            }]
+        },
+        'ServiceName': service,
+        **values
+    }
+
+
+class ScalingMetrics:
+    """Samples load every second and reports the averages once per interval."""
+
+    def __init__(self, namespace: str, service: str, interval: float) -> None:
+        self.namespace = namespace
+        self.service = service
+        self.interval = interval
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        totals = limiter_totals()
+        while True:
+            in_flight, queue_depth = [], []
+            deadline = time.monotonic() + self.interval
+            while time.monotonic() < deadline:
+                await asyncio.sleep(SAMPLE_INTERVAL_SECONDS)
+                in_flight.append(http_in_flight.count)
+                queue_depth.append(bedrock.queue_depth)
+
+            totals, earlier = limiter_totals(), totals
+
+            metrics_logger.info('scaling metrics', extra={'fields': emf_record(self.namespace, self.service, {
+                'InFlightRequests': round(sum(in_flight) / len(in_flight), 2),
+                'QueueDepth': round(sum(queue_depth) / len(queue_depth), 2),
+                'ThrottleRate': round(min(throttle_rate(earlier, totals), 100.0), 2)
+            })})
+
+
+scaling_metrics = ScalingMetrics(
+    namespace=SCALING_METRICS_NAMESPACE,
+    service=SCALING_METRICS_SERVICE,
+    interval=SCALING_METRICS_INTERVAL_SECONDS
+)
@@ -0,0 +1,99 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Priority lanes for Bedrock capacity. Every request runs in a priority class (interactive, batch or
+# background) on behalf of a tenant, identified by its X-API-Key. When the concurrency limiter has to
+# queue callers, classes share the free slots by weight, each within its own concurrency share, queue
+# size and wait limit, and the tenants of a class are served in turn so one bulk client cannot crowd
+# out the others.
+
+import json
+import os
+
+from contextvars import ContextVar
+from enum import Enum
+
+from app.limiter import LIMITER_MAX_QUEUE, LIMITER_MAX_WAIT_SECONDS, Lane
+
+
+class Priority(str, Enum):
+    INTERACTIVE = 'interactive'
+    BATCH = 'batch'
+    BACKGROUND = 'background'
+
+
+DEFAULT_LANES = {
+    'interactive': {'weight': 8, 'share': 1.0, 'max_queue': LIMITER_MAX_QUEUE, 'max_wait': LIMITER_MAX_WAIT_SECONDS},
+    'batch': {'weight': 2, 'share': 0.5, 'max_queue': 1000, 'max_wait': 60},
+    'background': {'weight': 1, 'share': 0.25, 'max_queue': 1000, 'max_wait': 300}
+}
+
+# Per-class overrides as JSON, e.g. {"batch": {"share": 0.3}}
+LANE_OVERRIDES = json.loads(os.environ.get('SCHEDULER_LANES', '{}'))
+SCHEDULER_LANES = {
+    Priority(name).value: Lane(**{**defaults, **LANE_OVERRIDES.get(name, {})}) for name, defaults in DEFAULT_LANES.items()
+}
+# Weights of tenants that pay for a larger share, as api_key=weight pairs; others weigh 1
+SCHEDULER_TENANT_WEIGHTS = {
+    key.strip(): float(weight)
+    for key, weight in (pair.split('=', 1) for pair in os.environ.get('SCHEDULER_TENANT_WEIGHTS', '').split(',') if pair.strip())
+}
+# Class of the requests to a path, matched by longest prefix; unmatched paths are interactive
+SCHEDULER_ROUTE_PRIORITIES = {
+    path.strip(): Priority(priority.strip())
+    for path, priority in (
+        pair.split('=', 1)
+        for pair in os.environ.get('SCHEDULER_ROUTE_PRIORITIES', '/api/prompts:batch=batch').split(',') if pair.strip()
+    )
+}
+
+PRIORITY_HEADER = 'x-priority'
+TENANT_HEADER = 'x-api-key'
+
+RANKS = {priority: rank for rank, priority in enumerate(Priority)}
+
+priority_var: ContextVar[Priority] = ContextVar('priority', default=Priority.INTERACTIVE)
+tenant_var: ContextVar[str] = ContextVar('tenant', default='')
+
+
+def tenant_weight(tenant: str) -> float:
+    return SCHEDULER_TENANT_WEIGHTS.get(tenant, 1.0)
+
+
+def route_priority(path: str) -> Priority:
+    matches = [prefix for prefix in SCHEDULER_ROUTE_PRIORITIES if path.startswith(prefix)]
+    return SCHEDULER_ROUTE_PRIORITIES[max(matches, key=len)] if matches else Priority.INTERACTIVE
+
+
+# A caller may ask for a lower class than its route's with X-Priority, never a higher one
+def request_priority(path: str, requested: str) -> Priority:
+    priority = route_priority(path)
+    try:
+        return max(priority, Priority(requested.strip().lower()), key=RANKS.get)
+    except ValueError:
+        return priority
+
+
+class SchedulerMiddleware:
+    """Puts each request in its priority class and tenant for the concurrency limiter."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        priority_token = priority_var.set(
+            request_priority(scope['path'], headers.get(PRIORITY_HEADER.encode(), b'').decode('latin-1'))
+        )
+        tenant_token = tenant_var.set(headers.get(TENANT_HEADER.encode(), b'').decode('latin-1'))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tenant_var.reset(tenant_token)
+            priority_var.reset(priority_token)
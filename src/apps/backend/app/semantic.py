@@ -0,0 +1,232 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Answers paraphrases of earlier prompts from the cache. Each single-turn instruction is embedded and
+# compared with the instructions of cached answers; the closest one is served if its similarity
+# reaches SEMANTIC_CACHE_THRESHOLD and it was asked of the same model with the same system prompt.
+#
+# Lookups arriving together are embedded and searched as one batch. With SEMANTIC_CACHE_PATH the index
+# is loaded on startup and saved every SEMANTIC_CACHE_SAVE_INTERVAL_SECONDS while it has new entries, and
+# on shutdown, so a task that is killed loses at most one interval. Task storage on Fargate does not
+# outlive the task, so for a new task to start with what earlier tasks had cached the path must be on a
+# volume they all mount, such as EFS. Each task saves what it has cached; the last save replaces the others.
+
+import asyncio
+import hashlib
+import os
+import time
+import numpy as np
+import orjson
+
+from dataclasses import dataclass
+from typing import Optional
+
+from app.cache import CACHE_TTL_SECONDS, normalize_text
+from app.embeddings import embedder
+from app.logger import logger
+from app.metrics import register_stats
+from app.vectors import VectorIndex
+
+
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+# Cosine similarity an earlier instruction needs to be treated as the same question
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', '10000'))
+# A link to the current version of the saved index, in directories <path>.versions/*; unset keeps the
+# index in memory only
+SEMANTIC_CACHE_PATH = os.environ.get('SEMANTIC_CACHE_PATH')
+# Seconds between saves of an index with new entries; 0 saves on shutdown only
+SEMANTIC_CACHE_SAVE_INTERVAL_SECONDS = float(os.environ.get('SEMANTIC_CACHE_SAVE_INTERVAL_SECONDS', '300'))
+# Nearest entries considered per lookup, since the closest one may belong to another model or have expired
+SEMANTIC_CACHE_CANDIDATES = int(os.environ.get('SEMANTIC_CACHE_CANDIDATES', '4'))
+
+
+# Everything but the messages that shapes the answer: model, system prompt and inference parameters
+def request_scope(request: dict) -> str:
+    scope = {name: value for name, value in request.items() if name != 'messages'}
+    return hashlib.sha256(orjson.dumps(scope, option=orjson.OPT_SORT_KEYS)).hexdigest()[:32]
+
+
+# Only a lone user turn is comparable across callers; with history the same words can mean anything.
+# Probed before documents are retrieved, so the turn holds just the instruction.
+def instruction_of(request: dict) -> Optional[str]:
+    messages = request['messages']
+    if len(messages) != 1:
+        return None
+    return normalize_text(messages[0]['content'][-1].get('text', '')) or None
+
+
+@dataclass
+class Probe:
+    """The embedded instruction of one request and, if found, the cached answer to a paraphrase of it."""
+    instruction: str
+    scope: str
+    vector: np.ndarray
+    hit: Optional[dict] = None
+
+
+class SemanticCache:
+
+    def __init__(self, embedder, threshold: float, max_entries: int, ttl: int,
+                 candidates: int, path: Optional[str] = None, save_interval: float = 0) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.candidates = candidates
+        self.path = path
+        self.save_interval = save_interval
+        self.index = VectorIndex(embedder.dimensions, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.batches = 0
+        self.saves = 0
+        self.save_errors = 0
+        # Entries added, and how many of them the last save included
+        self._added = 0
+        self._saved = 0
+        self._saver: Optional[asyncio.Task] = None
+        self._pending: list[tuple[str, str, asyncio.Future]] = []
+        self._flushes: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        if self.path:
+            self.index = await asyncio.to_thread(
+                VectorIndex.load, self.path, self.embedder.dimensions, self.index.capacity
+            )
+            logger.info('semantic cache loaded', extra={'fields': {'entries': len(self.index)}})
+            if self.save_interval > 0:
+                self._saver = asyncio.create_task(self._save_periodically())
+
+    async def close(self) -> None:
+        if self._saver is not None:
+            self._saver.cancel()
+            await asyncio.gather(self._saver, return_exceptions=True)
+            self._saver = None
+        if self.path:
+            await self.save()
+
+    # Writes a new version of the index if entries were added since the last save. The index is copied
+    # first, so lookups and additions carry on while the copy is written.
+    async def save(self) -> None:
+        added = self._added
+        if added == self._saved:
+            return
+        try:
+            await asyncio.to_thread(self.index.snapshot().save, self.path)
+        except OSError as e:
+            self.save_errors += 1
+            logger.warning('semantic cache save failed', exc_info=e)
+            return
+        self._saved = added
+        self.saves += 1
+
+    async def _save_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            await self.save()
+
+    # Embeds the request's instruction and looks for a paraphrase; None when the request is not eligible
+    # or the embedder failed, in which case the request is answered as if the cache were off
+    async def probe(self, request: dict) -> Optional[Probe]:
+        instruction = instruction_of(request)
+        if instruction is None:
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((instruction, request_scope(request), future))
+        if len(self._pending) == 1:
+            # The flush starts on the next event loop turn, so lookups made before then join this batch
+            task = asyncio.create_task(self._flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        try:
+            return await future
+        except Exception as e:
+            self.errors += 1
+            logger.warning('semantic cache lookup failed', exc_info=e)
+            return None
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        self.batches += 1
+        try:
+            vectors = await self.embedder.embed([instruction for instruction, _, _ in pending])
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        hits = self._search(vectors, [scope for _, scope, _ in pending])
+        for (instruction, scope, future), vector, hit in zip(pending, vectors, hits):
+            if not future.done():
+                future.set_result(Probe(instruction, scope, vector, hit))
+
+    def _search(self, vectors: np.ndarray, scopes: list) -> list:
+        if not len(self.index):
+            return [None] * len(scopes)
+        scores, slots = self.index.search(vectors, self.candidates)
+        expired_before = time.time() - self.ttl
+        hits = []
+        for scope, row_scores, row_slots in zip(scopes, scores, slots):
+            hit = None
+            for score, slot in zip(row_scores.tolist(), row_slots.tolist()):
+                if score < self.threshold:
+                    break
+                entry = self.index.payloads[slot]
+                if entry['cached_at'] <= expired_before:
+                    self.index.retire(slot)
+                elif entry['scope'] == scope:
+                    self.index.touch(slot)
+                    hit = {'text': entry['text'], 'cached_at': entry['cached_at'], 'similarity': round(score, 4)}
+                    break
+            hits.append(hit)
+        return hits
+
+    def record(self, probe: Probe) -> None:
+        if probe.hit is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def add(self, probe: Probe, text: str) -> None:
+        self.index.add(probe.vector, [{
+            'instruction': probe.instruction,
+            'scope': probe.scope,
+            'text': text,
+            'cached_at': time.time()
+        }])
+        self._added += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'embedder': type(self.embedder).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'batches': self.batches,
+            'saves': self.saves,
+            'save_errors': self.save_errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self.index),
+            'max_entries': self.index.capacity,
+            'evictions': self.index.evictions
+        }
+
+
+semantic_cache = SemanticCache(
+    embedder=embedder,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl=CACHE_TTL_SECONDS,
+    candidates=SEMANTIC_CACHE_CANDIDATES,
+    path=SEMANTIC_CACHE_PATH,
+    save_interval=SEMANTIC_CACHE_SAVE_INTERVAL_SECONDS
+)
+
+register_stats('genai_semantic_cache', semantic_cache.stats,
+               counters=['hits', 'misses', 'errors', 'batches', 'saves', 'save_errors', 'evictions'])
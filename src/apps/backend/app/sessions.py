@@ -0,0 +1,161 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import asyncio
+import os
+import orjson
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Path, Response, status
+from pydantic import BaseModel
+
+from app.cache import CACHE_REDIS_URL, MemoryBackend, create_backend
+from app.metrics import register_stats
+from app.tokens import estimate_message_tokens
+
+
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')  # memory | redis
+SESSION_MAX_SESSIONS = int(os.environ.get('SESSION_MAX_SESSIONS', '10000'))
+# Sessions expire after this long without a new turn
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '86400'))
+SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL', CACHE_REDIS_URL)
+# Older turns are dropped once the history is estimated to exceed this many input tokens
+SESSION_HISTORY_TOKENS = int(os.environ.get('SESSION_HISTORY_TOKENS', '2000'))
+
+KEY_PREFIX = 'genai:session:'
+SESSION_ID_PATTERN = r'^[A-Za-z0-9_-]{1,64}$'
+
+
+session_router = APIRouter()
+
+
+# Turns are stored as compact [role, text] pairs and expanded to Converse messages on read
+def pack(messages: list) -> bytes:
+    turns = [[m['role'], ''.join(block['text'] for block in m['content'] if 'text' in block)] for m in messages]
+    return orjson.dumps(turns)
+
+
+def unpack(value: bytes) -> list:
+    return [{'role': role, 'content': [{'text': text}]} for role, text in orjson.loads(value)]
+
+
+# Drops the oldest user/assistant exchanges until the history fits the budget, so it still starts with a user turn
+def trim_history(messages: list, max_tokens: int) -> list:
+    while messages and estimate_message_tokens(messages) > max_tokens:
+        messages = messages[2:]
+    return messages
+
+
+class SessionStore:
+    """Per-session message history, kept within a token budget.
+
+    Like the response cache, an unreachable shared backend degrades to a fresh
+    conversation rather than failing the request.
+
+    Exchanges finishing together in one session are all kept: appends to a session are made one
+    at a time within a task, and as a transaction that is redone on conflict across tasks (Redis).
+    """
+
+    def __init__(self, backend, ttl: int, history_tokens: int) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.history_tokens = history_tokens
+        self.trimmed = 0
+        self.errors = 0
+        # Session ID -> lock and the number of appends holding or waiting for it
+        self._locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+    async def get(self, session_id: str) -> list:
+        try:
+            value = await self.backend.get(KEY_PREFIX + session_id)
+        except Exception:
+            self.errors += 1
+            return []
+        return unpack(value) if value is not None else []
+
+    @asynccontextmanager
+    async def _locked(self, session_id: str) -> AsyncIterator[None]:
+        lock, users = self._locks.get(session_id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[session_id]
+            if users == 1:
+                del self._locks[session_id]
+            else:
+                self._locks[session_id] = (lock, users - 1)
+
+    async def append(self, session_id: str, messages: list) -> None:
+        dropped = 0
+
+        def extend(value: Optional[bytes]) -> bytes:
+            nonlocal dropped
+            history = (unpack(value) if value is not None else []) + messages
+            trimmed = trim_history(history, self.history_tokens)
+            dropped = (len(history) - len(trimmed)) // 2
+            return pack(trimmed)
+
+        async with self._locked(session_id):
+            try:
+                await self.backend.update(KEY_PREFIX + session_id, extend, self.ttl)
+            except Exception:
+                self.errors += 1
+                return
+        self.trimmed += dropped
+
+    async def delete(self, session_id: str) -> None:
+        await self.backend.delete(KEY_PREFIX + session_id)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        stats = {
+            'backend': type(self.backend).__name__,
+            'trimmed': self.trimmed,
+            'errors': self.errors
+        }
+        if isinstance(self.backend, MemoryBackend):
+            stats['sessions'] = len(self.backend)
+            stats['evictions'] = self.backend.evictions
+        return stats
+
+
+session_store = SessionStore(
+    backend=create_backend(SESSION_BACKEND, max_entries=SESSION_MAX_SESSIONS, url=SESSION_REDIS_URL),
+    ttl=SESSION_TTL_SECONDS,
+    history_tokens=SESSION_HISTORY_TOKENS
+)
+
+register_stats('genai_sessions', session_store.stats, counters=['trimmed', 'errors', 'evictions'])
+
+
+class Turn(BaseModel):
+    role: str
+    text: str
+
+
+class Session(BaseModel):
+    session_id: str
+    messages: list[Turn]
+
+
+@session_router.get("/sessions/{session_id}", response_model=Session)
+async def get_session(session_id: str = Path(pattern=SESSION_ID_PATTERN)) -> Session:
+    messages = await session_store.get(session_id)
+    return Session(
+        session_id=session_id,
+        messages=[Turn(role=m['role'], text=m['content'][0]['text']) for m in messages]
+    )
+
+
+@session_router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(session_id: str = Path(pattern=SESSION_ID_PATTERN)) -> Response:
+    await session_store.delete(session_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,156 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import asyncio
+
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from app.deadline import deadline_var
+from app.scheduler import priority_var
+
+T = TypeVar('T')
+
+# A caller joins a flight whose deadline is at most this much earlier than its own. The flight runs
+# under the deadline of the caller that started it, and maxTokens is fitted to that deadline.
+DEADLINE_SLACK_SECONDS = 1.0
+
+
+def covers(flight_deadline: Optional[float], deadline: Optional[float]) -> bool:
+    if flight_deadline is None:
+        return True
+    return deadline is not None and deadline <= flight_deadline + DEADLINE_SLACK_SECONDS
+
+
+def flight_key(key: str) -> str:
+    return f'{priority_var.get().value}:{key}'
+
+
+class _Call:
+
+    def __init__(self, task: asyncio.Task, deadline: Optional[float]) -> None:
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class _Broadcast:
+
+    def __init__(self, deadline: Optional[float]) -> None:
+        self.deadline = deadline
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self.changed = asyncio.Condition()
+
+
+class SingleFlight:
+    """Shares one upstream call among concurrent callers with the same key.
+
+    The upstream call runs in its own task, so a caller that goes away does not
+    cancel the work for the others; it is cancelled only once every caller has left.
+    A caller with a later deadline than the current flight starts a new one, which
+    callers arriving after it join instead. Flights are kept apart by priority class,
+    since the upstream call waits in the lane of the caller that started it.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._calls: dict[str, _Call] = {}
+        self._broadcasts: dict[str, _Broadcast] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._broadcasts)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        key = flight_key(key)
+        deadline = deadline_var.get()
+        call = self._calls.get(key)
+        if call is None or not covers(call.deadline, deadline):
+            call = _Call(asyncio.ensure_future(fn()), deadline)
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self._calls[key] = call
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+
+    # Every subscriber receives all items from the start, so late joiners replay what was already produced
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        key = flight_key(key)
+        deadline = deadline_var.get()
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None or not covers(broadcast.deadline, deadline):
+            broadcast = _Broadcast(deadline)
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, factory))
+            self._broadcasts[key] = broadcast
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        broadcast.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(broadcast.items):
+                    yield broadcast.items[index]
+                    index += 1
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    async with broadcast.changed:
+                        await broadcast.changed.wait_for(
+                            lambda: broadcast.done or index < len(broadcast.items)
+                        )
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                self._forget(self._broadcasts, key, broadcast)
+                broadcast.task.cancel()
+
+    async def _produce(self, key: str, broadcast: _Broadcast, factory: Callable[[], AsyncIterator[T]]) -> None:
+        try:
+            async with aclosing(factory()) as items:
+                async for item in items:
+                    async with broadcast.changed:
+                        broadcast.items.append(item)
+                        broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            self._forget(self._broadcasts, key, broadcast)
+            broadcast.done = True
+            async with broadcast.changed:
+                broadcast.changed.notify_all()
+
+    # A cancelled flight is forgotten right away so that new callers start a fresh one instead of joining it
+    @staticmethod
+    def _forget(flights: dict, key: str, flight) -> None:
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': self.in_flight
+        }
+
+
+inflight = SingleFlight()
@@ -0,0 +1,26 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Rough token estimates for decisions made before Bedrock reports actual usage.
+# Latin text averages about four characters per token; Hangul and other
+# non-ASCII scripts are much denser.
+
+ASCII_CHARS_PER_TOKEN = 4.0
+NON_ASCII_CHARS_PER_TOKEN = 1.5
+
+
+def estimate_tokens(text: str) -> int:
+    ascii_chars = sum(1 for c in text if c.isascii())
+    non_ascii_chars = len(text) - ascii_chars
+    return int(ascii_chars / ASCII_CHARS_PER_TOKEN + non_ascii_chars / NON_ASCII_CHARS_PER_TOKEN) + 1
+
+
+def estimate_message_tokens(messages: list) -> int:
+    return sum(
+        estimate_tokens(block['text'])
+        for message in messages
+        for block in message['content']
+        if 'text' in block
+    )
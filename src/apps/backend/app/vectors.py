@@ -0,0 +1,283 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Nearest-neighbour search over unit-length float32 vectors with NumPy: the similarity of every query
+# to every stored vector is one matrix product, so a batch of queries costs little more than one.
+#
+# Saved indexes are versioned: each save writes a new directory under <path>.versions, named so that
+# concurrent saves, e.g. by tasks stopping together on a shared volume, never write to the same files,
+# and then points the symbolic link <path> at it. Swapping the link is atomic, so a reader finds either
+# the old or the new version, whole, and a reader that resolved the link keeps reading its version.
+# Only the newest versions are kept.
+#
+# Document corpora are too large to scan in full on every request, so IVFIndex groups the vectors by
+# nearest k-means centroid and scans only the groups nearest to the query. Its vectors are stored as
+# int8 with one scale per vector, a quarter of the size of float32, in a directory of .npy files that
+# is memory-mapped read-only.
+
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import orjson
+
+from typing import Optional
+
+# Rows scored at a time while building an IVF index, to bound memory
+BUILD_BLOCK_ROWS = 65536
+# Versions of a saved index kept besides the current one, for readers that resolved the link before it moved
+VERSIONS_KEPT = 1
+
+
+# A new, empty directory for the next version of the index at `path`
+def new_version(path: str) -> str:
+    version = os.path.join(f'{path}.versions', f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}')
+    os.makedirs(version)
+    return version
+
+
+# Points `path` at a complete version and removes the older ones. A directory left at `path` by an
+# earlier layout becomes a version of its own first.
+def publish(path: str, version: str) -> None:
+    versions = f'{path}.versions'
+    if os.path.isdir(path) and not os.path.islink(path):
+        os.replace(path, os.path.join(versions, f'{0:020d}-{uuid.uuid4().hex[:8]}'))
+    link = f'{path}.{uuid.uuid4().hex}.tmp'
+    os.symlink(os.path.relpath(version, os.path.dirname(os.path.abspath(path))), link)
+    os.replace(link, path)
+
+    current = os.path.basename(version)
+    for name in sorted(os.listdir(versions))[:-(VERSIONS_KEPT + 1)]:
+        if name != current:
+            # Another process may be removing it too
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+
+
+# The directory a saved index currently resolves to, or None if there is none
+def current_version(path: str) -> Optional[str]:
+    resolved = os.path.realpath(path)
+    return resolved if os.path.isdir(resolved) else None
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.float32), empty.astype(np.int64)
+    # argpartition finds the k best in linear time; only those k are sorted
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return np.take_along_axis(candidate_scores, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+
+class VectorIndex:
+    """A bounded matrix of vectors with one payload each, searched exhaustively.
+
+    When full, adding a vector evicts the one least recently returned by a search (or added).
+    """
+
+    def __init__(self, dimensions: int, capacity: int, vectors: Optional[np.ndarray] = None) -> None:
+        self.dimensions = dimensions
+        self.capacity = capacity
+        self.vectors = vectors if vectors is not None else np.zeros((capacity, dimensions), dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.payloads: list = []
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def add(self, vectors: np.ndarray, payloads: list) -> None:
+        vectors = np.atleast_2d(vectors)[-self.capacity:]
+        payloads = payloads[-self.capacity:]
+        now = time.time()
+
+        free = min(len(payloads), self.capacity - len(self))
+        slots = list(range(len(self), len(self) + free))
+        self.payloads.extend(payloads[:free])
+        self.last_used[slots] = now
+        if len(payloads) > free:
+            evicted = np.argpartition(self.last_used, len(payloads) - free - 1)[:len(payloads) - free]
+            for slot, payload in zip(evicted, payloads[free:]):
+                self.payloads[slot] = payload
+            slots.extend(evicted.tolist())
+            self.evictions += len(evicted)
+
+        self.vectors[slots] = vectors
+        self.last_used[slots] = now
+
+    # Scores and slots of the k most similar vectors for each query, best first
+    def search(self, queries: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(queries)
+        scores, slots = top_k(queries @ self.vectors[:len(self)].T, k)
+        return scores, slots
+
+    def touch(self, slots) -> None:
+        self.last_used[slots] = time.time()
+
+    # Makes a slot the next to be evicted, e.g. once its payload has expired
+    def retire(self, slot: int) -> None:
+        self.last_used[slot] = 0.0
+
+    # Saves a new version of the index at `path`; the last of several concurrent saves wins
+    def save(self, path: str) -> None:
+        version = new_version(path)
+        np.save(os.path.join(version, 'vectors.npy'), self.vectors[:len(self)])
+        with open(os.path.join(version, 'index.json'), 'wb') as f:
+            f.write(orjson.dumps({
+                'dimensions': self.dimensions,
+                'payloads': self.payloads,
+                'last_used': self.last_used[:len(self)].tolist()
+            }))
+        publish(path, version)
+
+    # A copy of the stored entries, for saving from another thread while this index keeps changing
+    def snapshot(self) -> 'VectorIndex':
+        count = len(self)
+        index = VectorIndex(self.dimensions, count, self.vectors[:count].copy())
+        index.payloads = list(self.payloads)
+        index.last_used = self.last_used[:count].copy()
+        return index
+
+    # The saved vectors are memory-mapped and copied straight into the index, which stays in memory as it
+    # is written to and the files may be removed by other tasks; a missing or mismatched index starts empty
+    @classmethod
+    def load(cls, path: str, dimensions: int, capacity: int) -> 'VectorIndex':
+        version = current_version(path)
+        if version is None:
+            return cls(dimensions, capacity)
+        with open(os.path.join(version, 'index.json'), 'rb') as f:
+            meta = orjson.loads(f.read())
+        saved = np.load(os.path.join(version, 'vectors.npy'), mmap_mode='r')
+        if meta['dimensions'] != dimensions or saved.shape[1] != dimensions:
+            return cls(dimensions, capacity)
+
+        vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        kept = min(capacity, len(saved), len(meta['payloads']))
+        vectors[:kept] = saved[:kept]
+        index = cls(dimensions, capacity, vectors)
+        index.payloads = meta['payloads'][:capacity]
+        index.last_used[:len(index)] = meta['last_used'][:capacity]
+        return index
+
+
+def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(np.asarray(vectors[start:start + BUILD_BLOCK_ROWS]) @ centroids.T, axis=1)
+        for start in range(0, len(vectors), BUILD_BLOCK_ROWS)
+    ]).astype(np.int32)
+
+
+# Spherical k-means: centroids are kept at unit length, so the nearest centroid is the most similar one
+def kmeans(sample: np.ndarray, lists: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest(sample, centroids)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=lists)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        # A centroid that attracted nothing restarts from a random sample vector
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def default_lists(count: int) -> int:
+    # About 4 * sqrt(n) lists keeps both the centroid scan and the scanned lists small; small corpora are scanned in full
+    return 1 if count < 10000 else int(4 * np.sqrt(count))
+
+
+# Writes the vectors (any array-like of unit-length float32 rows, e.g. a memory map) into directory `path`
+def build_ivf(vectors: np.ndarray, path: str, lists: Optional[int] = None, iterations: int = 10,
+              sample_size: Optional[int] = None, seed: int = 0) -> None:
+    count, dimensions = vectors.shape
+    lists = max(1, min(lists or default_lists(count), count))
+    rng = np.random.default_rng(seed)
+    if lists > 1:
+        sample_ids = np.sort(rng.choice(count, min(count, sample_size or lists * 64), replace=False))
+        centroids = kmeans(np.asarray(vectors[sample_ids], dtype=np.float32), lists, iterations, rng)
+        assignment = nearest(vectors, centroids)
+    else:
+        centroids = np.zeros((1, dimensions), dtype=np.float32)
+        assignment = np.zeros(count, dtype=np.int32)
+
+    # Vectors of one list are stored next to each other, so that a list is scanned as one slice
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))]).astype(np.int64)
+    os.makedirs(path, exist_ok=True)
+    codes = np.lib.format.open_memmap(os.path.join(path, 'codes.npy'), mode='w+', dtype=np.int8,
+                                      shape=(count, dimensions))
+    scales = np.empty(count, dtype=np.float32)
+    for start in range(0, count, BUILD_BLOCK_ROWS):
+        ids = order[start:start + BUILD_BLOCK_ROWS]
+        codes[start:start + len(ids)], scales[start:start + len(ids)] = quantize(np.asarray(vectors[ids]))
+    codes.flush()
+    del codes
+
+    np.save(os.path.join(path, 'scales.npy'), scales)
+    np.save(os.path.join(path, 'ids.npy'), order.astype(np.int32))
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    np.save(os.path.join(path, 'centroids.npy'), centroids.astype(np.float32))
+    with open(os.path.join(path, 'index.json'), 'wb') as f:
+        f.write(orjson.dumps({'count': count, 'dimensions': dimensions, 'lists': lists}))
+
+
+class IVFIndex:
+    """An inverted file index built by build_ivf: searches the nprobe lists nearest to the query.
+
+    Scores are approximate twice over, as vectors outside the probed lists are missed and
+    int8 codes round each component; both are measured by benchmarks/bench_retrieval.py.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, codes: np.ndarray,
+                 scales: np.ndarray, ids: np.ndarray) -> None:
+        self.centroids = centroids
+        self.offsets = offsets
+        self.codes = codes
+        self.scales = scales
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimensions(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def lists(self) -> int:
+        return len(self.centroids)
+
+    # The codes stay on disk and are paged in on use unless preloaded
+    @classmethod
+    def load(cls, path: str, preload: bool = False) -> 'IVFIndex':
+        return cls(
+            centroids=np.load(os.path.join(path, 'centroids.npy')),
+            offsets=np.load(os.path.join(path, 'offsets.npy')),
+            codes=np.load(os.path.join(path, 'codes.npy'), mmap_mode=None if preload else 'r'),
+            scales=np.load(os.path.join(path, 'scales.npy')),
+            ids=np.load(os.path.join(path, 'ids.npy'))
+        )
+
+    # Scores and IDs (positions in the vectors given to build_ivf) of the k best matches, best first
+    def search(self, query: np.ndarray, k: int, nprobe: int = 16) -> tuple[np.ndarray, np.ndarray]:
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        _, probed = top_k(query @ self.centroids.T, nprobe)
+        ranges = [(self.offsets[i], self.offsets[i + 1]) for i in probed[0]]
+        positions = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = np.concatenate([self.codes[start:end] @ query[0] for start, end in ranges])
+        scores, best = top_k((scores * self.scales[positions]).reshape(1, -1), k)
+        return scores[0], self.ids[positions[best[0]]]
@@ -0,0 +1,92 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Compares /api/prompt throughput of the synchronous threadpool handler
+# (sync_baseline.py) with the async client path (main.py), both talking to
+# fake_bedrock.py so that only the backend's concurrency model is measured.
+#
+#   cd src/apps/backend
+#   python benchmarks/bench_async.py --requests 800 --concurrency 400 --latency 5
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+from collections import Counter
+
+from harness import serve
+
+
+async def drive(url: str, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = Counter()
+
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(300.0),
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    ) as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json={'instruction': f'질문 {i}'})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': dict(errors),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_s': round(statistics.median(latencies), 3) if latencies else None,
+        'p95_s': round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else None
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=800)
+    parser.add_argument('--concurrency', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=5.0, help='fake Bedrock seconds per call')
+    parser.add_argument('--fake-port', type=int, default=9090)
+    parser.add_argument('--backend-port', type=int, default=8080)
+    args = parser.parse_args()
+
+    fake_url = f'http://127.0.0.1:{args.fake_port}'
+    backend_url = f'http://127.0.0.1:{args.backend_port}'
+    backend_env = {
+        'BEDROCK_ENDPOINT_URL': fake_url,
+        'BEDROCK_MAX_CONCURRENCY': str(args.concurrency),
+        'LIMITER_INITIAL_LIMIT': str(args.concurrency),
+        'RATE_LIMIT_BACKEND': 'none'
+    }
+    uvicorn_args = ['--port', str(args.backend_port), '--log-level', 'warning', '--no-access-log']
+
+    results = {}
+    fake_args = ['--port', str(args.fake_port), '--ttft', str(args.latency), '--output-tokens', '1']
+    with serve(['benchmarks/fake_bedrock.py', *fake_args],
+               f'{fake_url}/docs', {}):
+        for name, target in [('sync', 'benchmarks.sync_baseline:app'), ('async', 'main:app')]:
+            with serve(['-m', 'uvicorn', target, *uvicorn_args], f'{backend_url}/api/health', backend_env):
+                results[name] = asyncio.run(drive(f'{backend_url}/api/prompt', args.requests, args.concurrency))
+
+    results['speedup'] = round(results['async']['throughput_rps'] / results['sync']['throughput_rps'], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Measures what a container image costs a new task: image size and layers, the time from pulling
+# the image to the container answering its readiness check, and the import time inside the image.
+# Without --registry the pull is approximated by loading the image from a `docker save` archive,
+# which leaves out the network but keeps the decompression and extraction. The backend runs
+# against fake_bedrock.py on the host network.
+#
+#   cd src/apps/backend
+#   python benchmarks/bench_image.py --app backend --runs 3
+#   python benchmarks/bench_image.py --app frontend --registry 123456789012.dkr.ecr.ap-northeast-2.amazonaws.com
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+from harness import BACKEND_DIR, FAKE_CREDENTIALS, serve
+from startup import parse_importtime, wait_for
+
+
+APPS_DIR = os.path.dirname(BACKEND_DIR)
+
+# Build directory, readiness URL and module whose import time is reported, per image
+APPS = {
+    'backend': {
+        'directory': os.path.join(APPS_DIR, 'backend'),
+        'ready_url': 'http://127.0.0.1:8080/api/ready',
+        'module': 'main'
+    },
+    'frontend': {
+        'directory': os.path.join(APPS_DIR, 'frontend'),
+        'ready_url': 'http://127.0.0.1:8501/_stcore/health',
+        'module': 'streamlit'
+    }
+}
+
+
+def docker(*args: str, capture: bool = True) -> str:
+    result = subprocess.run(['docker', *args], capture_output=capture, text=True, check=True)
+    return result.stdout.strip() if capture else ''
+
+
+def build(app: dict, tag: str, platform: str) -> float:
+    started = time.perf_counter()
+    docker('build', '--platform', platform, '--tag', tag, app['directory'], capture=False)
+    return time.perf_counter() - started
+
+
+def image_info(tag: str) -> dict:
+    info = json.loads(docker('image', 'inspect', tag))[0]
+    return {
+        'size_mb': round(info['Size'] / 1e6, 1),
+        'layers': len(info['RootFS']['Layers'])
+    }
+
+
+# Removes the local copy so that the next pull (or load) starts from nothing
+def remove(tag: str) -> None:
+    subprocess.run(['docker', 'image', 'rm', '--force', tag], capture_output=True)
+
+
+def pull_and_run(app: dict, tag: str, source: str, archive: str, env: dict, timeout: float) -> dict:
+    remove(tag)
+    started = time.perf_counter()
+    if source == 'registry':
+        docker('pull', tag)
+    else:
+        docker('load', '--input', archive)
+    pulled = time.perf_counter() - started
+
+    env_args = [arg for name, value in env.items() for arg in ('--env', f'{name}={value}')]
+    container = docker('run', '--detach', '--network', 'host', *env_args, tag)
+    try:
+        ready = wait_for(app['ready_url'], started, timeout)
+    finally:
+        docker('rm', '--force', container)
+    return {'pull_s': pulled, 'ready_s': ready}
+
+
+def measure_imports(app: dict, tag: str, top: int) -> dict:
+    result = subprocess.run(
+        ['docker', 'run', '--rm', '--entrypoint', 'python', tag, '-X', 'importtime', '-c', f'import {app["module"]}'],
+        capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr, app['module'], top)
+
+
+def summarize(values: list) -> dict:
+    return {
+        'median': round(statistics.median(values), 3),
+        'min': round(min(values), 3),
+        'max': round(max(values), 3)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--app', choices=APPS, default='backend')
+    parser.add_argument('--tag', help='image to measure; built from the app directory unless --no-build')
+    parser.add_argument('--no-build', action='store_true')
+    parser.add_argument('--platform', default='linux/amd64', help='e.g. linux/arm64 for Graviton')
+    parser.add_argument('--registry', help='push the image here and time real pulls from it')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='packages with the most import time to list')
+    parser.add_argument('--fake-port', type=int, default=9090)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    app = APPS[args.app]
+    tag = args.tag or f'genai-demo-{args.app}:bench'
+    report = {'app': args.app, 'platform': args.platform}
+    if not args.no_build:
+        report['build_s'] = round(build(app, tag, args.platform), 1)
+    report.update(image_info(tag))
+    report['imports'] = measure_imports(app, tag, args.top)
+
+    if args.registry:
+        remote = f'{args.registry}/{tag}'
+        docker('tag', tag, remote)
+        docker('push', remote, capture=False)
+        # The local tag would keep the layers around and turn every pull into a no-op
+        remove(tag)
+        tag, source = remote, 'registry'
+    else:
+        source = 'archive'
+
+    env = {}
+    if args.app == 'backend':
+        env = {**FAKE_CREDENTIALS, 'BEDROCK_ENDPOINT_URL': f'http://127.0.0.1:{args.fake_port}'}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, 'image.tar')
+        if source == 'archive':
+            docker('save', '--output', archive, tag)
+        fake_args = ['--port', str(args.fake_port), '--ttft', '0.05', '--output-tokens', '1']
+        with serve(['benchmarks/fake_bedrock.py', *fake_args], f'http://127.0.0.1:{args.fake_port}/docs', {}):
+            runs = [pull_and_run(app, tag, source, archive, env, args.timeout) for _ in range(args.runs)]
+
+    report['pull_source'] = source
+    report['pull_s'] = summarize([r['pull_s'] for r in runs])
+    report['pull_to_ready_s'] = summarize([r['ready_s'] for r in runs])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Measures retrieval at corpus scale without embedding a corpus: synthetic unit vectors are drawn
+# around a number of topics, as chunks of real documents cluster by subject, and written to an IVF
+# index with the same code app.ingest uses. Reports the build time and size of the index, and for
+# each nprobe the latency of one retrieval (searching the index and reading the chunks, as done per
+# request after the instruction is embedded) and its recall against an exact float32 search.
+#
+#   cd src/apps/backend
+#   python benchmarks/bench_retrieval.py --chunks 1000000 --nprobe 8 16 32
+#   python benchmarks/bench_retrieval.py --index /tmp/retrieval-1m --no-build --nprobe 16
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.documents import ChunkStore, ChunkWriter
+from app.embeddings import EMBEDDING_DIMENSIONS
+from app.vectors import BUILD_BLOCK_ROWS, IVFIndex, build_ivf, top_k
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+# Each vector is a topic plus as much noise again, about 0.7 similar to its topic like a chunk to its subject
+def write_corpus(path: str, chunks: int, dimensions: int, topics: int, seed: int) -> np.memmap:
+    rng = np.random.default_rng(seed)
+    centers = unit(rng.standard_normal((topics, dimensions)))
+    vectors = np.memmap(path, dtype=np.float32, mode='w+', shape=(chunks, dimensions))
+    for start in range(0, chunks, BUILD_BLOCK_ROWS):
+        size = min(BUILD_BLOCK_ROWS, chunks - start)
+        noise = rng.standard_normal((size, dimensions)) / np.sqrt(dimensions)
+        vectors[start:start + size] = unit(centers[rng.integers(0, topics, size)] + noise)
+    vectors.flush()
+    return vectors
+
+
+# Paraphrases of stored chunks: about 0.9 similar to the chunk they were drawn from
+def make_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    base = np.asarray(vectors[np.sort(rng.choice(len(vectors), count, replace=False))])
+    return unit(base + 0.5 * rng.standard_normal(base.shape) / np.sqrt(vectors.shape[1]))
+
+
+# The k best of each block are kept, and the k best of those are the exact answer
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores, ids = [], []
+    for start in range(0, len(vectors), BUILD_BLOCK_ROWS):
+        block_scores, block_ids = top_k(queries @ np.asarray(vectors[start:start + BUILD_BLOCK_ROWS]).T, k)
+        scores.append(block_scores)
+        ids.append(block_ids + start)
+    _, best = top_k(np.concatenate(scores, axis=1), k)
+    return np.take_along_axis(np.concatenate(ids, axis=1), best, axis=1)
+
+
+# Size of the files a task loads, leaving out the float32 vectors kept for the exact search
+def index_mb(path: str) -> float:
+    names = [name for name in os.listdir(path) if name != 'vectors.f32']
+    return round(sum(os.path.getsize(os.path.join(path, name)) for name in names) / 1e6, 1)
+
+
+# What a request does once its instruction is embedded: search the index and read the chunks found
+def retrieve(index: IVFIndex, chunks: ChunkStore, query: np.ndarray, k: int, nprobe: int) -> tuple[np.ndarray, list]:
+    _, ids = index.search(query, k, nprobe)
+    return ids, [chunks[int(i)] for i in ids]
+
+
+def percentiles(values: list) -> dict:
+    quantiles = statistics.quantiles(values, n=100)
+    return {
+        'p50_ms': round(statistics.median(values) * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+        'max_ms': round(max(values) * 1000, 3)
+    }
+
+
+def build(index_path: str, args: argparse.Namespace) -> dict:
+    os.makedirs(index_path, exist_ok=True)
+    started = time.perf_counter()
+    vectors = write_corpus(os.path.join(index_path, 'vectors.f32'), args.chunks, args.dimensions,
+                           args.topics, args.seed)
+    generated = time.perf_counter()
+    chunks = ChunkWriter(index_path)
+    for i in range(args.chunks):
+        chunks.write({'source': f'synthetic/{i // 100}.md', 'text': f'Chunk {i} of the synthetic corpus.'})
+    chunks.close()
+    build_ivf(vectors, index_path, args.lists, seed=args.seed)
+    return {'generate_s': round(generated - started, 1), 'build_s': round(time.perf_counter() - generated, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=1_000_000)
+    parser.add_argument('--dimensions', type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument('--topics', type=int, default=5000)
+    parser.add_argument('--lists', type=int, help='IVF lists; 4 * sqrt(chunks) by default')
+    parser.add_argument('--index', help='keep the index in this directory instead of a temporary one')
+    parser.add_argument('--no-build', action='store_true',
+                        help='measure an index this script built earlier in --index')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--top-k', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--recall-queries', type=int, default=200)
+    parser.add_argument('--preload', action='store_true', help='read the index into memory instead of mapping it')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = args.index or os.path.join(tmp, 'index')
+        report = {} if args.no_build else build(index_path, args)
+        index = IVFIndex.load(index_path, preload=args.preload)
+        chunks = ChunkStore(index_path)
+        vectors = np.memmap(os.path.join(index_path, 'vectors.f32'), dtype=np.float32, mode='r',
+                            shape=(len(index), index.dimensions))
+        report.update({
+            'chunks': len(index),
+            'dimensions': index.dimensions,
+            'lists': index.lists,
+            'index_mb': index_mb(index_path),
+            'float32_mb': round(vectors.nbytes / 1e6, 1)
+        })
+
+        queries = make_queries(vectors, args.queries, args.seed)
+        exact = exact_top_k(vectors, queries[:args.recall_queries], args.top_k)
+        report['nprobe'] = {}
+        for nprobe in args.nprobe:
+            # One pass to page the probed lists in, as a task serving traffic would have them
+            for query in queries:
+                index.search(query, args.top_k, nprobe)
+            latencies, found = [], []
+            for query in queries:
+                started = time.perf_counter()
+                ids, _ = retrieve(index, chunks, query, args.top_k, nprobe)
+                latencies.append(time.perf_counter() - started)
+                found.append(ids)
+            recall = np.mean([len(set(ids.tolist()) & set(truth.tolist())) / args.top_k
+                              for ids, truth in zip(found, exact)])
+            report['nprobe'][nprobe] = {**percentiles(latencies), f'recall_at_{args.top_k}': round(float(recall), 3)}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Compares the CPU time of rendering responses with the standard library json
+# encoder (FastAPI's default JSONResponse) and with orjson, and the bytes on
+# the wire without compression, with gzip and with zstd, for a typical answer,
+# a large answer, a session history, a streamed answer and a batch. Streamed
+# and batch responses are NDJSON and are sent uncompressed; their compressed
+# sizes are listed for comparison only.
+#
+#   cd src/apps/backend
+#   python benchmarks/bench_serialization.py --repeat 200
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.batch import BatchItem
+from app.compression import COMPRESSION_GZIP_LEVEL, COMPRESSION_ZSTD_LEVEL, ENCODINGS, compress
+from app.dialog import Answer, to_ndjson
+from app.sessions import Session, Turn
+
+
+WORDS = (
+    'Amazon ECS에서 생성형 AI 애플리케이션을 운영할 때는 모델 호출 지연 시간, 처리량, 비용을 함께 고려해야 합니다. '
+    'Use streaming for interactive answers, cache repeated prompts and keep the history short. '
+    '```python\nresponse = await client.converse(modelId=model_id, messages=messages)\n```'
+).split(' ')
+
+
+# Words drawn at random from a small vocabulary, which compresses roughly like generated prose
+def answer_text(chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words, length = [], 0
+    while length < chars:
+        words.append(rng.choice(WORDS))
+        length += len(words[-1]) + 1
+    return ' '.join(words)[:chars]
+
+
+def payloads(session_id: str) -> dict:
+    streamed = answer_text(64_000)
+    return {
+        'answer_2kb': Answer(text=answer_text(2_000), session_id=session_id),
+        'answer_64kb': Answer(text=answer_text(64_000), session_id=session_id),
+        'history_20_turns': Session(
+            session_id=session_id,
+            messages=[Turn(role=('user', 'assistant')[i % 2], text=answer_text(300 if i % 2 == 0 else 1_500, i))
+                      for i in range(20)]
+        ),
+        'stream_64kb': [{'type': 'delta', 'text': streamed[i:i + 16]} for i in range(0, len(streamed), 16)],
+        'batch_200x1kb': [BatchItem(index=i, text=answer_text(1_000, i)) for i in range(200)]
+    }
+
+
+def stdlib_ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + '\n'
+
+
+def render_functions(payload) -> dict:
+    if isinstance(payload, list):
+        events = [item.model_dump(exclude_none=True) if isinstance(item, BatchItem) else item for item in payload]
+        return {
+            'json': lambda: ''.join(stdlib_ndjson(event) for event in events).encode('utf-8'),
+            'orjson': lambda: b''.join(to_ndjson(event) for event in events)
+        }
+    content = jsonable_encoder(payload)
+    return {
+        'json': lambda: JSONResponse(content).body,
+        'orjson': lambda: ORJSONResponse(content).body
+    }
+
+
+def measure(payload, repeat: int) -> dict:
+    renders = render_functions(payload)
+    body = renders['orjson']()
+    assert json.loads(renders['json']().splitlines()[0]) == json.loads(body.splitlines()[0])
+
+    result = {
+        'render_us': {
+            name: round(min(timeit.repeat(render, number=repeat, repeat=5)) / repeat * 1e6, 1)
+            for name, render in renders.items()
+        },
+        'bytes': {'identity': len(body)},
+        'compress_us': {}
+    }
+    for encoding in ENCODINGS:
+        result['bytes'][encoding] = len(compress(body, encoding))
+        result['compress_us'][encoding] = round(
+            min(timeit.repeat(lambda: compress(body, encoding), number=repeat, repeat=5)) / repeat * 1e6, 1
+        )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    report = {
+        'levels': {'gzip': COMPRESSION_GZIP_LEVEL, 'zstd': COMPRESSION_ZSTD_LEVEL},
+        'payloads': {name: measure(payload, args.repeat) for name, payload in payloads('a' * 32).items()}
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Local stand-in for the bedrock-runtime Converse and ConverseStream APIs, and for InvokeModel with
+# Titan text embeddings.
+# Point the backend at it with BEDROCK_ENDPOINT_URL=http://127.0.0.1:<port>
+#
+#   python benchmarks/fake_bedrock.py --ttft 0.4 --latency-dist lognormal \
+#       --tokens-per-second 60 --output-tokens 200 --throttle-rate 0.05 --max-concurrency 100
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+import time
+import zlib
+import uvicorn
+
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class Profile:
+    # Time to first token; the distribution is applied around this mean
+    ttft: float = float(os.environ.get('FAKE_BEDROCK_TTFT', '0.5'))
+    latency_dist: str = os.environ.get('FAKE_BEDROCK_LATENCY_DIST', 'fixed')  # fixed | uniform | exponential | lognormal
+    latency_sigma: float = 0.5
+    tokens_per_second: float = float(os.environ.get('FAKE_BEDROCK_TOKENS_PER_SECOND', '50'))
+    output_tokens: int = int(os.environ.get('FAKE_BEDROCK_OUTPUT_TOKENS', '100'))
+    # Probability of a ThrottlingException, and a quota-like cap on concurrent calls above which every call is throttled
+    throttle_rate: float = 0.0
+    max_concurrency: int = 0
+    embedding_latency: float = float(os.environ.get('FAKE_BEDROCK_EMBEDDING_LATENCY', '0.02'))
+
+
+profile = Profile()
+in_flight = 0
+# Prompt prefixes seen at a cachePoint, to report cache reads and writes like Bedrock does
+cached_prefixes: set[str] = set()
+
+app = FastAPI()
+
+WORD = '안녕 '
+
+
+def sample_ttft() -> float:
+    if profile.latency_dist == 'uniform':
+        return random.uniform(0, 2 * profile.ttft)
+    if profile.latency_dist == 'exponential':
+        return random.expovariate(1 / profile.ttft) if profile.ttft > 0 else 0.0
+    if profile.latency_dist == 'lognormal':
+        # Parameterized so that the mean stays at profile.ttft
+        mu = max(profile.ttft, 1e-6)
+        return random.lognormvariate(0, profile.latency_sigma) * mu / math.exp(profile.latency_sigma ** 2 / 2)
+    return profile.ttft
+
+
+def should_throttle() -> bool:
+    if profile.max_concurrency and in_flight > profile.max_concurrency:
+        return True
+    return random.random() < profile.throttle_rate
+
+
+def throttled() -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={'message': 'Too many requests, please wait before trying again.'},
+        headers={'x-amzn-ErrorType': 'ThrottlingException:http://internal.amazon.com/coral/com.amazon.bedrock/'}
+    )
+
+
+# Real model IDs look like provider.model-version, e.g. anthropic.claude-3-haiku-20240307-v1:0
+def invalid_model(model_id: str) -> Optional[JSONResponse]:
+    if '.' in model_id:
+        return None
+    return JSONResponse(
+        status_code=400,
+        content={'message': 'The provided model identifier is invalid.'},
+        headers={'x-amzn-ErrorType': 'ValidationException:http://internal.amazon.com/coral/com.amazon.bedrock/'}
+    )
+
+
+# Like Bedrock, inferenceConfig.maxTokens cuts the answer short with stopReason max_tokens
+def answer_length(body: dict) -> tuple[int, str]:
+    max_tokens = body.get('inferenceConfig', {}).get('maxTokens')
+    if max_tokens is not None and max_tokens < profile.output_tokens:
+        return max_tokens, 'max_tokens'
+    return profile.output_tokens, 'end_turn'
+
+
+def usage(body: dict) -> dict:
+    blocks = body.get('system', []) + [c for m in body['messages'] for c in m['content']]
+    input_tokens = sum(len(c.get('text', '')) for c in blocks) // 4
+
+    cached_tokens, cache_read, cache_write = 0, 0, 0
+    checkpoints = [i for i, c in enumerate(blocks) if 'cachePoint' in c]
+    if checkpoints:
+        prefix = blocks[:checkpoints[-1]]
+        cached_tokens = sum(len(c.get('text', '')) for c in prefix) // 4
+        key = json.dumps(prefix, sort_keys=True)
+        if key in cached_prefixes:
+            cache_read = cached_tokens
+        else:
+            cache_write = cached_tokens
+            cached_prefixes.add(key)
+
+    output_tokens, _ = answer_length(body)
+    return {
+        'inputTokens': input_tokens - cached_tokens,
+        'outputTokens': output_tokens,
+        'totalTokens': input_tokens + output_tokens,
+        'cacheReadInputTokens': cache_read,
+        'cacheWriteInputTokens': cache_write
+    }
+
+
+# https://docs.aws.amazon.com/transcribe/latest/dg/event-stream.html
+def encode_event(headers: dict, payload: dict) -> bytes:
+    encoded_headers = b''
+    for name, value in headers.items():
+        name, value = name.encode('utf-8'), value.encode('utf-8')
+        encoded_headers += struct.pack('!B', len(name)) + name + struct.pack('!BH', 7, len(value)) + value
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    total_length = 12 + len(encoded_headers) + len(body) + 4
+    prelude = struct.pack('!II', total_length, len(encoded_headers))
+    message = prelude + struct.pack('!I', zlib.crc32(prelude)) + encoded_headers + body
+    return message + struct.pack('!I', zlib.crc32(message))
+
+
+def event(event_type: str, payload: dict) -> bytes:
+    return encode_event({
+        ':event-type': event_type,
+        ':content-type': 'application/json',
+        ':message-type': 'event'
+    }, payload)
+
+
+@app.post('/model/{model_id:path}/converse')
+async def converse(model_id: str, request: Request):
+    global in_flight
+    body = await request.json()
+    if (error := invalid_model(model_id)) is not None:
+        return error
+    if should_throttle():
+        return throttled()
+
+    output_tokens, stop_reason = answer_length(body)
+    in_flight += 1
+    try:
+        started = time.monotonic()
+        await asyncio.sleep(sample_ttft() + output_tokens / profile.tokens_per_second)
+    finally:
+        in_flight -= 1
+
+    return {
+        'output': {
+            'message': {
+                'role': 'assistant',
+                'content': [{'text': WORD * output_tokens}]
+            }
+        },
+        'stopReason': stop_reason,
+        'usage': usage(body),
+        'metrics': {
+            'latencyMs': int((time.monotonic() - started) * 1000)
+        }
+    }
+
+
+@app.post('/model/{model_id:path}/converse-stream')
+async def converse_stream(model_id: str, request: Request):
+    body = await request.json()
+    if (error := invalid_model(model_id)) is not None:
+        return error
+    if should_throttle():
+        return throttled()
+
+    output_tokens, stop_reason = answer_length(body)
+
+    async def generate():
+        global in_flight
+        in_flight += 1
+        try:
+            started = time.monotonic()
+            yield event('messageStart', {'role': 'assistant'})
+            await asyncio.sleep(sample_ttft())
+            for _ in range(output_tokens):
+                yield event('contentBlockDelta', {'contentBlockIndex': 0, 'delta': {'text': WORD}})
+                await asyncio.sleep(1 / profile.tokens_per_second)
+            yield event('contentBlockStop', {'contentBlockIndex': 0})
+            yield event('messageStop', {'stopReason': stop_reason})
+            yield event('metadata', {
+                'usage': usage(body),
+                'metrics': {'latencyMs': int((time.monotonic() - started) * 1000)}
+            })
+        finally:
+            in_flight -= 1
+
+    return StreamingResponse(generate(), media_type='application/vnd.amazon.eventstream')
+
+
+# Words hashed into signed buckets: texts that share words get similar vectors, like real embeddings
+def embed(text: str, dimensions: int) -> list:
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], 'little') % dimensions
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@app.post('/model/{model_id:path}/invoke')
+async def invoke_model(model_id: str, request: Request):
+    body = await request.json()
+    if (error := invalid_model(model_id)) is not None:
+        return error
+    if should_throttle():
+        return throttled()
+
+    await asyncio.sleep(profile.embedding_latency)
+    return {
+        'embedding': embed(body['inputText'], body.get('dimensions', 1024)),
+        'inputTextTokenCount': len(body['inputText']) // 4
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake bedrock-runtime server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--ttft', type=float, default=profile.ttft, help='mean seconds to first token')
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'exponential', 'lognormal'],
+                        default=profile.latency_dist)
+    parser.add_argument('--latency-sigma', type=float, default=profile.latency_sigma, help='lognormal sigma')
+    parser.add_argument('--tokens-per-second', type=float, default=profile.tokens_per_second)
+    parser.add_argument('--output-tokens', type=int, default=profile.output_tokens)
+    parser.add_argument('--throttle-rate', type=float, default=profile.throttle_rate,
+                        help='probability of a ThrottlingException per call')
+    parser.add_argument('--max-concurrency', type=int, default=profile.max_concurrency,
+                        help='throttle every call above this many in flight (0 = unlimited)')
+    parser.add_argument('--embedding-latency', type=float, default=profile.embedding_latency,
+                        help='seconds per InvokeModel embedding call')
+    args = parser.parse_args()
+
+    profile = Profile(
+        ttft=args.ttft,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        throttle_rate=args.throttle_rate,
+        max_concurrency=args.max_concurrency,
+        embedding_latency=args.embedding_latency
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
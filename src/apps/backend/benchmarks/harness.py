@@ -0,0 +1,59 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Process helpers shared by the benchmark scripts.
+
+import os
+import subprocess
+import sys
+import time
+import httpx
+
+from contextlib import contextmanager
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_CREDENTIALS = {
+    'AWS_ACCESS_KEY_ID': 'fake',
+    'AWS_SECRET_ACCESS_KEY': 'fake',
+    'AWS_EC2_METADATA_DISABLED': 'true'
+}
+# Every request of a benchmark comes from one address, so a token budget would turn most of them away
+BACKEND_DEFAULTS = {
+    'RATE_LIMIT_BACKEND': 'none'
+}
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+
+@contextmanager
+def serve(args: list, health_url: str, env: dict):
+    process = subprocess.Popen(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        env={**os.environ, **FAKE_CREDENTIALS, **BACKEND_DEFAULTS, **env}
+    )
+    try:
+        wait_until_up(health_url)
+        yield process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
@@ -0,0 +1,329 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Load generator for the backend API.
+#
+# With --spawn it starts fake_bedrock.py and the FastAPI app from main.py locally, otherwise
+# it drives an already running backend given by --target. Load is either closed-loop
+# (--concurrency workers back to back) or open-loop (--rps arrivals per second).
+#
+#   cd src/apps/backend
+#   python benchmarks/loadgen.py --spawn --endpoint stream --concurrency 50 --duration 30 \
+#       --fake-ttft 0.4 --fake-output-tokens 200 --output results/stream-c50.json
+#   python benchmarks/loadgen.py --spawn --rps 20 --duration 60 --compare results/stream-c50.json
+#
+# Reports p50/p95/p99 latency and time to first token, throughput, error counts and, when the
+# server process is known (--spawn or --pid), its CPU time and memory per request.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import httpx
+import psutil
+
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Optional
+
+from harness import BACKEND_DIR, percentile, serve
+
+
+@dataclass
+class Sample:
+    latency: float
+    ttft: Optional[float]
+    status: int
+    error: Optional[str] = None
+
+
+class ResourceSampler:
+    """Samples CPU time and RSS of the server process while the load runs."""
+
+    def __init__(self, pid: int, interval: float = 0.25) -> None:
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.rss_peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _cpu_seconds(self) -> float:
+        times = self.process.cpu_times()
+        return times.user + times.system
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.rss_peak = max(self.rss_peak, self.process.memory_info().rss)
+
+    def __enter__(self) -> 'ResourceSampler':
+        self.cpu_start = self._cpu_seconds()
+        self.rss_start = self.process.memory_info().rss
+        self.rss_peak = self.rss_start
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.cpu_end = self._cpu_seconds()
+        self.rss_end = self.process.memory_info().rss
+
+    def report(self, completed: int) -> dict:
+        cpu = self.cpu_end - self.cpu_start
+        return {
+            'cpu_seconds': round(cpu, 3),
+            'cpu_ms_per_request': round(cpu * 1000 / completed, 3) if completed else None,
+            'rss_start_mb': round(self.rss_start / 2**20, 1),
+            'rss_peak_mb': round(self.rss_peak / 2**20, 1),
+            'rss_end_mb': round(self.rss_end / 2**20, 1),
+            'rss_growth_kb_per_request': round((self.rss_end - self.rss_start) / 1024 / completed, 3) if completed else None
+        }
+
+
+class InstructionSource:
+    """unique_ratio < 1 repeats questions from a small pool to exercise the response cache."""
+
+    def __init__(self, unique_ratio: float, pool_size: int = 20) -> None:
+        self.unique_ratio = unique_ratio
+        self.pool = [f'자주 묻는 질문 {i}' for i in range(pool_size)]
+        self.counter = 0
+
+    def next(self) -> str:
+        self.counter += 1
+        if random.random() < self.unique_ratio:
+            return f'질문 {self.counter} {random.random()}'
+        return random.choice(self.pool)
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, instruction: str) -> Sample:
+    started = time.perf_counter()
+    try:
+        if endpoint == 'prompt':
+            response = await client.post('/api/prompt', json={'instruction': instruction})
+            await response.aread()
+            return Sample(time.perf_counter() - started, None, response.status_code)
+
+        ttft = None
+        error = None
+        async with client.stream('POST', '/api/prompt/stream', json={'instruction': instruction}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return Sample(time.perf_counter() - started, None, response.status_code)
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event['type'] == 'delta' and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif event['type'] == 'error':
+                    error = 'StreamError'
+        return Sample(time.perf_counter() - started, ttft, response.status_code, error)
+    except httpx.HTTPError as e:
+        return Sample(time.perf_counter() - started, None, 0, type(e).__name__)
+
+
+async def closed_loop(client: httpx.AsyncClient, args, source: InstructionSource) -> list:
+    samples = []
+    deadline = time.monotonic() + args.duration
+    remaining = args.requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while time.monotonic() < deadline and (remaining is None or remaining > 0):
+            if remaining is not None:
+                remaining -= 1
+            samples.append(await send(client, args.endpoint, source.next()))
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return samples
+
+
+async def open_loop(client: httpx.AsyncClient, args, source: InstructionSource) -> list:
+    samples = []
+    tasks = set()
+    started = time.monotonic()
+    next_arrival = started
+    sent = 0
+
+    while time.monotonic() - started < args.duration and (args.requests is None or sent < args.requests):
+        task = asyncio.ensure_future(send(client, args.endpoint, source.next()))
+        task.add_done_callback(lambda t: samples.append(t.result()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        sent += 1
+
+        interval = random.expovariate(args.rps) if args.arrival == 'poisson' else 1 / args.rps
+        next_arrival += interval
+        await asyncio.sleep(max(0.0, next_arrival - time.monotonic()))
+
+    await asyncio.gather(*tasks)
+    return samples
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    ok = [s for s in samples if s.status == 200 and s.error is None]
+    latencies = sorted(s.latency for s in ok)
+    ttfts = sorted(s.ttft for s in ok if s.ttft is not None)
+
+    def distribution(values: list) -> dict:
+        return {
+            'p50_ms': round(percentile(values, 0.50) * 1000, 1) if values else None,
+            'p95_ms': round(percentile(values, 0.95) * 1000, 1) if values else None,
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1) if values else None,
+            'max_ms': round(values[-1] * 1000, 1) if values else None
+        }
+
+    return {
+        'requests': len(samples),
+        'succeeded': len(ok),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+        'latency': distribution(latencies),
+        'ttft': distribution(ttfts),
+        'status_codes': dict(Counter(str(s.status) for s in samples)),
+        'errors': dict(Counter(s.error for s in samples if s.error))
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+
+    rows = [
+        ('throughput_rps', lambda r: r['throughput_rps']),
+        ('latency p50_ms', lambda r: r['latency']['p50_ms']),
+        ('latency p95_ms', lambda r: r['latency']['p95_ms']),
+        ('latency p99_ms', lambda r: r['latency']['p99_ms']),
+        ('ttft p50_ms', lambda r: r['ttft']['p50_ms']),
+        ('ttft p95_ms', lambda r: r['ttft']['p95_ms']),
+        ('cpu_ms_per_request', lambda r: r.get('resources', {}).get('cpu_ms_per_request')),
+        ('rss_peak_mb', lambda r: r.get('resources', {}).get('rss_peak_mb'))
+    ]
+    print(f'{"metric":<22}{"baseline":>12}{"current":>12}{"change":>10}', file=sys.stderr)
+    for name, value in rows:
+        before, after = value(baseline), value(current)
+        change = f'{(after - before) / before * 100:+.1f}%' if before and after is not None else '-'
+        print(f'{name:<22}{str(before):>12}{str(after):>12}{change:>10}', file=sys.stderr)
+
+
+async def run(args, pid: Optional[int]) -> dict:
+    source = InstructionSource(args.unique_ratio)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    headers = {'Cache-Control': 'no-store'} if args.no_cache else {}
+    for header in args.header:
+        name, value = header.split(':', 1)
+        headers[name.strip()] = value.strip()
+
+    async with httpx.AsyncClient(base_url=args.target, timeout=httpx.Timeout(args.timeout),
+                                 limits=limits, headers=headers) as client:
+        with ExitStack() as stack:
+            sampler = stack.enter_context(ResourceSampler(pid)) if pid else None
+            started = time.perf_counter()
+            if args.rps:
+                samples = await open_loop(client, args, source)
+            else:
+                samples = await closed_loop(client, args, source)
+            elapsed = time.perf_counter() - started
+
+    results = summarize(samples, elapsed)
+    if sampler is not None:
+        results['resources'] = sampler.report(results['succeeded'])
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Backend load generator')
+    parser.add_argument('--target', default='http://127.0.0.1:8080', help='backend base URL')
+    parser.add_argument('--endpoint', choices=['prompt', 'stream'], default='prompt')
+    parser.add_argument('--concurrency', type=int, default=10, help='closed-loop workers')
+    parser.add_argument('--rps', type=float, help='open-loop arrival rate; overrides --concurrency')
+    parser.add_argument('--arrival', choices=['fixed', 'poisson'], default='poisson')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds')
+    parser.add_argument('--requests', type=int, help='stop after this many requests')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--max-connections', type=int, default=1000)
+    parser.add_argument('--unique-ratio', type=float, default=1.0, help='share of never-repeated questions')
+    parser.add_argument('--no-cache', action='store_true', help='send Cache-Control: no-store')
+    parser.add_argument('--header', action='append', default=[], metavar='NAME:VALUE',
+                        help='extra request header, e.g. "X-Priority: batch" or "X-API-Key: bulk"')
+    parser.add_argument('--pid', type=int, help='server process to sample CPU and memory from')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare against')
+
+    spawn = parser.add_argument_group('local stack')
+    spawn.add_argument('--spawn', action='store_true', help='start fake_bedrock.py and main:app locally')
+    spawn.add_argument('--fake-port', type=int, default=9090)
+    spawn.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='backend environment')
+    spawn.add_argument('--fake-ttft', type=float, default=0.5)
+    spawn.add_argument('--fake-latency-dist', default='lognormal')
+    spawn.add_argument('--fake-tokens-per-second', type=float, default=50)
+    spawn.add_argument('--fake-output-tokens', type=int, default=100)
+    spawn.add_argument('--fake-throttle-rate', type=float, default=0.0)
+    spawn.add_argument('--fake-max-concurrency', type=int, default=0)
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        pid = args.pid
+        if args.spawn:
+            fake_url = f'http://127.0.0.1:{args.fake_port}'
+            stack.enter_context(serve([
+                'benchmarks/fake_bedrock.py', '--port', str(args.fake_port),
+                '--ttft', str(args.fake_ttft),
+                '--latency-dist', args.fake_latency_dist,
+                '--tokens-per-second', str(args.fake_tokens_per_second),
+                '--output-tokens', str(args.fake_output_tokens),
+                '--throttle-rate', str(args.fake_throttle_rate),
+                '--max-concurrency', str(args.fake_max_concurrency)
+            ], f'{fake_url}/docs', {}))
+
+            port = httpx.URL(args.target).port or 80
+            backend = stack.enter_context(serve(
+                ['-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+                f'{args.target}/api/health',
+                {'BEDROCK_ENDPOINT_URL': fake_url, 'RATE_LIMIT_BACKEND': 'none',
+                 **dict(e.split('=', 1) for e in args.env)}
+            ))
+            pid = backend.pid
+
+        results = asyncio.run(run(args, pid))
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'git_revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        },
+        'results': results
+    }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Measures how quickly a fresh backend process can serve: import time of main.py,
+# time until /api/health and /api/ready answer, and the latency of the first
+# requests after ready. Against fake_bedrock.py by default; with --real it
+# uses the AWS credentials and region of the environment, which is where
+# credential fetch and the TLS handshake actually show up.
+#
+#   cd src/apps/backend
+#   python benchmarks/startup.py --runs 5
+#   python benchmarks/startup.py --runs 5 --no-warmup
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+from harness import BACKEND_DIR, FAKE_CREDENTIALS, serve
+
+
+# Lines look like "import time:       self [us] |  cumulative | imported package". Self time is
+# summed per top-level package, which shows where the time goes regardless of who imported what.
+def parse_importtime(stderr: str, module: str, top: int) -> dict:
+    module_us = 0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = [p.strip() for p in line[len('import time:'):].split('|')]
+        if name == module:
+            module_us = int(cumulative_us)
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'module_s': round(module_us / 1e6, 3),
+        'slowest': {name: round(us / 1e6, 3) for name, us in slowest}
+    }
+
+
+def measure_imports(env: dict, top: int) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+
+    imports = parse_importtime(result.stderr, 'main', top)
+    return {'wall_s': round(wall, 3), 'main_s': imports['module_s'], 'slowest': imports['slowest']}
+
+
+def wait_for(url: str, started: float, timeout: float) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f'{url} did not answer 200 within {timeout}s')
+
+
+def timed_prompt(url: str, instruction: str) -> float:
+    started = time.perf_counter()
+    response = httpx.post(url, json={'instruction': instruction}, headers={'Cache-Control': 'no-store'},
+                          timeout=120.0)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def measure_startup(port: int, env: dict, requests: int, timeout: float) -> dict:
+    base_url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        live = wait_for(f'{base_url}/api/health', started, timeout)
+        ready = wait_for(f'{base_url}/api/ready', started, timeout)
+        latencies = [timed_prompt(f'{base_url}/api/prompt', f'안녕 {i}') for i in range(requests)]
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {'live_s': live, 'ready_s': ready, 'request_s': latencies}
+
+
+def summarize(values: list) -> dict:
+    return {
+        'median': round(statistics.median(values), 4),
+        'min': round(min(values), 4),
+        'max': round(max(values), 4)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=3, help='requests timed after ready, per run')
+    parser.add_argument('--no-warmup', action='store_true', help='skip the startup warm-up, for comparison')
+    parser.add_argument('--real', action='store_true', help='call Amazon Bedrock instead of fake_bedrock.py')
+    parser.add_argument('--top', type=int, default=10, help='packages with the most import time to list')
+    parser.add_argument('--fake-port', type=int, default=9090)
+    parser.add_argument('--backend-port', type=int, default=8080)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    env = {**os.environ}
+    if not args.real:
+        env.update(FAKE_CREDENTIALS)
+        env['BEDROCK_ENDPOINT_URL'] = f'http://127.0.0.1:{args.fake_port}'
+    if args.no_warmup:
+        env['BEDROCK_WARMUP_CONNECTIONS'] = '0'
+
+    imports = [measure_imports(env, args.top) for _ in range(args.runs)]
+
+    def run_all() -> list:
+        return [measure_startup(args.backend_port, env, args.requests, args.timeout) for _ in range(args.runs)]
+
+    if args.real:
+        runs = run_all()
+    else:
+        fake_args = ['--port', str(args.fake_port), '--ttft', '0.05', '--output-tokens', '1']
+        with serve(['benchmarks/fake_bedrock.py', *fake_args], f'http://127.0.0.1:{args.fake_port}/docs', {}):
+            runs = run_all()
+
+    report = {
+        'runs': args.runs,
+        'warmup': not args.no_warmup,
+        'import_wall_s': summarize([i['wall_s'] for i in imports]),
+        'import_main_s': summarize([i['main_s'] for i in imports]),
+        'slowest_packages_s': imports[-1]['slowest'],
+        'time_to_live_s': summarize([r['live_s'] for r in runs]),
+        'time_to_ready_s': summarize([r['ready_s'] for r in runs]),
+        'first_request_s': summarize([r['request_s'][0] for r in runs]),
+    }
+    if args.requests > 1:
+        report['later_requests_s'] = summarize([s for r in runs for s in r['request_s'][1:]])
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
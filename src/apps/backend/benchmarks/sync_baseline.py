@@ -0,0 +1,49 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# The synchronous /api/prompt handler as it was before the async client path,
+# kept only as the baseline for bench_async.py.
+
+import os
+import botocore.session
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+
+bedrock_runtime = botocore.session.get_session().create_client(
+    service_name='bedrock-runtime',
+    region_name='ap-northeast-2',
+    endpoint_url=os.environ.get('BEDROCK_ENDPOINT_URL')
+)
+
+MODEL_ID = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
+
+app = FastAPI()
+
+
+class UserPrompt(BaseModel):
+    instruction: str
+
+
+class Answer(BaseModel):
+    text: str
+
+
+@app.get('/api/health')
+def get_health() -> dict:
+    return {'status': 'OK'}
+
+
+@app.post('/api/prompt', response_model=Answer)
+def create_answer(prompt: UserPrompt) -> Answer:
+    response = bedrock_runtime.converse(
+        modelId=MODEL_ID,
+        messages=[{'role': 'user', 'content': [{'text': prompt.instruction}]}],
+        system=[{'text': 'Respond only in Korean'}]
+    )
+    output_message = response['output']['message']
+
+    return Answer(text='\n'.join([content['text'] for content in output_message['content']]))
@@ -3,14 +3,104 @@
 # SPDX-License-Identifier: MIT-0
 ########################################################################
 
-from fastapi import FastAPI
+import asyncio
 
-from app.healthcheck import healthcheck_router
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+
+from app.batch import batch_router
+from app.bedrock import BEDROCK_WARMUP_TIMEOUT_SECONDS, bedrock, bedrock_router
+from app.limiter import Overloaded
+from app.metrics import ERRORS, MetricsMiddleware, metrics_router
+from app.cache import cache_router, response_cache
+from app.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from app.deadline import DeadlineExceeded, DeadlineMiddleware
+from app.healthcheck import healthcheck_router, readiness
+from app.ratelimit import RateLimitMiddleware, token_budget
+from app.retrieval import retriever
+from app.scaling import SCALING_METRICS_ENABLED, scaling_metrics
+from app.scheduler import SchedulerMiddleware
+from app.semantic import SEMANTIC_CACHE_ENABLED, semantic_cache
+from app.logger import RequestContextMiddleware, logger, setup_logging, stop_logging
 from app.dialog import dialog_router
+from app.jobs import job_queue, jobs_router
+from app.sessions import session_router, session_store
+
+
+setup_logging()
+
+
+# Best effort: a task that could not warm up still serves, paying the cold start on its first requests
+async def warm_up() -> None:
+    try:
+        async with asyncio.timeout(BEDROCK_WARMUP_TIMEOUT_SECONDS):
+            await bedrock.warm()
+    except Exception as e:
+        logger.warning('Bedrock warm-up failed', exc_info=e)
+    readiness.set_ready()
+
+
+# Warm-up runs in the background so that /api/health answers while /api/ready still reports STARTING
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = asyncio.create_task(warm_up())
+    await job_queue.start()
+    if retriever.enabled:
+        await retriever.start()
+    if SEMANTIC_CACHE_ENABLED:
+        await semantic_cache.start()
+    if SCALING_METRICS_ENABLED:
+        scaling_metrics.start()
+    yield
+    readiness.set_draining()
+    warm_up_task.cancel()
+    await scaling_metrics.close()
+    await job_queue.close()
+    await bedrock.close()
+    await response_cache.close()
+    if SEMANTIC_CACHE_ENABLED:
+        await semantic_cache.close()
+    await session_store.close()
+    await token_budget.close()
+    stop_logging()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(SchedulerMiddleware)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
+
+# Shed load with a fast 429 so that clients back off instead of queueing on the backend
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded) -> ORJSONResponse:
+    ERRORS.labels('http', type(exc).__name__).inc()
+    return ORJSONResponse(
+        status_code=429,
+        content={'detail': exc.reason},
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+
 
+# The caller's deadline passed while the request was queued or waiting on Bedrock
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded) -> ORJSONResponse:
+    ERRORS.labels('http', type(exc).__name__).inc()
+    return ORJSONResponse(status_code=504, content={'detail': str(exc)})
 
-app = FastAPI()
 
 app.include_router(router=healthcheck_router, prefix='/api')
 app.include_router(router=dialog_router, prefix='/api')
+app.include_router(router=batch_router, prefix='/api')
+app.include_router(router=jobs_router, prefix='/api')
+app.include_router(router=session_router, prefix='/api')
+app.include_router(router=cache_router, prefix='/api')
+app.include_router(router=bedrock_router, prefix='/api')
+app.include_router(router=metrics_router, prefix='/api')
 
@@ -0,0 +1,184 @@
+import asyncio
+
+import orjson
+import pytest
+
+from app.deadline import (
+    DEADLINE_FIRST_TOKEN_SECONDS, DEADLINE_OUTPUT_TOKENS_PER_SECOND, REQUEST_TIMEOUT_DEFAULT_MS,
+    REQUEST_TIMEOUT_MAX_MS, DeadlineExceeded, DeadlineMiddleware, deadline_after, deadline_var, fit_output,
+    parse_timeout_ms, remaining, timeout_var, until_deadline, within_deadline
+)
+
+
+def answering(delay: float = 0, seen: dict = None):
+    async def app(scope, receive, send):
+        await receive()
+        if seen is not None:
+            seen.update(remaining=remaining(), timeout=timeout_var.get())
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if seen is not None:
+                seen['cancelled'] = True
+            raise
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'answer'})
+    return app
+
+
+async def request(app, path: str = '/api/prompt', timeout_ms: int = None, disconnect_after: float = None) -> list:
+    headers = [(b'x-request-timeout-ms', str(timeout_ms).encode())] if timeout_ms is not None else []
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'headers': headers}
+    messages = iter([{'type': 'http.request', 'body': b'{}', 'more_body': False}])
+    sent = []
+
+    async def receive():
+        if (message := next(messages, None)) is not None:
+            return message
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await DeadlineMiddleware(app)(scope, receive, send)
+    return sent
+
+
+def status_of(sent: list) -> int:
+    return next(message['status'] for message in sent if message['type'] == 'http.response.start')
+
+
+def test_request_within_its_deadline_is_passed_through():
+    seen = {}
+
+    sent = asyncio.run(request(answering(seen=seen), timeout_ms=5000))
+
+    assert status_of(sent) == 200
+    assert 4.5 < seen['remaining'] <= 5.0
+    assert seen['timeout'] == 5.0
+
+
+def test_request_past_its_deadline_is_cancelled_with_504():
+    seen = {}
+
+    sent = asyncio.run(request(answering(delay=5, seen=seen), timeout_ms=50))
+
+    assert status_of(sent) == 504
+    assert orjson.loads(sent[-1]['body']) == {'detail': 'Request deadline exceeded'}
+    assert seen['cancelled']
+
+
+def test_request_of_a_departed_client_is_cancelled_with_499():
+    seen = {}
+
+    sent = asyncio.run(request(answering(delay=5, seen=seen), timeout_ms=5000, disconnect_after=0.01))
+
+    assert status_of(sent) == 499
+    assert seen['cancelled']
+
+
+def test_response_already_started_is_not_replaced():
+    async def app(scope, receive, send):
+        await receive()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'part', 'more_body': True})
+        await asyncio.sleep(5)
+
+    sent = asyncio.run(request(app, timeout_ms=50))
+
+    assert [message['type'] for message in sent] == ['http.response.start', 'http.response.body']
+
+
+def test_unbounded_paths_have_no_deadline():
+    seen = {}
+
+    sent = asyncio.run(request(answering(delay=0.1, seen=seen), path='/api/prompts:batch', timeout_ms=50))
+
+    assert status_of(sent) == 200
+    assert seen['remaining'] is None
+    assert seen['timeout'] == 0.05
+
+
+def test_timeout_header_is_parsed_and_bounded():
+    assert parse_timeout_ms(None) == REQUEST_TIMEOUT_DEFAULT_MS
+    assert parse_timeout_ms(b'soon') == REQUEST_TIMEOUT_DEFAULT_MS
+    assert parse_timeout_ms(b'1500') == 1500
+    assert parse_timeout_ms(b'-5') == 0
+    assert parse_timeout_ms(str(REQUEST_TIMEOUT_MAX_MS * 10).encode()) == REQUEST_TIMEOUT_MAX_MS
+
+
+def fitted(seconds: float, request: dict) -> dict:
+    async def fit():
+        with deadline_after(seconds):
+            return fit_output(request)
+    return asyncio.run(fit())
+
+
+def test_max_tokens_is_capped_to_the_time_left():
+    request = {'modelId': 'model', 'inferenceConfig': {'maxTokens': 4096, 'temperature': 0.5}}
+
+    config = fitted(10, request)['inferenceConfig']
+
+    expected = int((10 - DEADLINE_FIRST_TOKEN_SECONDS) * DEADLINE_OUTPUT_TOKENS_PER_SECOND)
+    assert expected - 1 <= config['maxTokens'] <= expected
+    assert config['temperature'] == 0.5
+
+
+def test_max_tokens_that_fit_are_left_alone():
+    request = {'modelId': 'model', 'inferenceConfig': {'maxTokens': 100}}
+
+    assert fitted(60, request) is request
+    assert fit_output(request) is request
+
+
+def test_request_without_max_tokens_gets_the_cap():
+    assert 'maxTokens' in fitted(10, {'modelId': 'model'})['inferenceConfig']
+
+
+def test_too_little_time_left_is_refused():
+    with pytest.raises(DeadlineExceeded):
+        fitted(DEADLINE_FIRST_TOKEN_SECONDS, {'modelId': 'model'})
+
+
+def test_deadline_after_sets_and_restores_the_deadline():
+    async def scenario():
+        outer = deadline_var.get()
+        with deadline_after(30):
+            inner = remaining()
+        return outer, inner, deadline_var.get()
+
+    outer, inner, restored = asyncio.run(scenario())
+    assert outer is None and restored is None
+    assert 29 < inner <= 30
+
+
+def test_work_past_the_deadline_raises_deadline_exceeded():
+    async def scenario():
+        with deadline_after(0.01):
+            async with within_deadline():
+                await asyncio.sleep(5)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+
+
+def test_stream_is_cut_at_the_deadline():
+    async def events():
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield i
+        await asyncio.sleep(5)
+        yield 'late'
+
+    async def scenario():
+        received = []
+        with deadline_after(0.2):
+            with pytest.raises(DeadlineExceeded):
+                async for event in until_deadline(events()):
+                    received.append(event)
+        return received
+
+    assert asyncio.run(scenario()) == [0, 1, 2]
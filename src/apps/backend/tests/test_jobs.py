@@ -0,0 +1,67 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import app.jobs
+from app.cache import CachePolicy
+from app.dialog import Generation, UserPrompt
+from app.jobs import JobQueue, JobStatus, JobStore
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    async def answer_prompt(prompt, policy):
+        return Generation(f'Answer to {prompt.instruction}', 'end_turn'), None
+
+    monkeypatch.setattr(app.jobs, 'answer_prompt', answer_prompt)
+    monkeypatch.setattr(app.jobs, 'POLL_INTERVAL_SECONDS', 0.01)
+    return JobQueue(JobStore(str(tmp_path / 'jobs.sqlite3')), workers=1, max_queued=10)
+
+
+async def run_jobs(queue: JobQueue, instructions: list) -> list:
+    await queue.start()
+    try:
+        jobs = [await queue.submit(UserPrompt(instruction=instruction), CachePolicy.DEFAULT, 'key:test', None)
+                for instruction in instructions]
+        # Jobs run in order, so the others are done by the time the last one is
+        last = await queue.get(jobs[-1].job_id, wait=5)
+        return [*[await queue.get(job.job_id) for job in jobs[:-1]], last]
+    finally:
+        await queue.close()
+
+
+def test_worker_survives_store_errors(queue, monkeypatch):
+    claim = queue.store.claim
+    failures = iter([sqlite3.OperationalError('database is locked')])
+
+    async def flaky_claim(lease):
+        if (error := next(failures, None)) is not None:
+            raise error
+        return await claim(lease)
+
+    monkeypatch.setattr(queue.store, 'claim', flaky_claim)
+
+    [job] = asyncio.run(run_jobs(queue, ['first']))
+
+    assert job.status == JobStatus.SUCCEEDED
+    assert queue.store_errors == 1
+
+
+def test_worker_goes_on_when_a_running_job_was_deleted(queue, monkeypatch):
+    finish = queue.store.finish
+    deleted = []
+
+    async def finish_deleted_once(job_id, *args):
+        if not deleted:
+            deleted.append(job_id)
+            return None
+        return await finish(job_id, *args)
+
+    monkeypatch.setattr(queue.store, 'finish', finish_deleted_once)
+
+    first, second = asyncio.run(run_jobs(queue, ['first', 'second']))
+
+    assert first.status == JobStatus.RUNNING
+    assert second.status == JobStatus.SUCCEEDED
+    assert (queue.succeeded, queue.failed) == (1, 0)
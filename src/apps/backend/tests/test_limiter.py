@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.limiter import AdaptiveLimiter, Lane, Overloaded
+
+
+def limiter(initial_limit: int = 4, max_queue: int = 8, max_wait: float = 5.0, **lanes: Lane) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        initial_limit=initial_limit, min_limit=1, max_limit=32, backoff_ratio=0.5, latency_tolerance=2.0,
+        lanes=lanes or {'interactive': Lane(weight=1, share=1.0, max_queue=max_queue, max_wait=max_wait)}
+    )
+
+
+async def hold(limiter: AdaptiveLimiter, count: int, lane: str = 'interactive') -> None:
+    for _ in range(count):
+        await limiter.acquire(lane)
+
+
+def test_limit_grows_by_one_per_round_trip_while_in_use():
+    adaptive = limiter(initial_limit=4)
+    asyncio.run(hold(adaptive, 4))
+
+    for _ in range(4):
+        adaptive.on_success(latency=0.01)
+
+    assert adaptive.limit == pytest.approx(5.0, abs=0.1)
+
+
+def test_limit_does_not_grow_while_unused():
+    adaptive = limiter(initial_limit=4)
+
+    adaptive.on_success(latency=0.01)
+
+    assert adaptive.limit == 4
+
+
+def test_throttle_backs_off_once_per_interval_down_to_the_minimum():
+    adaptive = limiter(initial_limit=8)
+
+    adaptive.on_throttle()
+    adaptive.on_throttle()
+    assert adaptive.limit == 4
+    assert adaptive.throttled == 2
+
+    for _ in range(4):
+        adaptive._last_decrease = 0.0
+        adaptive.on_throttle()
+    assert adaptive.limit == 1
+
+
+def test_latency_above_the_baseline_backs_off():
+    adaptive = limiter(initial_limit=8)
+    adaptive.on_success(latency=0.01)
+
+    adaptive.on_success(latency=0.05)
+
+    assert adaptive.limit == 4
+
+
+def test_callers_over_the_limit_wait_for_a_released_slot():
+    async def scenario():
+        adaptive = limiter(initial_limit=1)
+        await adaptive.acquire('interactive')
+        waiting = asyncio.create_task(adaptive.acquire('interactive'))
+        await asyncio.sleep(0)
+        assert adaptive.queue_depth == 1 and not waiting.done()
+
+        adaptive.release('interactive')
+        await waiting
+        return adaptive
+
+    adaptive = asyncio.run(scenario())
+    assert (adaptive.in_flight, adaptive.queue_depth, adaptive.acquired) == (1, 0, 2)
+
+
+def test_full_queue_sheds_callers():
+    async def scenario():
+        adaptive = limiter(initial_limit=1, max_queue=1)
+        await adaptive.acquire('interactive')
+        waiting = asyncio.create_task(adaptive.acquire('interactive'))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded, match='Too many requests queued'):
+            await adaptive.acquire('interactive')
+        waiting.cancel()
+        return adaptive
+
+    adaptive = asyncio.run(scenario())
+    assert adaptive.rejected == 1
+    assert adaptive.lane_rejected['interactive'] == 1
+
+
+def test_callers_waiting_too_long_are_shed_and_leave_the_queue():
+    async def scenario():
+        adaptive = limiter(initial_limit=1, max_wait=0.01)
+        await adaptive.acquire('interactive')
+        with pytest.raises(Overloaded, match='Timed out'):
+            await adaptive.acquire('interactive')
+        return adaptive
+
+    adaptive = asyncio.run(scenario())
+    assert (adaptive.queue_depth, adaptive.in_flight, adaptive.rejected) == (0, 1, 1)
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    async def scenario():
+        adaptive = limiter(initial_limit=1)
+        await adaptive.acquire('interactive')
+        waiting = asyncio.create_task(adaptive.acquire('interactive'))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        adaptive.release('interactive')
+        return adaptive
+
+    adaptive = asyncio.run(scenario())
+    assert (adaptive.in_flight, adaptive.queue_depth) == (0, 0)
+
@@ -0,0 +1,103 @@
+from app.promptcache import CACHE_POINT, MAX_CACHE_POINTS, add_cache_points, supports_prompt_cache
+from app.routing import DEFAULT_MODELS, ModelRouter
+from app.tokens import estimate_tokens
+
+
+LONG = 'Answer in the tone of the support team. ' * 200
+SHORT = 'Be brief.'
+
+
+def turn(role: str, *texts: str) -> dict:
+    return {'role': role, 'content': [{'text': text} for text in texts]}
+
+
+def request(system: str, messages: list, model_id: str = 'anthropic.claude-3-7-sonnet-20250219-v1:0') -> dict:
+    return {'modelId': model_id, 'system': [{'text': system}], 'messages': messages}
+
+
+def cache_points(prepared: dict) -> list:
+    places = [('system', i) for i, block in enumerate(prepared['system']) if block == CACHE_POINT]
+    for m, message in enumerate(prepared['messages']):
+        places.extend((m, i) for i, block in enumerate(message['content']) if block == CACHE_POINT)
+    return places
+
+
+def test_long_system_prompt_gets_a_checkpoint():
+    prepared = add_cache_points(request(LONG, [turn('user', 'Hello')]), min_tokens=1024)
+
+    assert prepared['system'] == [{'text': LONG}, CACHE_POINT]
+    assert cache_points(prepared) == [('system', 1)]
+
+
+def test_prefix_below_the_minimum_is_left_alone():
+    original = request(SHORT, [turn('user', 'Hello'), turn('assistant', 'Hi'), turn('user', 'Thanks')])
+
+    assert add_cache_points(original, min_tokens=1024) == original
+
+
+def test_history_checkpoint_goes_after_the_last_earlier_turn():
+    messages = [turn('user', LONG), turn('assistant', 'Noted.'), turn('user', 'And now?')]
+
+    prepared = add_cache_points(request(SHORT, messages), min_tokens=1024)
+
+    assert cache_points(prepared) == [(1, 1)]
+    assert prepared['messages'][2] == turn('user', 'And now?')
+
+
+def test_checkpoint_counts_the_whole_prefix_towards_the_minimum():
+    half = 'word ' * 700
+    assert estimate_tokens(half) < 1024 <= 2 * estimate_tokens(half)
+
+    prepared = add_cache_points(request(half, [turn('user', half), turn('assistant', 'Ok'), turn('user', 'Go')]),
+                                min_tokens=1024)
+
+    assert cache_points(prepared) == [(1, 1)]
+
+
+def test_large_block_in_the_new_turn_gets_its_own_checkpoint():
+    prepared = add_cache_points(request(SHORT, [turn('user', LONG, 'Summarize it.')]),
+                                min_tokens=1024, large_block_tokens=1024)
+
+    assert prepared['messages'][0]['content'] == [{'text': LONG}, CACHE_POINT, {'text': 'Summarize it.'}]
+
+
+def test_no_more_than_the_maximum_checkpoints():
+    prepared = add_cache_points(request(LONG, [turn('user', LONG), turn('assistant', 'Ok'),
+                                               turn('user', LONG, LONG, LONG, LONG)]),
+                                min_tokens=1024, large_block_tokens=1024)
+
+    assert len(cache_points(prepared)) == MAX_CACHE_POINTS
+
+
+def test_request_is_not_modified():
+    original = request(LONG, [turn('user', LONG), turn('assistant', 'Ok'), turn('user', LONG)])
+    snapshot = {**original, 'system': list(original['system']),
+                'messages': [{**m, 'content': list(m['content'])} for m in original['messages']]}
+
+    add_cache_points(original, min_tokens=1024, large_block_tokens=1024)
+
+    assert original == snapshot
+
+
+def test_supported_models():
+    assert supports_prompt_cache('anthropic.claude-3-7-sonnet-20250219-v1:0')
+    assert supports_prompt_cache('us.anthropic.claude-sonnet-4-20250514-v1:0')
+    assert supports_prompt_cache('amazon.nova-pro-v1:0')
+    # Neither default model accepts cachePoint blocks
+    assert not any(supports_prompt_cache(model['model_id']) for model in DEFAULT_MODELS)
+
+
+def test_router_adds_checkpoints_only_for_models_that_cache_prompts():
+    router = ModelRouter([
+        {'name': 'fast', 'model_id': 'anthropic.claude-3-haiku-20240307-v1:0'},
+        {'name': 'quality', 'model_id': 'anthropic.claude-3-7-sonnet-20250219-v1:0'},
+        {'name': 'forced', 'model_id': 'custom-model', 'prompt_cache': True},
+    ], small='fast', large='quality')
+    original = request(LONG, [turn('user', 'Hello')])
+
+    unsupported = router.prepare(original, 'anthropic.claude-3-haiku-20240307-v1:0')
+    supported = router.prepare(original, 'anthropic.claude-3-7-sonnet-20250219-v1:0')
+    forced = router.prepare(original, 'custom-model')
+
+    assert unsupported == {**original, 'modelId': 'anthropic.claude-3-haiku-20240307-v1:0'}
+    assert cache_points(supported) == cache_points(forced) == [('system', 1)]
@@ -0,0 +1,232 @@
+import asyncio
+
+import orjson
+import pytest
+
+import app.ratelimit
+from app.ratelimit import (
+    Allowance, MemoryBuckets, RateLimited, RateLimitMiddleware, RedisBuckets, TokenBudget, bucket_key,
+    estimate_request_tokens
+)
+
+
+CAPACITY = 600
+RATE = 10
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+def take(buckets, cost: float, key: str = 'key:a', force: bool = False) -> tuple:
+    return asyncio.run(buckets.take(key, cost, CAPACITY, RATE, force))
+
+
+def test_bucket_starts_full_and_refills_at_its_rate(clock):
+    buckets = MemoryBuckets(max_buckets=10)
+
+    assert take(buckets, 500) == (True, 100)
+    assert take(buckets, 200) == (False, 100)
+    clock.now += 10
+    assert take(buckets, 200) == (True, 0)
+    clock.now += 3600
+    assert take(buckets, 0) == (True, CAPACITY)
+
+
+def test_cost_above_the_capacity_runs_a_full_bucket_into_debt(clock):
+    buckets = MemoryBuckets(max_buckets=10)
+
+    assert take(buckets, 1000) == (True, -400)
+    assert take(buckets, 0) == (False, -400)
+    clock.now += 40
+    assert take(buckets, 0) == (True, 0)
+
+
+def test_settling_is_forced_and_refunds_up_to_the_capacity(clock):
+    buckets = MemoryBuckets(max_buckets=10)
+    take(buckets, 600)
+
+    assert take(buckets, 300, force=True) == (True, -300)
+    assert take(buckets, -1000, force=True) == (True, CAPACITY)
+
+
+def test_least_recently_used_bucket_is_forgotten(clock):
+    buckets = MemoryBuckets(max_buckets=2)
+    take(buckets, 600, 'key:a')
+    take(buckets, 600, 'key:b')
+    take(buckets, 0, 'key:a')
+    take(buckets, 600, 'key:c')
+
+    assert (len(buckets), buckets.evictions) == (2, 1)
+    # a was kept, b was forgotten and starts over full
+    assert take(buckets, 600, 'key:a') == (False, 0)
+    assert take(buckets, 0, 'key:b') == (True, CAPACITY)
+
+
+def budget(backend, tokens_per_minute: int = 600) -> TokenBudget:
+    return TokenBudget(backend, tokens_per_minute=tokens_per_minute, tenant_tokens_per_minute={'gold': 6000},
+                       burst_minutes=1.0)
+
+
+def request(max_tokens: int) -> dict:
+    return {'messages': [{'role': 'user', 'content': [{'text': 'Hello'}]}],
+            'inferenceConfig': {'maxTokens': max_tokens}}
+
+
+async def charged(tokens: TokenBudget, request: dict, usage: dict = None, fail: bool = False) -> Allowance:
+    allowance = tokens.allowance('tenant')
+    app.ratelimit.allowance_var.set(allowance)
+    async with tokens.charge(request) as charge:
+        if fail:
+            raise RuntimeError('Bedrock failed')
+        if usage is not None:
+            charge.record(usage)
+    return allowance
+
+
+def test_charge_reserves_the_estimate_and_settles_against_usage(clock):
+    tokens = budget(MemoryBuckets(max_buckets=10))
+    estimate = estimate_request_tokens(request(200))
+
+    allowance = asyncio.run(charged(tokens, request(200), {'inputTokens': 10, 'outputTokens': 40}))
+
+    assert allowance.remaining == CAPACITY - 50
+    assert (tokens.reserved, tokens.refunded, tokens.overdrawn) == (estimate, estimate - 50, 0)
+
+
+def test_usage_above_the_estimate_is_charged_in_full(clock):
+    tokens = budget(MemoryBuckets(max_buckets=10))
+    estimate = estimate_request_tokens(request(100))
+
+    allowance = asyncio.run(charged(tokens, request(100), {'inputTokens': 100, 'outputTokens': 300,
+                                                           'cacheReadInputTokens': 50}))
+
+    assert allowance.remaining == CAPACITY - 450
+    assert tokens.overdrawn == 450 - estimate
+
+
+def test_call_failing_before_it_started_is_refunded(clock):
+    tokens = budget(MemoryBuckets(max_buckets=10))
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await charged(tokens, request(300), fail=True)
+        return await tokens.backend.take(app.ratelimit.KEY_PREFIX + bucket_key('tenant'), 0, CAPACITY, RATE)
+
+    assert asyncio.run(scenario()) == (True, CAPACITY)
+
+
+def test_empty_bucket_refuses_the_call_with_the_time_to_wait(clock):
+    tokens = budget(MemoryBuckets(max_buckets=10))
+
+    async def scenario():
+        await charged(tokens, request(100), {'inputTokens': 600})
+        with pytest.raises(RateLimited) as refused:
+            await charged(tokens, request(290))
+        return refused.value
+
+    refused = asyncio.run(scenario())
+    # About 300 tokens short at 10 tokens a second
+    assert 29 <= refused.retry_after <= 31
+
+
+def test_tenant_budgets_and_hashed_keys():
+    tokens = budget(None)
+
+    assert tokens.allowance('gold').tokens_per_minute == 6000
+    assert tokens.allowance('', '10.0.0.1') == Allowance('ip:10.0.0.1', 600, 600)
+    assert tokens.bucket_allowance(bucket_key('gold')).tokens_per_minute == 6000
+    assert 'gold' not in bucket_key('gold')
+
+
+def unreachable_redis() -> RedisBuckets:
+    return RedisBuckets('redis://127.0.0.1:1/0')
+
+
+def test_unreachable_redis_lets_requests_through():
+    tokens = budget(unreachable_redis())
+
+    async def scenario():
+        try:
+            allowance = await charged(tokens, request(100), {'inputTokens': 10})
+            return allowance, await tokens.check(allowance)
+        finally:
+            await tokens.close()
+
+    _, allowed = asyncio.run(scenario())
+    assert allowed
+    assert tokens.errors >= 2
+
+
+@pytest.fixture
+def redis_buckets(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    monkeypatch.setattr('redis.asyncio.from_url', lambda url: fakeredis.FakeAsyncRedis())
+    return RedisBuckets('redis://fake')
+
+
+def test_redis_script_takes_refuses_and_settles(redis_buckets):
+    async def scenario():
+        results = [
+            await redis_buckets.take('bucket', 500, CAPACITY, RATE),
+            await redis_buckets.take('bucket', 200, CAPACITY, RATE),
+            await redis_buckets.take('bucket', 300, CAPACITY, RATE, force=True),
+            await redis_buckets.take('bucket', -2000, CAPACITY, RATE, force=True),
+            await redis_buckets.take('other', 1000, CAPACITY, RATE)
+        ]
+        ttl = await redis_buckets._client.pttl('other')
+        await redis_buckets.close()
+        return results, ttl
+
+    results, ttl = asyncio.run(scenario())
+    allowed = [allowed for allowed, _ in results]
+    tokens = [round(tokens) for _, tokens in results]
+    assert allowed == [True, False, True, True, True]
+    assert tokens == [100, 100, -200, CAPACITY, -400]
+    # The key lives until the bucket would be full again
+    assert 100_000 < ttl <= 101_000
+
+
+async def middleware_request(tokens: TokenBudget, monkeypatch) -> list:
+    monkeypatch.setattr(app.ratelimit, 'token_budget', tokens)
+    sent = []
+
+    async def answer(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'{}'})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/prompt', 'headers': [], 'client': ('10.0.0.1', 5000)}
+    await RateLimitMiddleware(answer)(scope, None, send)
+    return sent
+
+
+def test_middleware_reports_the_budget_and_turns_away_callers_in_debt(clock, monkeypatch):
+    tokens = budget(MemoryBuckets(max_buckets=10))
+
+    allowed = asyncio.run(middleware_request(tokens, monkeypatch))
+    asyncio.run(tokens.backend.take(app.ratelimit.KEY_PREFIX + 'ip:10.0.0.1', 900, CAPACITY, RATE))
+    refused = asyncio.run(middleware_request(tokens, monkeypatch))
+
+    assert allowed[0]['status'] == 200
+    assert (b'x-ratelimit-remaining-tokens', b'600') in allowed[0]['headers']
+    assert refused[0]['status'] == 429
+    headers = dict(refused[0]['headers'])
+    assert headers[b'retry-after'] == b'30'
+    assert headers[b'x-ratelimit-remaining-tokens'] == b'0'
+    assert orjson.loads(refused[1]['body']) == {'detail': 'Token budget exceeded'}
@@ -0,0 +1,149 @@
+import asyncio
+import os
+
+import pytest
+
+import app.dialog
+import app.retrieval
+from app.cache import CachePolicy, MemoryBackend, ResponseCache
+from app.dialog import build_system, resolve_answer
+from app.embeddings import HashingEmbedder
+from app.ingest import ingest
+from app.retrieval import Retriever
+from app.semantic import SemanticCache
+
+
+DIMENSIONS = 64
+
+
+class CountingEmbedder(HashingEmbedder):
+
+    def __init__(self, dimensions: int) -> None:
+        super().__init__(dimensions)
+        self.calls = 0
+
+    async def embed(self, texts: list):
+        self.calls += 1
+        return await super().embed(texts)
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    embedder = CountingEmbedder(DIMENSIONS)
+    monkeypatch.setattr(app.retrieval, 'embedder', embedder)
+    return embedder
+
+
+@pytest.fixture
+def documents(tmp_path):
+    path = tmp_path / 'docs'
+    path.mkdir()
+    (path / 'fargate.md').write_text('Fargate Spot tasks can be interrupted with two minutes notice.\n')
+    (path / 'bedrock.md').write_text('Bedrock throttles callers that exceed their tokens per minute.\n')
+    return str(path)
+
+
+def build(paths: list, index_path: str, embedder) -> dict:
+    return asyncio.run(ingest(paths, index_path, embedder, batch_size=1, parallelism=1))
+
+
+def versions_of(index_path: str) -> list:
+    return sorted(os.listdir(f'{index_path}.versions'))
+
+
+def test_ingest_switches_the_link_to_each_new_version(tmp_path, documents, embedder):
+    index_path = str(tmp_path / 'index')
+
+    first = build([documents], index_path, embedder)
+    assert os.path.islink(index_path)
+    assert os.path.basename(os.path.realpath(index_path)) == first['version']
+
+    second = build([documents], index_path, embedder)
+    assert os.path.basename(os.path.realpath(index_path)) == second['version']
+    # The version other tasks may still be reading is kept until the next one is published
+    assert versions_of(index_path) == [first['version'], second['version']]
+
+    third = build([documents], index_path, embedder)
+    assert versions_of(index_path) == [second['version'], third['version']]
+
+
+def test_failed_ingest_leaves_the_current_version(tmp_path, documents, embedder):
+    index_path = str(tmp_path / 'index')
+    current = build([documents], index_path, embedder)['version']
+    empty = tmp_path / 'empty'
+    empty.mkdir()
+
+    with pytest.raises(ValueError):
+        build([str(empty)], index_path, embedder)
+
+    assert os.path.basename(os.path.realpath(index_path)) == current
+    assert versions_of(index_path) == [current]
+
+
+def test_ingest_replaces_an_index_directory_of_the_earlier_layout(tmp_path, documents, embedder):
+    index_path = tmp_path / 'index'
+    index_path.mkdir()
+    (index_path / 'centroids.npy').write_bytes(b'')
+
+    version = build([documents], str(index_path), embedder)['version']
+
+    assert os.path.basename(os.path.realpath(index_path)) == version
+
+
+def test_retriever_loads_the_published_version(tmp_path, documents, embedder):
+    index_path = str(tmp_path / 'index')
+    version = build([documents], index_path, embedder)['version']
+    retriever = Retriever(index_path, top_k=1, nprobe=1, min_score=0.0, preload=False)
+
+    asyncio.run(retriever.start())
+    chunks = asyncio.run(retriever.retrieve('How much notice do Fargate Spot tasks get?'))
+
+    assert retriever.version == version
+    assert chunks[0]['source'].endswith('fargate.md')
+
+
+def test_missing_index_fails_startup(tmp_path, embedder):
+    retriever = Retriever(str(tmp_path / 'index'), top_k=1, nprobe=1, min_score=0.0, preload=False)
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(retriever.start())
+
+
+def test_answer_embeds_the_instruction_once_and_retrieves_only_on_a_miss(tmp_path, documents, embedder,
+                                                                         monkeypatch):
+    index_path = str(tmp_path / 'index')
+    build([documents], index_path, embedder)
+    retriever = Retriever(index_path, top_k=1, nprobe=1, min_score=0.0, preload=False)
+    asyncio.run(retriever.start())
+    semantic_cache = SemanticCache(embedder, threshold=0.99, max_entries=8, ttl=60, candidates=1)
+    requests = []
+
+    async def converse(**request):
+        requests.append(request)
+        return {'output': {'message': {'content': [{'text': 'Two minutes.'}]}}, 'stopReason': 'end_turn'}
+
+    monkeypatch.setattr(app.dialog, 'retriever', retriever)
+    monkeypatch.setattr(app.dialog, 'semantic_cache', semantic_cache)
+    monkeypatch.setattr(app.dialog, 'SEMANTIC_CACHE_ENABLED', True)
+    monkeypatch.setattr(app.dialog, 'response_cache', ResponseCache(MemoryBackend(8), ttl=60))
+    monkeypatch.setattr(app.dialog.router, 'converse', converse)
+
+    request = {
+        'modelId': 'model',
+        'messages': [{'role': 'user', 'content': [{'text': 'How much notice do Fargate Spot tasks get?'}]}],
+        'system': build_system()
+    }
+    embedder.calls = 0
+    first, cached = asyncio.run(resolve_answer(request, CachePolicy.DEFAULT))
+
+    assert (first.text, cached) == ('Two minutes.', None)
+    assert embedder.calls == 1
+    content = requests[0]['messages'][0]['content']
+    assert 'fargate.md' in content[0]['text']
+    assert content[-1] == {'text': 'How much notice do Fargate Spot tasks get?'}
+
+    second, cached = asyncio.run(resolve_answer(request, CachePolicy.DEFAULT))
+
+    assert second.text == 'Two minutes.' and cached is not None
+    assert embedder.calls == 1
+    assert len(requests) == 1
@@ -0,0 +1,21 @@
+from app.scaling import emf_record, throttle_rate
+
+
+def test_throttle_rate_counts_bedrock_throttles_and_shed_calls():
+    # 20 attempts got a slot, 5 of them throttled by Bedrock; no calls shed
+    assert throttle_rate((100, 10, 3), (120, 10, 8)) == 25.0
+    # 15 attempts got a slot, 5 calls were shed and 5 throttled
+    assert throttle_rate((100, 10, 3), (115, 15, 8)) == 50.0
+
+
+def test_throttle_rate_of_an_idle_minute_is_zero():
+    assert throttle_rate((100, 10, 3), (100, 10, 3)) == 0.0
+
+
+def test_emf_record_declares_each_metric():
+    record = emf_record('GenAIDemo', 'BackendAppService', {'QueueDepth': 2.5, 'ThrottleRate': 10.0})
+
+    [directive] = record['_aws']['CloudWatchMetrics']
+    assert directive['Namespace'] == 'GenAIDemo'
+    assert directive['Metrics'] == [{'Name': 'QueueDepth', 'Unit': 'Count'}, {'Name': 'ThrottleRate', 'Unit': 'Percent'}]
+    assert (record['ServiceName'], record['ThrottleRate']) == ('BackendAppService', 10.0)
@@ -0,0 +1,165 @@
+import asyncio
+
+from app.limiter import AdaptiveLimiter, FairQueue, Lane
+from app.scheduler import Priority, SchedulerMiddleware, priority_var, request_priority, tenant_var
+from app.singleflight import SingleFlight
+
+
+def drain(queue: FairQueue, count: int) -> list:
+    return [queue.pop() for _ in range(count)]
+
+
+def test_flows_are_served_in_proportion_to_their_weights():
+    queue = FairQueue()
+    for i in range(6):
+        queue.push('light', ('light', i))
+        queue.push('heavy', ('heavy', i), weight=2)
+
+    served = [flow for flow, _ in drain(queue, 6)]
+
+    assert served.count('heavy') == 4
+    assert served.count('light') == 2
+
+
+def test_each_flow_is_served_in_order():
+    queue = FairQueue()
+    for i in range(3):
+        queue.push('a', ('a', i))
+        queue.push('b', ('b', i))
+
+    served = drain(queue, 6)
+
+    assert [i for flow, i in served if flow == 'a'] == [0, 1, 2]
+    assert [i for flow, i in served if flow == 'b'] == [0, 1, 2]
+    assert len(queue) == 0
+
+
+def test_idle_flow_cannot_save_up_credit():
+    queue = FairQueue()
+    for i in range(10):
+        queue.push('bulk', ('bulk', i))
+    drain(queue, 6)
+    for i in range(4):
+        queue.push('late', ('late', i))
+
+    served = [flow for flow, _ in drain(queue, 6)]
+
+    # The late flow takes turns with the bulk flow rather than being owed the six it missed
+    assert served.count('late') == 3
+
+
+def test_removed_item_is_not_served():
+    queue = FairQueue()
+    queue.push('a', 'first')
+    queue.push('a', 'second')
+    queue.push('b', 'other')
+
+    queue.remove('a', 'first')
+    queue.remove('b', 'other')
+
+    assert len(queue) == 1
+    assert queue.pop() == 'second'
+
+
+def limiter(initial_limit: int, **lanes: Lane) -> AdaptiveLimiter:
+    return AdaptiveLimiter(initial_limit=initial_limit, min_limit=1, max_limit=32, backoff_ratio=0.5,
+                           latency_tolerance=2.0, lanes=lanes)
+
+
+def test_lane_is_held_to_its_share_of_the_limit():
+    async def scenario():
+        adaptive = limiter(
+            4,
+            interactive=Lane(weight=1, share=1.0, max_queue=8, max_wait=5),
+            batch=Lane(weight=1, share=0.5, max_queue=8, max_wait=5)
+        )
+        for _ in range(2):
+            await adaptive.acquire('batch')
+        waiting = asyncio.create_task(adaptive.acquire('batch'))
+        await asyncio.sleep(0)
+        # Room is left for the other lane
+        await adaptive.acquire('interactive')
+        assert not waiting.done()
+        waiting.cancel()
+        return adaptive
+
+    adaptive = asyncio.run(scenario())
+    assert adaptive.lane_in_flight == {'interactive': 1, 'batch': 2}
+
+
+async def serve_in_turn(adaptive: AdaptiveLimiter, held_by: str, callers: list) -> list:
+    await adaptive.acquire(held_by)
+    served = []
+
+    async def wait(lane, flow):
+        await adaptive.acquire(lane, flow)
+        served.append((lane, flow))
+
+    tasks = [asyncio.create_task(wait(lane, flow)) for lane, flow in callers]
+    await asyncio.sleep(0)
+    for _ in callers:
+        adaptive.release(served[-1][0] if served else held_by)
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return served
+
+
+def test_freed_slots_go_to_waiting_lanes_by_weight():
+    adaptive = limiter(
+        1,
+        interactive=Lane(weight=3, share=1.0, max_queue=16, max_wait=5),
+        batch=Lane(weight=1, share=1.0, max_queue=16, max_wait=5)
+    )
+
+    served = asyncio.run(serve_in_turn(adaptive, 'interactive',
+                                       [('batch', None)] * 4 + [('interactive', None)] * 4))
+
+    assert [lane for lane, _ in served[:4]].count('interactive') == 3
+
+
+def test_tenants_of_a_lane_are_served_in_turn():
+    adaptive = limiter(1, batch=Lane(weight=1, share=1.0, max_queue=16, max_wait=5))
+
+    served = asyncio.run(serve_in_turn(adaptive, 'batch', [('batch', 'bulk')] * 6 + [('batch', 'small')] * 2))
+
+    assert [flow for _, flow in served[:4]].count('small') == 2
+
+
+def test_callers_can_lower_their_priority_but_not_raise_it():
+    assert request_priority('/api/prompt', '') == Priority.INTERACTIVE
+    assert request_priority('/api/prompt', 'Batch') == Priority.BATCH
+    assert request_priority('/api/prompts:batch', '') == Priority.BATCH
+    assert request_priority('/api/prompts:batch', 'interactive') == Priority.BATCH
+    assert request_priority('/api/prompts:batch', 'background') == Priority.BACKGROUND
+    assert request_priority('/api/prompt', 'urgent') == Priority.INTERACTIVE
+
+
+def test_middleware_sets_the_class_and_tenant_for_the_request():
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen.update(priority=priority_var.get(), tenant=tenant_var.get())
+
+    scope = {'type': 'http', 'path': '/api/prompt', 'headers': [(b'x-priority', b'batch'), (b'x-api-key', b'team-a')]}
+    asyncio.run(SchedulerMiddleware(app)(scope, None, None))
+
+    assert seen == {'priority': Priority.BATCH, 'tenant': 'team-a'}
+    assert priority_var.get() == Priority.INTERACTIVE and tenant_var.get() == ''
+
+
+def test_calls_are_only_coalesced_within_a_priority_class():
+    async def call(flights, release, priority):
+        priority_var.set(priority)
+        return await flights.do('key', release.wait)
+
+    async def scenario():
+        flights, release = SingleFlight(), asyncio.Event()
+        callers = [asyncio.create_task(call(flights, release, priority))
+                   for priority in (Priority.INTERACTIVE, Priority.BATCH, Priority.BATCH)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*callers)
+        return flights
+
+    flights = asyncio.run(scenario())
+    assert (flights.calls, flights.coalesced) == (2, 1)
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.cache import MemoryBackend, RedisBackend
+from app.sessions import SessionStore, pack
+
+
+class SlowBackend(MemoryBackend):
+    """Yields to other tasks between reading and writing, as a networked store would."""
+
+    async def get(self, key: str):
+        value = await super().get(key)
+        await asyncio.sleep(0)
+        return value
+
+
+def exchange(n: int) -> list:
+    return [
+        {'role': 'user', 'content': [{'text': f'question {n}'}]},
+        {'role': 'assistant', 'content': [{'text': f'answer {n}'}]}
+    ]
+
+
+async def append_together(stores: list, count: int) -> list:
+    await asyncio.gather(*(stores[n % len(stores)].append('session', exchange(n)) for n in range(count)))
+    return await stores[0].get('session')
+
+
+def questions(history: list) -> set:
+    return {message['content'][0]['text'] for message in history if message['role'] == 'user'}
+
+
+def test_concurrent_appends_to_a_session_are_all_kept():
+    store = SessionStore(SlowBackend(max_entries=10), ttl=60, history_tokens=10_000)
+
+    history = asyncio.run(append_together([store], 10))
+
+    assert questions(history) == {f'question {n}' for n in range(10)}
+    assert [message['role'] for message in history] == ['user', 'assistant'] * 10
+    assert store._locks == {}
+
+
+def test_history_over_budget_drops_the_oldest_exchanges():
+    store = SessionStore(MemoryBackend(max_entries=10), ttl=60, history_tokens=12)
+
+    history = asyncio.run(append_together([store], 4))
+
+    assert history == exchange(2) + exchange(3)
+    assert store.trimmed == 2
+
+
+def test_failed_append_is_counted():
+    store = SessionStore(RedisBackend('redis://127.0.0.1:1/0'), ttl=60, history_tokens=10_000)
+
+    async def scenario():
+        try:
+            await store.append('session', exchange(0))
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
+    assert store.errors == 1
+
+
+def test_append_racing_another_task_is_redone_in_redis(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr('redis.asyncio.from_url', lambda url: fakeredis.FakeAsyncRedis(server=server))
+    store = SessionStore(RedisBackend('redis://fake'), ttl=60, history_tokens=10_000)
+    other_task = fakeredis.FakeRedis(server=server)
+    reads = []
+
+    # Another task appends after this one has read the history and before it writes
+    def extend_racing(key, fn, ttl):
+        def racing(value):
+            reads.append(value)
+            if len(reads) == 1:
+                other_task.set(key, pack(exchange(0)))
+            return fn(value)
+        return update(key, racing, ttl)
+
+    update = store.backend.update
+    monkeypatch.setattr(store.backend, 'update', extend_racing)
+
+    async def scenario():
+        await store.append('session', exchange(1))
+        return await store.get('session')
+
+    history = asyncio.run(scenario())
+
+    assert len(reads) == 2
+    assert history == exchange(0) + exchange(1)
@@ -0,0 +1,200 @@
+import asyncio
+
+from app.deadline import deadline_after
+from app.singleflight import DEADLINE_SLACK_SECONDS, SingleFlight, covers
+
+
+class Upstream:
+    """A call that runs until released, counting how often it was started and cancelled."""
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def call(self, result: str = 'answer') -> str:
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return result
+
+    async def items(self, count: int = 3):
+        self.started += 1
+        try:
+            for i in range(count):
+                await self.release.wait()
+                yield i
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+async def settle() -> None:
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.create_task(flights.do('key', upstream.call)) for _ in range(3)]
+        await settle()
+        upstream.release.set()
+        return flights, upstream, await asyncio.gather(*callers)
+
+    flights, upstream, results = asyncio.run(scenario())
+    assert results == ['answer'] * 3
+    assert upstream.started == 1
+    assert (flights.calls, flights.coalesced, flights.in_flight) == (1, 2, 0)
+
+
+def test_different_keys_and_later_callers_get_their_own_call():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        upstream.release.set()
+        await asyncio.gather(flights.do('a', upstream.call), flights.do('b', upstream.call))
+        await flights.do('a', upstream.call)
+        return upstream
+
+    assert asyncio.run(scenario()).started == 3
+
+
+def test_caller_leaving_does_not_cancel_the_call_for_the_others():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        leaving = asyncio.create_task(flights.do('key', upstream.call))
+        staying = asyncio.create_task(flights.do('key', upstream.call))
+        await settle()
+        leaving.cancel()
+        await settle()
+        upstream.release.set()
+        return upstream, await staying, leaving.cancelled()
+
+    upstream, result, cancelled = asyncio.run(scenario())
+    assert (result, cancelled, upstream.cancelled) == ('answer', True, 0)
+
+
+def test_call_is_cancelled_once_every_caller_left():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.create_task(flights.do('key', upstream.call)) for _ in range(2)]
+        await settle()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await settle()
+        # A new caller starts afresh rather than joining the cancelled call
+        upstream.release.set()
+        return flights, upstream, await flights.do('key', upstream.call)
+
+    flights, upstream, result = asyncio.run(scenario())
+    assert (upstream.cancelled, upstream.started, result) == (1, 2, 'answer')
+    assert flights.in_flight == 0
+
+
+def test_error_reaches_every_caller():
+    async def failing():
+        await asyncio.sleep(0)
+        raise RuntimeError('upstream failed')
+
+    async def scenario():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.do('key', failing), flights.do('key', failing),
+                                    return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert [str(e) for e in errors] == ['upstream failed'] * 2
+
+
+def test_late_subscriber_replays_the_stream_from_the_start():
+    async def collect(flights, upstream, received):
+        async for item in flights.stream('key', upstream.items):
+            received.append(item)
+
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        first, second = [], []
+        early = asyncio.create_task(collect(flights, upstream, first))
+        await settle()
+        late = asyncio.create_task(collect(flights, upstream, second))
+        await settle()
+        upstream.release.set()
+        await asyncio.gather(early, late)
+        return flights, upstream, first, second
+
+    flights, upstream, first, second = asyncio.run(scenario())
+    assert first == second == [0, 1, 2]
+    assert (upstream.started, flights.coalesced, flights.in_flight) == (1, 1, 0)
+
+
+def test_stream_is_cancelled_once_every_subscriber_left():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        streams = [flights.stream('key', upstream.items) for _ in range(2)]
+        readers = [asyncio.create_task(anext(stream)) for stream in streams]
+        await settle()
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        for stream in streams:
+            await stream.aclose()
+        await settle()
+        return flights, upstream
+
+    flights, upstream = asyncio.run(scenario())
+    assert (upstream.started, upstream.cancelled, flights.in_flight) == (1, 1, 0)
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def failing():
+        yield 'start'
+        raise RuntimeError('stream failed')
+
+    async def collect(flights):
+        return [item async for item in flights.stream('key', failing)]
+
+    async def scenario():
+        flights = SingleFlight()
+        return await asyncio.gather(collect(flights), collect(flights), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(scenario())] == ['stream failed'] * 2
+
+
+async def call_within(flights: SingleFlight, upstream: Upstream, seconds: float) -> str:
+    with deadline_after(seconds):
+        return await flights.do('key', upstream.call)
+
+
+def test_caller_with_a_later_deadline_starts_its_own_flight():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.create_task(call_within(flights, upstream, seconds)) for seconds in (10, 120)]
+        await settle()
+        upstream.release.set()
+        await asyncio.gather(*callers)
+        return flights, upstream
+
+    flights, upstream = asyncio.run(scenario())
+    assert (upstream.started, flights.calls, flights.coalesced) == (2, 2, 0)
+
+
+def test_caller_with_an_earlier_or_close_deadline_joins_the_flight():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        seconds = (60, 5, 60 + DEADLINE_SLACK_SECONDS / 2)
+        callers = [asyncio.create_task(call_within(flights, upstream, s)) for s in seconds]
+        await settle()
+        upstream.release.set()
+        await asyncio.gather(*callers)
+        return flights, upstream
+
+    flights, upstream = asyncio.run(scenario())
+    assert (upstream.started, flights.calls, flights.coalesced) == (1, 1, 2)
+
+
+def test_flight_without_a_deadline_covers_every_caller():
+    assert covers(None, None) and covers(None, 100.0)
+    assert not covers(100.0, None)
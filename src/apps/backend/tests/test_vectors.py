@@ -0,0 +1,206 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from app.embeddings import HashingEmbedder
+from app.semantic import SemanticCache
+from app.vectors import VectorIndex
+
+
+DIMENSIONS = 64
+
+
+def unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def filled_index(count: int, capacity: int = 8) -> tuple[VectorIndex, np.ndarray]:
+    index = VectorIndex(DIMENSIONS, capacity)
+    vectors = unit_vectors(count)
+    index.add(vectors, [{'n': n} for n in range(count)])
+    return index, vectors
+
+
+def test_search_finds_each_vector_first():
+    index, vectors = filled_index(5)
+
+    scores, slots = index.search(vectors, k=3)
+
+    assert len(index) == 5
+    assert slots.shape == (5, 3)
+    assert slots[:, 0].tolist() == [0, 1, 2, 3, 4]
+    np.testing.assert_allclose(scores[:, 0], 1.0, rtol=1e-5)
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+
+def test_search_asks_for_more_than_stored():
+    index, vectors = filled_index(2)
+
+    scores, slots = index.search(vectors[0], k=5)
+
+    assert slots.shape == (1, 2)
+
+
+def test_search_of_empty_index():
+    scores, slots = VectorIndex(DIMENSIONS, 4).search(unit_vectors(1), k=2)
+
+    assert slots.shape == (1, 0)
+
+
+def test_full_index_evicts_least_recently_used():
+    index, vectors = filled_index(4, capacity=4)
+    index.last_used[:] = [4.0, 1.0, 3.0, 2.0]
+    index.touch([1])
+
+    index.add(unit_vectors(2, seed=1), [{'n': 'a'}, {'n': 'b'}])
+
+    assert len(index) == 4
+    assert index.evictions == 2
+    # Slots 2 and 3 were used longest ago once slot 1 was found by a search
+    assert {payload['n'] for payload in index.payloads[:2]} == {0, 1}
+    assert {payload['n'] for payload in index.payloads[2:]} == {'a', 'b'}
+
+
+def test_retired_slot_is_evicted_next():
+    index, _ = filled_index(3, capacity=3)
+    index.retire(1)
+
+    index.add(unit_vectors(1, seed=1), [{'n': 'new'}])
+
+    assert index.payloads[1] == {'n': 'new'}
+
+
+def test_adding_more_than_capacity_keeps_the_last():
+    index = VectorIndex(DIMENSIONS, 2)
+    index.add(unit_vectors(3), [{'n': 0}, {'n': 1}, {'n': 2}])
+
+    assert [payload['n'] for payload in index.payloads] == [1, 2]
+
+
+def test_save_and_load(tmp_path):
+    index, vectors = filled_index(5)
+    path = str(tmp_path / 'semantic')
+    index.save(path)
+
+    loaded = VectorIndex.load(path, DIMENSIONS, 8)
+
+    assert os.path.islink(path)
+    assert loaded.payloads == index.payloads
+    np.testing.assert_array_equal(loaded.last_used[:5], index.last_used[:5])
+    assert loaded.search(vectors, k=1)[1][:, 0].tolist() == [0, 1, 2, 3, 4]
+    # Loaded indexes keep growing in memory
+    loaded.add(unit_vectors(1, seed=1), [{'n': 5}])
+    assert len(loaded) == 6
+
+
+def test_load_into_smaller_capacity(tmp_path):
+    index, _ = filled_index(5)
+    path = str(tmp_path / 'semantic')
+    index.save(path)
+
+    loaded = VectorIndex.load(path, DIMENSIONS, 3)
+
+    assert loaded.capacity == 3
+    assert [payload['n'] for payload in loaded.payloads] == [0, 1, 2]
+
+
+@pytest.mark.parametrize('dimensions', [DIMENSIONS, DIMENSIONS * 2])
+def test_missing_or_mismatched_index_loads_empty(tmp_path, dimensions):
+    path = str(tmp_path / 'semantic')
+    if dimensions != DIMENSIONS:
+        filled_index(2)[0].save(path)
+
+    loaded = VectorIndex.load(path, dimensions, 8)
+
+    assert len(loaded) == 0
+    assert loaded.vectors.shape == (8, dimensions)
+
+
+def test_saves_never_share_files(tmp_path):
+    path = str(tmp_path / 'semantic')
+    first, _ = filled_index(2)
+    second, _ = filled_index(3)
+    first.save(path)
+    second.save(path)
+    third, _ = filled_index(4)
+    third.save(path)
+
+    # The last save wins, and only it and the one before it are kept
+    assert len(VectorIndex.load(path, DIMENSIONS, 8)) == 4
+    assert len(os.listdir(f'{path}.versions')) == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_hashing_embedder_vectors_match_shared_words():
+    embedder = HashingEmbedder(DIMENSIONS * 4)
+    index = VectorIndex(embedder.dimensions, 4)
+    instructions = ['how do I reset my password', 'what is the capital of france']
+    index.add(asyncio.run(embedder.embed(instructions)), [{'instruction': text} for text in instructions])
+
+    _, slots = index.search(asyncio.run(embedder.embed(['how can I reset my password'])), k=1)
+
+    assert index.payloads[slots[0, 0]]['instruction'] == 'how do I reset my password'
+
+
+def test_snapshot_is_not_changed_by_later_additions():
+    index, _ = filled_index(3)
+
+    snapshot = index.snapshot()
+    index.add(unit_vectors(1, seed=1), [{'n': 'new'}])
+
+    assert (len(snapshot), snapshot.capacity) == (3, 3)
+    assert [payload['n'] for payload in snapshot.payloads] == [0, 1, 2]
+    np.testing.assert_array_equal(snapshot.vectors, index.vectors[:3])
+
+
+def semantic_cache(path: str, save_interval: float = 0) -> SemanticCache:
+    return SemanticCache(HashingEmbedder(DIMENSIONS * 4), threshold=0.9, max_entries=8, ttl=3600, candidates=2,
+                         path=path, save_interval=save_interval)
+
+
+def ask(instruction: str) -> dict:
+    return {'modelId': 'model', 'messages': [{'role': 'user', 'content': [{'text': instruction}]}]}
+
+
+def test_semantic_cache_is_saved_periodically_while_it_changes(tmp_path):
+    path = str(tmp_path / 'semantic')
+    cache = semantic_cache(path, save_interval=0.05)
+
+    async def scenario():
+        await cache.start()
+        cache.add(await cache.probe(ask('how do I reset my password')), 'Use the reset link.')
+        await asyncio.sleep(0.2)
+        saved_while_running = len(VectorIndex.load(path, cache.embedder.dimensions, 8))
+        await cache.close()
+        return saved_while_running
+
+    assert asyncio.run(scenario()) == 1
+    # Nothing was added after the periodic save, so neither later ticks nor shutdown saved again
+    assert cache.saves == 1
+    assert len(os.listdir(f'{path}.versions')) == 1
+
+
+def test_semantic_cache_answers_from_the_saved_index_after_a_restart(tmp_path):
+    path = str(tmp_path / 'semantic')
+
+    async def first_task():
+        cache = semantic_cache(path)
+        await cache.start()
+        cache.add(await cache.probe(ask('how do I reset my password')), 'Use the reset link.')
+        await cache.close()
+
+    async def next_task():
+        cache = semantic_cache(path)
+        await cache.start()
+        try:
+            return await cache.probe(ask('how do I reset my password'))
+        finally:
+            await cache.close()
+
+    asyncio.run(first_task())
+    probe = asyncio.run(next_task())
+
+    assert probe.hit['text'] == 'Use the reset link.'
@@ -0,0 +1,135 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import json
+import logging
+import os
+import random
+import time
+import uuid
+import requests
+import streamlit as st
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+
+API_ENDPOINT = os.environ.get('API_ENDPOINT')
+API_POOL_SIZE = int(os.environ.get('API_POOL_SIZE', '32'))
+API_CONNECT_TIMEOUT = float(os.environ.get('API_CONNECT_TIMEOUT', '3.05'))
+API_READ_TIMEOUT = float(os.environ.get('API_READ_TIMEOUT', '120'))
+API_MAX_RETRIES = int(os.environ.get('API_MAX_RETRIES', '3'))
+API_BACKOFF_FACTOR = float(os.environ.get('API_BACKOFF_FACTOR', '0.2'))
+API_BACKOFF_JITTER = float(os.environ.get('API_BACKOFF_JITTER', '0.5'))
+# Longest wait before a retry, whatever the backend's Retry-After asks for; the page is blocked meanwhile
+API_RETRY_AFTER_MAX_SECONDS = float(os.environ.get('API_RETRY_AFTER_MAX_SECONDS', '5'))
+# How long a user waits for an answer; the backend stops working on the request after that
+API_DEADLINE_SECONDS = float(os.environ.get('API_DEADLINE_SECONDS', '120'))
+
+TIMEOUT = (API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+
+# Answers are only logged at DEBUG; writing them to stdout on every request slows the page down under load
+logger = logging.getLogger('frontend')
+
+
+# Backend answers a POST is retried on: load shedding (429) and no capacity (503). A 502 is not
+# retried: Envoy and Service Connect also send it when the connection was reset mid-answer, after
+# the backend may have started generating (and paying for) it.
+POST_RETRY_STATUSES = frozenset({429, 503})
+
+
+class BoundedRetry(Retry):
+
+    def get_retry_after(self, response) -> float | None:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, API_RETRY_AFTER_MAX_SECONDS)
+
+
+def create_session(pool_size: int = API_POOL_SIZE, max_retries: int = API_MAX_RETRIES) -> requests.Session:
+    # Connection failures are retried for every method: the request never reached the backend.
+    # Read errors are not retried: the backend may already be generating (and paying for) the answer.
+    # Error statuses are retried here for GET and DELETE only; post() retries its own, so that each
+    # attempt carries the time left until the deadline.
+    retry = BoundedRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=max_retries,
+        status_forcelist=(429, 502, 503),
+        allowed_methods=frozenset({'GET', 'DELETE'}),
+        backoff_factor=API_BACKOFF_FACTOR,
+        backoff_jitter=API_BACKOFF_JITTER,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    # gzip, plus zstd when zstandard is installed; the backend compresses large non-streamed responses
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# One keep-alive connection pool per Streamlit process, shared by every session and rerun
+@st.cache_resource
+def get_session() -> requests.Session:
+    return create_session()
+
+
+def retry_delay(response: requests.Response, attempt: int) -> float:
+    try:
+        delay = float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        delay = API_BACKOFF_FACTOR * 2 ** attempt + random.uniform(0, API_BACKOFF_JITTER)
+    return min(max(delay, 0.0), API_RETRY_AFTER_MAX_SECONDS)
+
+
+# The request ID shows up in the backend's logs for this request, and the backend gives up on it
+# (including the Bedrock call) once the deadline has passed or the user has left the page.
+# Retries share the deadline: each one is sent with the time left, and none is made once a retry
+# could not start before the deadline.
+def post(path: str, **kwargs) -> requests.Response:
+    deadline = time.monotonic() + API_DEADLINE_SECONDS
+    headers = {'X-Request-ID': uuid.uuid4().hex, **kwargs.pop('headers', {})}
+    for attempt in range(API_MAX_RETRIES + 1):
+        left = deadline - time.monotonic()
+        headers['X-Request-Timeout-Ms'] = str(max(int(left * 1000), 0))
+        response = get_session().post(f'{API_ENDPOINT}{path}', timeout=TIMEOUT, headers=headers, **kwargs)
+        if response.status_code not in POST_RETRY_STATUSES or attempt == API_MAX_RETRIES:
+            return response
+        delay = retry_delay(response, attempt)
+        if time.monotonic() + delay >= deadline:
+            return response
+        logger.debug('Retrying %s after %s in %.1f s', path, response.status_code, delay)
+        response.close()
+        time.sleep(delay)
+
+
+def delete(path: str, **kwargs) -> requests.Response:
+    return get_session().delete(f'{API_ENDPOINT}{path}', timeout=TIMEOUT, **kwargs)
+
+
+# Answer text from an /api/prompt/stream response, for st.write_stream
+def iter_answer(response: requests.Response):
+    for line in response.iter_lines():
+        if not line:
+            continue
+        event = json.loads(line)
+        if event['type'] == 'delta':
+            yield event['text']
+        elif event['type'] == 'error':
+            st.error(event['message'])
+
+
+def error_message(e: requests.RequestException) -> str:
+    if isinstance(e, requests.HTTPError) and e.response.status_code == 429:
+        retry_after = e.response.headers.get('Retry-After', '잠시')
+        return f'요청이 많아 처리하지 못했습니다. {retry_after}초 후 다시 시도하세요.'
+    if isinstance(e, requests.HTTPError) and e.response.status_code == 504:
+        return '응답 시간이 초과되었습니다. 질문을 짧게 하거나 다시 시도하세요.'
+    return f'요청에 실패했습니다: {e}'
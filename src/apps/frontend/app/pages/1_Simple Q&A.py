@@ -5,11 +5,8 @@
 
 import streamlit as st
 import requests
-import os
 
-
-API_ENDPOINT = os.environ.get('API_ENDPOINT')
-API_URL = f'{API_ENDPOINT}/api/prompt'
+import backend_client
 
 
 st.set_page_config(
@@ -19,19 +16,35 @@ st.set_page_config(
 st.title('무엇이든 물어보세요.')
 
 instruction = st.text_area('질문을 입력하세요.', '', height=200)
+streaming = st.toggle('Streaming', value=True)
 
 with st.form('text_form', clear_on_submit=True):
     submitted = st.form_submit_button('Submit')
     if submitted:
-        with st.spinner('Loading...'):
-            if instruction == '':
-                st.error('질문을 입력하세요.')
-            else:
+        if instruction == '':
+            st.error('질문을 입력하세요.')
+        elif streaming:
+            data = {'instruction': instruction}
+            try:
+                with backend_client.post('/api/prompt/stream', json=data, stream=True) as response:
+                    response.raise_for_status()
+                    with st.container(border=True):
+                        result = st.write_stream(backend_client.iter_answer(response))
+
+                backend_client.logger.debug('answer: %s', result)
+            except requests.RequestException as e:
+                st.error(backend_client.error_message(e))
+        else:
+            with st.spinner('Loading...'):
                 data = {'instruction': instruction}
-                response = requests.post(API_URL, json=data)
+                try:
+                    response = backend_client.post('/api/prompt', json=data)
+                    response.raise_for_status()
 
-                result = response.json()
+                    result = response.json()
 
-                print(result)
+                    backend_client.logger.debug('answer: %s', result)
 
-                st.info(result['text'])
+                    st.info(result['text'])
+                except requests.RequestException as e:
+                    st.error(backend_client.error_message(e))
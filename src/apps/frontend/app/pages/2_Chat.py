@@ -0,0 +1,50 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+import uuid
+import streamlit as st
+import requests
+
+import backend_client
+
+
+st.set_page_config(
+    page_title='GenAI Demo'
+)
+
+st.title('대화하기')
+
+# The backend keeps the history under this ID; the page only keeps what it has shown
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.messages = []
+
+if st.button('새 대화'):
+    try:
+        backend_client.delete(f'/api/sessions/{st.session_state.session_id}')
+    except requests.RequestException:
+        pass
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.messages = []
+
+for message in st.session_state.messages:
+    with st.chat_message(message['role']):
+        st.markdown(message['text'])
+
+if instruction := st.chat_input('메시지를 입력하세요.'):
+    with st.chat_message('user'):
+        st.markdown(instruction)
+
+    with st.chat_message('assistant'):
+        data = {'instruction': instruction, 'session_id': st.session_state.session_id}
+        try:
+            with backend_client.post('/api/prompt/stream', json=data, stream=True) as response:
+                response.raise_for_status()
+                answer = st.write_stream(backend_client.iter_answer(response))
+
+            st.session_state.messages.append({'role': 'user', 'text': instruction})
+            st.session_state.messages.append({'role': 'assistant', 'text': answer})
+        except requests.RequestException as e:
+            st.error(backend_client.error_message(e))
@@ -0,0 +1,89 @@
+########################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+########################################################################
+
+# Per-request latency of a fresh requests.post() per call versus the pooled
+# keep-alive session from backend_client, against a local stub backend.
+#
+#   cd src/apps/frontend
+#   python benchmarks/bench_client.py --requests 500
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import requests
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from backend_client import create_session, TIMEOUT
+
+
+ANSWER = json.dumps({'text': '안녕하세요.'}, ensure_ascii=False).encode('utf-8')
+
+
+class StubBackend(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(ANSWER)))
+        self.end_headers()
+        self.wfile.write(ANSWER)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def measure(post, url: str, total: int) -> dict:
+    latencies = []
+    for i in range(total):
+        started = time.perf_counter()
+        response = post(url, json={'instruction': f'질문 {i}'}, timeout=TIMEOUT)
+        response.raise_for_status()
+        response.json()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(latencies[int(total * 0.95) - 1], 3),
+        'p99_ms': round(latencies[int(total * 0.99) - 1], 3)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Frontend HTTP client micro-benchmark')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{args.port}/api/prompt'
+
+    try:
+        results = {
+            'fresh_connection': measure(requests.post, url, args.requests),
+            'pooled_session': measure(create_session().post, url, args.requests)
+        }
+    finally:
+        server.shutdown()
+
+    results['p50_speedup'] = round(results['fresh_connection']['p50_ms'] / results['pooled_session']['p50_ms'], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
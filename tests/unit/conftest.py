@@ -0,0 +1,36 @@
+import json
+import os
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk.assertions import Template
+from constructs import Construct
+
+from genai_demo.applications import backend, frontend
+from genai_demo.deployment import GenAIDemo
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ECRDeployment downloads or builds its Lambda handler while synthesizing, which needs network access or
+# Docker; the tests synthesize without it
+class OfflineECRDeployment(Construct):
+
+    def __init__(self, scope: Construct, id_: str, **kwargs) -> None:
+        super().__init__(scope, id_)
+
+
+def cdk_context() -> dict:
+    with open(os.path.join(ROOT, 'cdk.json')) as f:
+        return json.load(f)['context']
+
+
+@pytest.fixture(scope='session')
+def template() -> Template:
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(backend, 'ECRDeployment', OfflineECRDeployment)
+        patch.setattr(frontend, 'ECRDeployment', OfflineECRDeployment)
+        app = cdk.App(context=cdk_context())
+        stack = GenAIDemo(app, 'GenAIDemo')
+        return Template.from_stack(stack)
@@ -0,0 +1,84 @@
+from aws_cdk.assertions import Match
+
+from genai_demo.applications.backend import METRICS_NAMESPACE
+
+
+def backend_scaling_policies(template) -> dict:
+    return {
+        name: resource['Properties']
+        for name, resource in template.find_resources('AWS::ApplicationAutoScaling::ScalingPolicy').items()
+        if name.startswith('BackendApp')
+    }
+
+
+def test_backend_has_three_scaling_policies(template):
+    policies = backend_scaling_policies(template)
+
+    assert len(policies) == 3
+    assert sorted(policy['PolicyType'] for policy in policies.values()) == [
+        'StepScaling', 'TargetTrackingScaling', 'TargetTrackingScaling'
+    ]
+
+
+def test_target_tracking_uses_backend_metrics(template):
+    metrics = {
+        policy['PolicyName']: policy['TargetTrackingScalingPolicyConfiguration']
+        for policy in backend_scaling_policies(template).values()
+        if policy['PolicyType'] == 'TargetTrackingScaling'
+    }
+
+    assert set(metrics) == {'InFlightRequestsScaling', 'QueueDepthScaling'}
+    for name, metric_name, target in [('InFlightRequestsScaling', 'InFlightRequests', 24),
+                                      ('QueueDepthScaling', 'QueueDepth', 2)]:
+        spec = metrics[name]['CustomizedMetricSpecification']
+        assert spec['Namespace'] == METRICS_NAMESPACE
+        assert spec['MetricName'] == metric_name
+        assert spec['Statistic'] == 'Average'
+        assert spec['Dimensions'] == [{'Name': 'ServiceName', 'Value': 'BackendAppService'}]
+        assert metrics[name]['TargetValue'] == target
+
+
+# Step bounds are relative to the alarm threshold, the lowest throttle rate in throttleRateSteps
+def test_throttle_rate_steps(template):
+    template.has_resource_properties('AWS::CloudWatch::Alarm', {
+        'Namespace': METRICS_NAMESPACE,
+        'MetricName': 'ThrottleRate',
+        'ComparisonOperator': 'GreaterThanOrEqualToThreshold',
+        'Threshold': 1
+    })
+    step_policy = next(
+        policy for policy in backend_scaling_policies(template).values() if policy['PolicyType'] == 'StepScaling'
+    )
+    config = step_policy['StepScalingPolicyConfiguration']
+
+    assert config['AdjustmentType'] == 'ChangeInCapacity'
+    assert config['StepAdjustments'] == [
+        {'MetricIntervalLowerBound': 0, 'MetricIntervalUpperBound': 4, 'ScalingAdjustment': 1},
+        {'MetricIntervalLowerBound': 4, 'MetricIntervalUpperBound': 19, 'ScalingAdjustment': 2},
+        {'MetricIntervalLowerBound': 19, 'ScalingAdjustment': 4}
+    ]
+
+
+# Scale-out only: the throttle rate never removes tasks
+def test_throttle_rate_has_no_scale_in_alarm(template):
+    alarms = template.find_resources('AWS::CloudWatch::Alarm', {
+        'Properties': {'MetricName': 'ThrottleRate'}
+    })
+
+    assert len(alarms) == 1
+
+
+def test_container_health_check_waits_for_readiness(template):
+    template.has_resource_properties('AWS::ECS::TaskDefinition', {
+        'Family': 'BackendAppTaskDef',
+        'ContainerDefinitions': [Match.object_like({
+            'Name': 'backend-app',
+            'HealthCheck': {
+                'Command': ['CMD-SHELL', Match.string_like_regexp('http://localhost:8080/api/ready')],
+                'Interval': 10,
+                'Timeout': 5,
+                'Retries': 3,
+                'StartPeriod': 30
+            }
+        })]
+    })
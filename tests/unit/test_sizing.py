@@ -0,0 +1,64 @@
+import aws_cdk as cdk
+import pytest
+from constructs import Construct
+
+from genai_demo.applications.sizing import ServiceSizing
+
+
+def sizing_from(context: dict) -> ServiceSizing:
+    app = cdk.App(context={'backend': context})
+    return ServiceSizing.from_context(Construct(app, 'Scope'), 'backend')
+
+
+def test_defaults_without_context():
+    assert sizing_from({}) == ServiceSizing()
+
+
+def test_reads_cdk_json_keys():
+    sizing = sizing_from({
+        'architecture': 'arm64',
+        'cpu': 1024,
+        'memoryMiB': 3072,
+        'desiredCount': 3,
+        'minCount': 2,
+        'maxCount': 6,
+        'inFlightRequestsTarget': 24
+    })
+
+    assert sizing == ServiceSizing(architecture='arm64', cpu=1024, memory_mib=3072,
+                                   desired_count=3, min_count=2, max_count=6)
+    assert sizing.platform.platform == 'linux/arm64'
+
+
+@pytest.mark.parametrize('cpu, memory_mib', [(256, 512), (256, 2048), (512, 4096), (4096, 30720), (16384, 122880)])
+def test_accepts_fargate_sizes(cpu, memory_mib):
+    assert ServiceSizing(cpu=cpu, memory_mib=memory_mib).memory_mib == memory_mib
+
+
+@pytest.mark.parametrize('cpu, memory_mib', [(256, 4096), (512, 512), (1024, 2500), (8192, 18432)])
+def test_rejects_memory_the_cpu_size_does_not_support(cpu, memory_mib):
+    with pytest.raises(ValueError, match=f'{memory_mib} MiB with {cpu} CPU units'):
+        ServiceSizing(cpu=cpu, memory_mib=memory_mib)
+
+
+def test_rejects_unknown_cpu_size():
+    with pytest.raises(ValueError, match='Unsupported Fargate CPU size 768'):
+        ServiceSizing(cpu=768, memory_mib=2048)
+
+
+def test_rejects_unknown_architecture():
+    with pytest.raises(ValueError, match="Unsupported architecture 'aarch64'"):
+        sizing_from({'architecture': 'aarch64'})
+
+
+@pytest.mark.parametrize('desired_count, min_count, max_count', [(1, 2, 10), (11, 2, 10), (0, 0, 10)])
+def test_rejects_inconsistent_task_counts(desired_count, min_count, max_count):
+    with pytest.raises(ValueError, match='Task counts'):
+        ServiceSizing(desired_count=desired_count, min_count=min_count, max_count=max_count)
+
+
+@pytest.mark.parametrize('architecture', ['x86_64', 'arm64'])
+def test_runs_two_thirds_on_fargate_spot(architecture):
+    strategies = ServiceSizing(architecture=architecture).capacity_provider_strategies
+
+    assert [(s.capacity_provider, s.weight) for s in strategies] == [('FARGATE_SPOT', 2), ('FARGATE', 1)]